@@ -0,0 +1,133 @@
+"""
+事件循环延迟基准测试
+并发读取大 PR 的全部变更文件（本地桩服务，补丁较大），同时用探针协程每隔固定间隔测量事件循环的调度延迟，
+分别在响应体直接在事件循环线程上解析（inline）和交给进程池解析（pool）两种模式下运行并对比
+
+用法:
+    python scripts/bench_event_loop_lag.py
+    python scripts/bench_event_loop_lag.py --concurrency 16 --duration 20 --patch-lines 300 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from statistics import median
+from typing import Dict, List
+
+# 项目根目录
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts import github_stub
+
+# 探针的调度间隔（秒）
+PROBE_INTERVAL = 0.005
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _probe(lags: List[float], stop: asyncio.Event):
+    """每隔 PROBE_INTERVAL 记录一次实际唤醒时间比预期晚了多少（毫秒）"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+
+async def _run_mode(workers: int, args) -> Dict:
+    """在一种模式下运行负载并测量事件循环延迟"""
+    from src.github.offload import get_offload_pool, shutdown_offload_pool
+    from src.github.server import close_session_pool, enable_session_pool, get_pull_request_files_by_repo_id
+
+    shutdown_offload_pool()
+    os.environ["GITHUB_OFFLOAD_WORKERS"] = str(workers)
+    if args.threshold is not None:
+        os.environ["GITHUB_OFFLOAD_THRESHOLD"] = str(args.threshold)
+    pool = get_offload_pool()
+    if pool is not None:
+        # 预先启动全部工作进程，进程启动时间不计入测量
+        await asyncio.gather(*[asyncio.wrap_future(pool.submit(time.sleep, 0.2)) for _ in range(workers)])
+
+    enable_session_pool()
+    lags: List[float] = []
+    stats = {"calls": 0, "files": 0, "errors": 0}
+    stop = asyncio.Event()
+
+    async def worker(index: int):
+        pr_number = index
+        while not stop.is_set():
+            pr_number += args.concurrency
+            result = await get_pull_request_files_by_repo_id(1, pr_number, include_patch=not args.no_patch)
+            if stop.is_set():
+                break
+            stats["calls"] += 1
+            if result["success"]:
+                stats["files"] += result["data"]["total_files"]
+            else:
+                stats["errors"] += 1
+
+    try:
+        # 预热（建立连接），不计入统计
+        await get_pull_request_files_by_repo_id(1, 0, include_patch=not args.no_patch)
+        probe = asyncio.create_task(_probe(lags, stop))
+        tasks = [asyncio.create_task(worker(index)) for index in range(args.concurrency)]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(probe, *tasks)
+    finally:
+        await close_session_pool()
+        shutdown_offload_pool()
+
+    return {
+        "mode": f"pool({workers})" if workers else "inline",
+        "calls_per_s": round(stats["calls"] / args.duration, 1),
+        "files_per_s": round(stats["files"] / args.duration),
+        "errors": stats["errors"],
+        "lag_p50_ms": round(median(lags), 2),
+        "lag_p99_ms": round(_percentile(lags, 0.99), 2),
+        "lag_max_ms": round(max(lags), 2)
+    }
+
+
+def main(argv=None) -> int:
+    """命令行入口，返回退出码"""
+    parser = argparse.ArgumentParser(description="对比进程池卸载前后的事件循环延迟")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发读取 PR 变更文件的协程数，默认 8")
+    parser.add_argument("--duration", type=float, default=10, help="每种模式的测量时长（秒），默认 10")
+    parser.add_argument("--workers", type=int, default=2, help="pool 模式的工作进程数，默认 2")
+    parser.add_argument("--threshold", type=int, help="交给进程池的最小响应体大小（字节），默认使用 GITHUB_OFFLOAD_THRESHOLD 或 128 KB")
+    parser.add_argument("--pr-files", type=int, default=300, help="桩服务中每个 PR 的变更文件数，默认 300")
+    parser.add_argument("--patch-lines", type=int, default=150, help="每个变更文件补丁的行数，默认 150")
+    parser.add_argument("--latency", type=float, default=5, help="桩服务响应延迟（毫秒），默认 5")
+    parser.add_argument("--no-patch", action="store_true", help="不保留补丁内容（include_patch=False）")
+    args = parser.parse_args(argv)
+
+    os.environ["GITHUB_CACHE_TTL"] = "0"
+    os.environ["GITHUB_PREFETCH"] = "0"
+    process, url = github_stub.spawn(latency=args.latency, pr_files=args.pr_files, patch_lines=args.patch_lines)
+    try:
+        asyncio.run(github_stub.wait_ready(url))
+        os.environ["GITHUB_API_BASE"] = url
+        print(f"{args.concurrency} 个并发请求，每个 PR {args.pr_files} 个文件、每个补丁 {args.patch_lines} 行，每种模式 {args.duration:.0f} 秒")
+        results = [asyncio.run(_run_mode(0, args)), asyncio.run(_run_mode(args.workers, args))]
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    print()
+    print(f"{'模式':<12}{'调用/秒':>10}{'文件/秒':>10}{'错误':>6}{'延迟p50(ms)':>14}{'延迟p99(ms)':>14}{'延迟max(ms)':>14}")
+    for result in results:
+        print(
+            f"{result['mode']:<12}{result['calls_per_s']:>10}{result['files_per_s']:>10}{result['errors']:>6}"
+            f"{result['lag_p50_ms']:>14}{result['lag_p99_ms']:>14}{result['lag_max_ms']:>14}"
+        )
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
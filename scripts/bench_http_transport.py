@@ -0,0 +1,145 @@
+"""
+HTTP 传输基准测试
+对比 aiohttp（HTTP/1.1）和 http2（httpx + h2）两种传输在并发扇出请求下的表现：每轮同时发出 fan-out 个请求
+（提交列表和 PR 列表交替），测量吞吐、单个请求和整轮的延迟、客户端 CPU 时间，以及桩服务统计的连接数和
+发送字节数。每种传输各自启动一个本地桩服务（HTTP/1.1 或明文 HTTP/2），默认开启响应压缩
+
+明文 HTTP/2 没有 TLS 握手，结果只反映连接数和多路复用的差异；访问 api.github.com 时每个新连接还需要 TLS 握手，
+HTTP/1.1 下连接越多这部分开销越大
+
+用法:
+    python scripts/bench_http_transport.py
+    python scripts/bench_http_transport.py --fan-out 200 --rounds 30 --latency 50 --no-compress
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from statistics import median
+from typing import Dict, List
+
+# 项目根目录
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts import github_stub
+
+TRANSPORTS = ["aiohttp", "http2"]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _stub_stats() -> Dict:
+    from src.github.server import github_api_request
+
+    result = await github_api_request("/_stats", use_cache=False)
+    return result["data"] if result["success"] else {}
+
+
+async def _run_transport(name: str, args) -> Dict:
+    """使用一种传输运行全部轮次"""
+    from src.github.server import (
+        close_session_pool,
+        enable_session_pool,
+        get_commits_by_repo_id,
+        get_pull_requests_by_repo_id
+    )
+
+    enable_session_pool()
+    latencies: List[float] = []
+    round_times: List[float] = []
+    errors = 0
+
+    async def timed(index: int) -> bool:
+        started = time.perf_counter()
+        if index % 2:
+            result = await get_pull_requests_by_repo_id(index, per_page=args.per_page)
+        else:
+            result = await get_commits_by_repo_id(index, per_page=args.per_page)
+        latencies.append((time.perf_counter() - started) * 1000)
+        return result["success"]
+
+    try:
+        before = await _stub_stats()
+        # 预热一轮（建立连接），不计入延迟统计，新建连接数包含预热
+        await asyncio.gather(*[timed(index) for index in range(args.fan_out)])
+        latencies.clear()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for round_index in range(args.rounds):
+            round_started = time.perf_counter()
+            base = (round_index + 1) * args.fan_out
+            results = await asyncio.gather(*[timed(base + index) for index in range(args.fan_out)])
+            round_times.append((time.perf_counter() - round_started) * 1000)
+            errors += sum(1 for ok in results if not ok)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        after = await _stub_stats()
+    finally:
+        await close_session_pool()
+
+    total = args.rounds * args.fan_out
+    return {
+        "transport": name,
+        "requests_per_s": round(total / elapsed, 1),
+        "round_p50_ms": round(median(round_times), 1),
+        "p50_ms": round(median(latencies), 1),
+        "p99_ms": round(_percentile(latencies, 0.99), 1),
+        "cpu_ms_per_request": round(cpu * 1000 / total, 3),
+        # 包含读取统计信息本身使用的连接
+        "connections": after.get("connections", 0) - before.get("connections", 0) + 1,
+        "kb_received": round((after.get("bytes_sent", 0) - before.get("bytes_sent", 0)) / 1024),
+        "errors": errors
+    }
+
+
+def main(argv=None) -> int:
+    """命令行入口，返回退出码"""
+    parser = argparse.ArgumentParser(description="对比 HTTP/1.1 与 HTTP/2 传输在并发扇出请求下的表现")
+    parser.add_argument("--fan-out", type=int, default=64, help="每轮同时发出的请求数，默认 64")
+    parser.add_argument("--rounds", type=int, default=20, help="测量轮数，默认 20")
+    parser.add_argument("--per-page", type=int, default=30, help="每个列表请求的条目数，默认 30")
+    parser.add_argument("--latency", type=float, default=20, help="桩服务响应延迟（毫秒），默认 20")
+    parser.add_argument("--no-compress", action="store_true", help="桩服务不压缩响应")
+    parser.add_argument("--transports", default=",".join(TRANSPORTS), help=f"参与对比的传输，逗号分隔，默认 {','.join(TRANSPORTS)}")
+    args = parser.parse_args(argv)
+
+    os.environ["GITHUB_CACHE_TTL"] = "0"
+    os.environ["GITHUB_PREFETCH"] = "0"
+    # 只比较传输本身，响应体在当前线程解析
+    os.environ["GITHUB_OFFLOAD_WORKERS"] = "0"
+    print(f"每轮并发 {args.fan_out} 个请求，共 {args.rounds} 轮，桩服务延迟 {args.latency:.0f} ms，压缩 {'关闭' if args.no_compress else '开启'}")
+
+    results = []
+    for name in [item.strip() for item in args.transports.split(",") if item.strip()]:
+        process, url = github_stub.spawn(latency=args.latency, http2=name == "http2", compress=not args.no_compress)
+        try:
+            asyncio.run(github_stub.wait_ready(url))
+            os.environ["GITHUB_API_BASE"] = url
+            os.environ["GITHUB_HTTP_TRANSPORT"] = name
+            results.append(asyncio.run(_run_transport(name, args)))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print()
+    print(
+        f"{'传输':<10}{'请求/秒':>10}{'整轮p50(ms)':>14}{'请求p50(ms)':>14}{'请求p99(ms)':>14}"
+        f"{'CPU(ms/请求)':>14}{'连接数':>10}{'接收(KB)':>10}{'错误':>6}"
+    )
+    for result in results:
+        print(
+            f"{result['transport']:<10}{result['requests_per_s']:>10}{result['round_p50_ms']:>14}{result['p50_ms']:>14}"
+            f"{result['p99_ms']:>14}{result['cpu_ms_per_request']:>14}{result['connections']:>10}"
+            f"{result['kb_received']:>10}{result['errors']:>6}"
+        )
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
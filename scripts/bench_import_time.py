@@ -0,0 +1,108 @@
+"""
+导入耗时基准测试
+使用 python -X importtime 在全新子进程中测量各入口模块的冷启动导入耗时，
+超出预算或提前导入了重量级依赖时返回非零退出码，可用于 CI 回归检查
+
+用法:
+    python scripts/bench_import_time.py
+    python scripts/bench_import_time.py --repeat 5 --budget-scale 1.5
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Tuple
+
+# 项目根目录
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# 入口模块 -> (导入耗时预算 ms, 导入该模块时不应加载的重量级依赖)
+BUDGETS: Dict[str, Tuple[float, List[str]]] = {
+    "src.chatbot": (15, ["openai", "aiohttp", "dotenv", "fastmcp", "src.mcp.github_tools"]),
+    "src.chatbot.chatbot": (120, ["openai", "aiohttp", "fastmcp", "numpy"]),
+    "src.github": (120, ["aiohttp", "httpx", "numpy", "dotenv"]),
+    "src.mcp.github_tools": (120, ["aiohttp", "httpx", "numpy", "fastmcp", "openai"]),
+    "src.mcp.gitcode_mcp": (2500, ["aiohttp", "numpy", "openai"]),
+}
+
+_LINE_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """
+    在子进程中导入模块并解析 -X importtime 输出
+
+    Args:
+        module: 模块名
+
+    Returns:
+        (累计导入耗时 ms, 导入过程中加载的所有模块名列表)
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{completed.stderr}")
+
+    cumulative_us = None
+    loaded = []
+    for line in completed.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        loaded.append(name)
+        if name == module and not match.group(3).strip(" "):
+            cumulative_us = int(match.group(2))
+    if cumulative_us is None:
+        # 模块已被解释器预加载时不会出现在输出中
+        cumulative_us = 0
+    return cumulative_us / 1000, loaded
+
+
+def main(argv=None) -> int:
+    """命令行入口，返回退出码"""
+    parser = argparse.ArgumentParser(description="测量入口模块的导入耗时并检查预算")
+    parser.add_argument("modules", nargs="*", help="要测量的模块，默认测量全部入口模块")
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块测量次数（取中位数），默认 3")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="预算放大系数（较慢的机器上可调大），默认 1.0")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or list(BUDGETS)
+    failures = []
+    print(f"{'模块':<24}{'中位数(ms)':>12}{'预算(ms)':>10}  结果")
+    for module in modules:
+        budget, forbidden = BUDGETS.get(module, (float("inf"), []))
+        budget *= args.budget_scale
+        samples = []
+        loaded: List[str] = []
+        for _ in range(max(1, args.repeat)):
+            elapsed, loaded = measure(module)
+            samples.append(elapsed)
+        elapsed = median(samples)
+
+        problems = []
+        if elapsed > budget:
+            problems.append(f"超出预算 {elapsed - budget:.1f} ms")
+        eager = sorted({name for name in loaded if name in forbidden})
+        if eager:
+            problems.append(f"提前导入: {', '.join(eager)}")
+
+        status = "通过" if not problems else "失败（" + "；".join(problems) + "）"
+        print(f"{module:<24}{elapsed:>12.1f}{budget:>10.0f}  {status}")
+        if problems:
+            failures.append(module)
+
+    if failures:
+        print(f"\n{len(failures)} 个模块未通过导入耗时检查")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
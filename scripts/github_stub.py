@@ -0,0 +1,466 @@
+"""
+GitHub API 桩服务
+在本地模拟 MCP 工具用到的 GitHub API（仓库查询与搜索、PR 列表、PR 详情与变更文件、提交历史），
+返回按 ID 确定性生成的数据，可配置响应延迟和压缩；设置 GITHUB_API_BASE 指向该服务即可在不访问 GitHub 的情况下
+运行 MCP 服务器、负载测试或示例。默认使用 aiohttp.web 提供 HTTP/1.1 服务，--http2 时提供明文 HTTP/2（h2c）服务
+
+用法:
+    python scripts/github_stub.py --port 8765 --latency 20
+    python scripts/github_stub.py --port 8766 --http2 --compress
+    GITHUB_API_BASE=http://127.0.0.1:8765 python -m src.mcp.gitcode_mcp
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import weakref
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+_TIMESTAMP = "2024-01-01T00:00:00Z"
+
+
+def _repo_id(full_name: str) -> int:
+    """由仓库全名生成稳定的仓库 ID"""
+    return zlib.crc32(full_name.lower().encode("utf-8")) % 10_000_000 + 1
+
+
+def _user(login: str) -> Dict:
+    return {"login": login, "avatar_url": f"https://avatars.example.com/{login}", "type": "User"}
+
+
+def _repository(full_name: str) -> Dict:
+    owner, name = full_name.split("/", 1)
+    return {
+        "id": _repo_id(full_name),
+        "name": name,
+        "full_name": full_name,
+        "description": f"Stub repository {full_name}",
+        "html_url": f"https://github.com/{full_name}",
+        "language": "Python",
+        "stargazers_count": len(full_name) * 7,
+        "forks_count": len(full_name),
+        "watchers_count": len(full_name) * 7,
+        "open_issues_count": 3,
+        "default_branch": "main",
+        "created_at": _TIMESTAMP,
+        "updated_at": _TIMESTAMP,
+        "pushed_at": _TIMESTAMP,
+        "private": False,
+        "fork": False,
+        "topics": ["stub"],
+        "license": None,
+        "owner": _user(owner)
+    }
+
+
+def _pull_request(repo_id: int, number: int, changed_files: int) -> Dict:
+    ref = {"ref": "main", "sha": f"{repo_id:08x}{number:08x}", "repo": {"full_name": f"stub/repo-{repo_id}"}}
+    return {
+        "number": number,
+        "title": f"Stub pull request #{number}",
+        "body": f"Changes for pull request #{number} in repository {repo_id}",
+        "state": "open",
+        "html_url": f"https://github.com/stub/repo-{repo_id}/pull/{number}",
+        "user": _user(f"author{number % 5}"),
+        "created_at": _TIMESTAMP,
+        "updated_at": _TIMESTAMP,
+        "merged_at": None,
+        "mergeable": True,
+        "merged": False,
+        "draft": False,
+        "additions": changed_files * 10,
+        "deletions": changed_files * 4,
+        "changed_files": changed_files,
+        "commits": 1,
+        "head": dict(ref, ref=f"feature-{number}"),
+        "base": ref
+    }
+
+
+def _pull_request_file(index: int, patch_lines: int = 10) -> Dict:
+    filename = f"src/module_{index // 20}/file_{index}.py"
+    return {
+        "filename": filename,
+        "status": "modified",
+        "additions": patch_lines,
+        "deletions": 4,
+        "changes": patch_lines + 4,
+        "patch": f"@@ -1,4 +1,{patch_lines} @@\n" + f"+stub line {index}\n" * patch_lines,
+        "blob_url": f"https://github.com/stub/blob/main/{filename}",
+        "raw_url": f"https://github.com/stub/raw/main/{filename}",
+        "contents_url": f"https://api.github.com/stub/contents/{filename}"
+    }
+
+
+def _commit(repo_id: int, index: int) -> Dict:
+    sha = f"{repo_id:08x}{index:032x}"
+    person = {"name": f"author{index % 5}", "email": f"author{index % 5}@example.com", "date": _TIMESTAMP}
+    return {
+        "sha": sha,
+        "commit": {"message": f"Stub commit {index}", "author": person, "committer": person},
+        "url": f"https://api.github.com/repos/stub/commits/{sha}",
+        "html_url": f"https://github.com/stub/commit/{sha}"
+    }
+
+
+def _encode_body(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """按 Accept-Encoding 压缩响应体（优先 br，其次 gzip），返回 (响应体, Content-Encoding)"""
+    accepted = {item.split(";")[0].strip().lower() for item in accept_encoding.split(",")}
+    if "br" in accepted:
+        try:
+            import brotli
+        except ImportError:
+            pass
+        else:
+            return brotli.compress(body, quality=4), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+class GitHubStub:
+    """GitHub API 桩服务"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, pr_files: int = 250, patch_lines: int = 10, seed: Optional[int] = None, compress: bool = False):
+        """
+        初始化桩服务
+
+        Args:
+            latency: 每个响应的基础延迟（毫秒）
+            jitter: 在基础延迟上增加的随机延迟上限（毫秒）
+            pr_files: 每个 PR 的变更文件数
+            patch_lines: 每个变更文件补丁的行数（控制 PR 变更文件响应的大小）
+            seed: 随机延迟的种子
+            compress: 是否按 Accept-Encoding 压缩响应（gzip，安装了 brotli 时优先 br）
+        """
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.pr_files = pr_files
+        self.patch_lines = patch_lines
+        self.compress = compress
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._rate_limit_reset = int(time.time()) + 3600
+        self._transports: "weakref.WeakSet" = weakref.WeakSet()
+        self.routes = [
+            (re.compile(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)$"), self.get_repository),
+            (re.compile(r"^/search/repositories$"), self.search_repositories),
+            (re.compile(r"^/users/(?P<username>[^/]+)/repos$"), self.list_user_repositories),
+            (re.compile(r"^/repositories/(?P<repo_id>\d+)/pulls$"), self.list_pull_requests),
+            (re.compile(r"^/repositories/(?P<repo_id>\d+)/pulls/(?P<number>\d+)$"), self.get_pull_request),
+            (re.compile(r"^/repositories/(?P<repo_id>\d+)/pulls/(?P<number>\d+)/files$"), self.list_pull_request_files),
+            (re.compile(r"^/repositories/(?P<repo_id>\d+)/commits$"), self.list_commits),
+            (re.compile(r"^/_stats$"), self.stats)
+        ]
+        self.app = web.Application()
+        self.app.router.add_get("/{path:.*}", self._handle_http1)
+
+    async def handle(self, path: str, query: Dict[str, str], accept_encoding: str = "") -> Tuple[int, Dict[str, str], bytes]:
+        """
+        处理一个请求（HTTP/1.1 和 HTTP/2 共用）：增加延迟、路由、序列化和压缩
+
+        Returns:
+            (状态码, 响应头, 响应体)
+        """
+        self.requests += 1
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                status, data = handler(match.groupdict(), query)
+                break
+        else:
+            status, data = 404, {"message": "Not Found"}
+
+        body = json.dumps(data).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            "X-RateLimit-Limit": "1000000",
+            "X-RateLimit-Remaining": str(1000000 - self.requests % 1000000),
+            "X-RateLimit-Reset": str(self._rate_limit_reset)
+        }
+        if self.compress:
+            body, encoding = _encode_body(body, accept_encoding)
+            if encoding:
+                headers["Content-Encoding"] = encoding
+        self.bytes_sent += len(body)
+        return status, headers, body
+
+    async def _handle_http1(self, request: web.Request) -> web.Response:
+        if request.transport is not None and request.transport not in self._transports:
+            self._transports.add(request.transport)
+            self.connections += 1
+        status, headers, body = await self.handle(request.path, dict(request.query), request.headers.get("Accept-Encoding", ""))
+        return web.Response(status=status, headers=headers, body=body)
+
+    @staticmethod
+    def _page(query: Dict[str, str]) -> Tuple[int, int]:
+        """读取分页参数 (per_page, page)"""
+        per_page = min(100, int(query.get("per_page", 30)))
+        page = max(1, int(query.get("page", 1)))
+        return per_page, page
+
+    def get_repository(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        if params["repo"].startswith("missing"):
+            return 404, {"message": "Not Found"}
+        return 200, _repository(f"{params['owner']}/{params['repo']}")
+
+    def search_repositories(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        keyword = query.get("q", "").split(" ")[0].split("/")[-1] or "repo"
+        per_page, _ = self._page(query)
+        items: List[Dict] = [_repository(f"stub{i}/{keyword}") for i in range(min(per_page, 5))]
+        return 200, {"total_count": len(items), "incomplete_results": False, "items": items}
+
+    def list_user_repositories(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        per_page, page = self._page(query)
+        start = (page - 1) * per_page
+        return 200, [_repository(f"{params['username']}/repo-{index}") for index in range(start, start + per_page)]
+
+    def list_pull_requests(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        repo_id = int(params["repo_id"])
+        per_page, page = self._page(query)
+        start = (page - 1) * per_page + 1
+        return 200, [_pull_request(repo_id, number, self.pr_files) for number in range(start, start + per_page)]
+
+    def get_pull_request(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        return 200, _pull_request(int(params["repo_id"]), int(params["number"]), self.pr_files)
+
+    def list_pull_request_files(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        per_page, page = self._page(query)
+        start = (page - 1) * per_page
+        end = min(self.pr_files, 3000, start + per_page)
+        return 200, [_pull_request_file(index, self.patch_lines) for index in range(start, end)]
+
+    def list_commits(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        repo_id = int(params["repo_id"])
+        per_page, page = self._page(query)
+        start = (page - 1) * per_page
+        return 200, [_commit(repo_id, index) for index in range(start, start + per_page)]
+
+    def stats(self, params: Dict[str, str], query: Dict[str, str]) -> Tuple[int, Any]:
+        return 200, {"requests": self.requests, "connections": self.connections, "bytes_sent": self.bytes_sent}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """
+        在当前事件循环上启动 HTTP/1.1 服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机分配
+
+        Returns:
+            AppRunner（调用 cleanup() 停止服务），实际地址保存在 self.url
+        """
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return runner
+
+    async def start_http2(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """
+        在当前事件循环上启动明文 HTTP/2 服务（h2c，客户端需直接以 HTTP/2 连接）
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机分配
+
+        Returns:
+            asyncio Server（调用 close() 停止服务），实际地址保存在 self.url
+        """
+        server = await asyncio.get_running_loop().create_server(lambda: _H2Protocol(self), host, port)
+        bound_port = server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return server
+
+
+class _H2Protocol(asyncio.Protocol):
+    """最小的 HTTP/2 服务端连接（基于 h2），每个流交给 GitHubStub.handle 处理"""
+
+    def __init__(self, stub: GitHubStub):
+        import h2.config
+        import h2.connection
+
+        self.stub = stub
+        self.conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        self.transport: Optional[asyncio.Transport] = None
+        self._requests: Dict[int, Dict[str, str]] = {}
+        # 等待流控窗口的流 -> Future
+        self._window_waiters: Dict[int, asyncio.Future] = {}
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self._counted = False
+        self.conn.initiate_connection()
+        transport.write(self.conn.data_to_send())
+
+    def connection_lost(self, exc):
+        for waiter in self._window_waiters.values():
+            if not waiter.done():
+                waiter.set_exception(ConnectionError("连接已关闭"))
+
+    def data_received(self, data: bytes):
+        import h2.events
+        import h2.exceptions
+
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.conn.data_to_send())
+            self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                if not self._counted:
+                    # 与 HTTP/1.1 一致，只统计发送过请求的连接
+                    self._counted = True
+                    self.stub.connections += 1
+                self._requests[event.stream_id] = dict(event.headers)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers = self._requests.pop(event.stream_id, None)
+                if headers is not None:
+                    asyncio.get_running_loop().create_task(self._respond(event.stream_id, headers))
+            elif isinstance(event, h2.events.WindowUpdated):
+                self._wake(event.stream_id)
+            elif isinstance(event, h2.events.StreamReset):
+                self._requests.pop(event.stream_id, None)
+                self._wake(event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.conn.data_to_send())
+
+    def _wake(self, stream_id: int):
+        """流控窗口变化时唤醒等待的流（stream_id 为 0 表示整个连接的窗口）"""
+        waiters = list(self._window_waiters.items()) if stream_id == 0 else [(stream_id, self._window_waiters.get(stream_id))]
+        for key, waiter in waiters:
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+            self._window_waiters.pop(key, None)
+
+    async def _respond(self, stream_id: int, request_headers: Dict[str, str]):
+        import h2.exceptions
+
+        path, _, query = request_headers.get(":path", "/").partition("?")
+        status, headers, body = await self.stub.handle(path, dict(parse_qsl(query)), request_headers.get("accept-encoding", ""))
+        try:
+            self.conn.send_headers(stream_id, [
+                (":status", str(status)),
+                ("content-length", str(len(body))),
+                *((key.lower(), value) for key, value in headers.items())
+            ])
+            while body:
+                # 按流控窗口和最大帧大小分块发送
+                while self.conn.local_flow_control_window(stream_id) <= 0:
+                    waiter = self._window_waiters[stream_id] = asyncio.get_running_loop().create_future()
+                    await waiter
+                size = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size, len(body))
+                self.conn.send_data(stream_id, body[:size])
+                body = body[size:]
+                self.transport.write(self.conn.data_to_send())
+            self.conn.end_stream(stream_id)
+            self.transport.write(self.conn.data_to_send())
+        except (h2.exceptions.StreamClosedError, h2.exceptions.ProtocolError, ConnectionError):
+            # 客户端已取消该流或连接已关闭
+            pass
+
+
+def spawn(latency: float = 0.0, jitter: float = 0.0, pr_files: int = 250, patch_lines: int = 10, http2: bool = False, compress: bool = False) -> Tuple[subprocess.Popen, str]:
+    """
+    在子进程中启动桩服务（随机空闲端口），桩服务的开销不计入调用方进程
+
+    Args:
+        latency: 每个响应的基础延迟（毫秒）
+        jitter: 随机附加延迟上限（毫秒）
+        pr_files: 每个 PR 的变更文件数
+        patch_lines: 每个变更文件补丁的行数
+        http2: 是否以明文 HTTP/2（h2c）提供服务
+        compress: 是否按 Accept-Encoding 压缩响应
+
+    Returns:
+        (子进程, 服务地址)，调用方负责 terminate 子进程；可用 wait_ready 等待服务可用
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [
+        sys.executable, str(Path(__file__).resolve()),
+        "--port", str(port), "--latency", str(latency), "--jitter", str(jitter),
+        "--pr-files", str(pr_files), "--patch-lines", str(patch_lines)
+    ]
+    if http2:
+        command.append("--http2")
+    if compress:
+        command.append("--compress")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_ready(url: str, timeout: float = 15.0):
+    """等待桩服务开始接受连接（HTTP/1.1 和 HTTP/2 均适用），超时抛出 RuntimeError"""
+    from urllib.parse import urlsplit
+
+    address = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(address.hostname, address.port)
+        except OSError:
+            pass
+        else:
+            writer.close()
+            await writer.wait_closed()
+            return
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"桩服务 {url} 未在 {timeout} 秒内启动")
+        await asyncio.sleep(0.1)
+
+
+async def _serve_http2(stub: GitHubStub, host: str, port: int):
+    server = await stub.start_http2(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="启动本地 GitHub API 桩服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口，默认 8765")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个响应的基础延迟（毫秒），默认 0")
+    parser.add_argument("--jitter", type=float, default=0.0, help="随机附加延迟上限（毫秒），默认 0")
+    parser.add_argument("--pr-files", type=int, default=250, help="每个 PR 的变更文件数，默认 250")
+    parser.add_argument("--patch-lines", type=int, default=10, help="每个变更文件补丁的行数，默认 10")
+    parser.add_argument("--http2", action="store_true", help="以明文 HTTP/2（h2c）提供服务，需要安装 h2")
+    parser.add_argument("--compress", action="store_true", help="按 Accept-Encoding 压缩响应（gzip，安装了 brotli 时优先 br）")
+    args = parser.parse_args(argv)
+
+    stub = GitHubStub(latency=args.latency, jitter=args.jitter, pr_files=args.pr_files, patch_lines=args.patch_lines, compress=args.compress)
+    protocol = "HTTP/2" if args.http2 else "HTTP/1.1"
+    print(f"GitHub API 桩服务（{protocol}）: http://{args.host}:{args.port}（设置 GITHUB_API_BASE 指向该地址）")
+    if args.http2:
+        try:
+            asyncio.run(_serve_http2(stub, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        web.run_app(stub.app, host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+MCP 服务器负载 / 浸泡测试
+在同一进程内创建多个 FastMCP 客户端（内存传输），并发调用 search_repository、get_pull_requests、
+get_pull_request_files、get_commits，GitHub 请求发往本地桩服务（scripts/github_stub.py，默认在子进程中启动，
+进程内统计只反映 MCP 服务器一侧）。定期输出吞吐量、延迟分位数、RSS 和打开的 socket 数，
+结束时汇总各工具的延迟和 RSS 增长；错误率或 RSS 增长超出阈值时返回非零退出码
+
+用法:
+    python scripts/mcp_load_test.py --clients 32 --duration 60
+    python scripts/mcp_load_test.py --clients 64 --duration 3600 --interval 60 --max-rss-growth 50 --output soak.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 项目根目录
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts import github_stub
+
+TOOLS = ["search_repository", "get_pull_requests", "get_pull_request_files", "get_commits"]
+
+
+class LatencyHistogram:
+    """固定内存的延迟直方图（对数分桶，相对误差约 2.5%），长时间浸泡测试时内存不随调用次数增长"""
+
+    _BASE = math.log(1.05)
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        index = int(math.log(max(ms, 0.001) * 1000) / self._BASE)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """延迟分位数（毫秒，取分桶上界）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return round(min(math.exp((index + 1) * self._BASE) / 1000, self.max), 2)
+        return round(self.max, 2)
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存（MB）；没有 /proc 时退回峰值 RSS"""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def open_sockets() -> Optional[int]:
+    """当前进程打开的 socket 数（需要 /proc，不可用时返回 None）"""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}").startswith("socket:"):
+                count += 1
+        except OSError:
+            continue
+    return count
+
+
+class LoadTest:
+    """驱动 MCP 工具的并发负载测试"""
+
+    def __init__(self, clients: int, duration: float, interval: float, warmup: float, repos: int, pr_files_limit: Optional[int], seed: int):
+        self.clients = clients
+        self.duration = duration
+        self.interval = interval
+        self.warmup = warmup
+        self.repo_names = [f"stub/repo-{i}" for i in range(repos)]
+        self.pr_files_limit = pr_files_limit
+        self.random = random.Random(seed)
+        self.repo_ids: List[int] = []
+        self.totals = {tool: LatencyHistogram() for tool in TOOLS}
+        self.errors = {tool: 0 for tool in TOOLS}
+        self.window = LatencyHistogram()
+        self.window_errors = 0
+        self.samples: List[Dict] = []
+        self.error_examples: List[str] = []
+        self.log_messages = 0
+        self._stop_at = 0.0
+
+    def _arguments(self, tool: str) -> Dict:
+        if tool == "search_repository":
+            return {"repo_url": self.random.choice(self.repo_names)}
+        repo_id = self.random.choice(self.repo_ids)
+        if tool == "get_pull_requests":
+            return {"repo_id": repo_id, "per_page": 30}
+        if tool == "get_pull_request_files":
+            arguments = {"repo_id": repo_id, "pr_number": self.random.randint(1, 30)}
+            if self.pr_files_limit:
+                arguments["max_files"] = self.pr_files_limit
+            return arguments
+        return {"repo_id": repo_id, "per_page": 30}
+
+    async def _call(self, client, tool: str, arguments: Dict) -> bool:
+        """调用一次工具，返回是否成功"""
+        try:
+            result = await client.call_tool(tool, arguments, raise_on_error=False)
+        except Exception as e:
+            self._remember_error(f"{tool}: {type(e).__name__}: {e}")
+            return False
+        content = result.structured_content or {}
+        if result.is_error or not content.get("success", False):
+            self._remember_error(f"{tool}: {content.get('error') or result.content}")
+            return False
+        return True
+
+    async def _on_log(self, message):
+        """客户端日志处理：只计数，不输出到控制台（否则测量的是控制台输出而不是服务器）"""
+        self.log_messages += 1
+
+    def _remember_error(self, message: str):
+        if len(self.error_examples) < 5:
+            self.error_examples.append(message[:200])
+
+    async def _worker(self, mcp):
+        from fastmcp import Client
+
+        async with Client(mcp, log_handler=self._on_log) as client:
+            while time.monotonic() < self._stop_at:
+                tool = self.random.choice(TOOLS)
+                started = time.perf_counter()
+                ok = await self._call(client, tool, self._arguments(tool))
+                elapsed = (time.perf_counter() - started) * 1000
+                self.totals[tool].record(elapsed)
+                self.window.record(elapsed)
+                if not ok:
+                    self.errors[tool] += 1
+                    self.window_errors += 1
+
+    def _sample(self, elapsed: float, interval: float) -> Dict:
+        """记录一个统计周期"""
+        sample = {
+            "elapsed_s": round(elapsed, 1),
+            "calls": self.window.count,
+            "throughput": round(self.window.count / interval, 1) if interval else 0.0,
+            "errors": self.window_errors,
+            "p50_ms": self.window.percentile(0.5),
+            "p95_ms": self.window.percentile(0.95),
+            "p99_ms": self.window.percentile(0.99),
+            "rss_mb": round(rss_mb(), 1),
+            "sockets": open_sockets()
+        }
+        self.samples.append(sample)
+        self.window = LatencyHistogram()
+        self.window_errors = 0
+        return sample
+
+    async def run(self, mcp) -> Dict:
+        from fastmcp import Client
+
+        # 控制连接在整个测试期间保持打开，服务器的 lifespan（连接池）不会随单个客户端断开而关闭
+        async with Client(mcp, log_handler=self._on_log) as control:
+            for name in self.repo_names:
+                result = await control.call_tool("search_repository", {"repo_url": name})
+                self.repo_ids.append(result.structured_content["data"]["repositories"][0]["id"])
+
+            started = time.monotonic()
+            self._stop_at = started + self.warmup + self.duration
+            workers = [asyncio.create_task(self._worker(mcp)) for _ in range(self.clients)]
+
+            # 预热阶段结束后记录 RSS 基线
+            await asyncio.sleep(self.warmup)
+            baseline_rss = rss_mb()
+            for histogram in self.totals.values():
+                histogram.__init__()
+            self.errors = {tool: 0 for tool in TOOLS}
+            self.window = LatencyHistogram()
+            self.window_errors = 0
+            print(f"预热 {self.warmup:.0f} 秒完成，RSS 基线 {baseline_rss:.1f} MB，开始测量 {self.duration:.0f} 秒", flush=True)
+
+            last = time.monotonic()
+            while not all(worker.done() for worker in workers):
+                await asyncio.wait(workers, timeout=max(0.0, min(self.interval, self._stop_at - time.monotonic())) or None)
+                now = time.monotonic()
+                if now - last >= self.interval or all(worker.done() for worker in workers):
+                    sample = self._sample(now - started - self.warmup, now - last)
+                    last = now
+                    print(
+                        f"[{sample['elapsed_s']:>7.1f}s] {sample['throughput']:>8.1f} 次/秒  错误 {sample['errors']:<4} "
+                        f"p50 {sample['p50_ms']} ms  p95 {sample['p95_ms']} ms  p99 {sample['p99_ms']} ms  "
+                        f"RSS {sample['rss_mb']} MB ({sample['rss_mb'] - baseline_rss:+.1f})  sockets {sample['sockets']}",
+                        flush=True
+                    )
+            for worker in workers:
+                worker.result()
+
+        return self._report(baseline_rss)
+
+    def _report(self, baseline_rss: float) -> Dict:
+        overall = LatencyHistogram()
+        tools = {}
+        for tool, histogram in self.totals.items():
+            overall.merge(histogram)
+            tools[tool] = {
+                "calls": histogram.count,
+                "errors": self.errors[tool],
+                "p50_ms": histogram.percentile(0.5),
+                "p95_ms": histogram.percentile(0.95),
+                "p99_ms": histogram.percentile(0.99),
+                "max_ms": round(histogram.max, 2)
+            }
+        errors = sum(self.errors.values())
+        final_rss = self.samples[-1]["rss_mb"] if self.samples else rss_mb()
+        sockets = [sample["sockets"] for sample in self.samples if sample["sockets"] is not None]
+        return {
+            "clients": self.clients,
+            "duration_s": self.duration,
+            "calls": overall.count,
+            "errors": errors,
+            "error_rate": round(errors / overall.count, 6) if overall.count else 0.0,
+            "throughput": round(overall.count / self.duration, 1) if self.duration else 0.0,
+            "p50_ms": overall.percentile(0.5),
+            "p95_ms": overall.percentile(0.95),
+            "p99_ms": overall.percentile(0.99),
+            "rss_baseline_mb": round(baseline_rss, 1),
+            "rss_final_mb": final_rss,
+            "rss_peak_mb": max([sample["rss_mb"] for sample in self.samples] or [final_rss]),
+            "rss_growth_mb": round(final_rss - baseline_rss, 1),
+            "sockets_max": max(sockets) if sockets else None,
+            "sockets_final": sockets[-1] if sockets else None,
+            "tools": tools,
+            "log_messages": self.log_messages,
+            "samples": self.samples,
+            "error_examples": self.error_examples
+        }
+
+
+def print_report(report: Dict):
+    print()
+    print(f"{'工具':<26}{'调用':>9}{'错误':>7}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for tool, stats in report["tools"].items():
+        print(
+            f"{tool:<26}{stats['calls']:>9}{stats['errors']:>7}{stats['p50_ms'] or '-':>10}"
+            f"{stats['p95_ms'] or '-':>10}{stats['p99_ms'] or '-':>10}{stats['max_ms']:>10}"
+        )
+    print()
+    print(
+        f"合计 {report['calls']} 次调用，{report['throughput']} 次/秒，错误率 {report['error_rate']:.4%}，"
+        f"p50 {report['p50_ms']} ms，p95 {report['p95_ms']} ms，p99 {report['p99_ms']} ms"
+    )
+    print(
+        f"RSS: 基线 {report['rss_baseline_mb']} MB，结束 {report['rss_final_mb']} MB，峰值 {report['rss_peak_mb']} MB，"
+        f"增长 {report['rss_growth_mb']:+} MB；sockets 最多 {report['sockets_max']}，结束时 {report['sockets_final']}"
+    )
+    print(f"服务器推送的日志消息: {report['log_messages']} 条")
+    for example in report["error_examples"]:
+        print(f"  错误示例: {example}")
+
+
+async def _main(args) -> Dict:
+    stub_process = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub_process, stub_url = github_stub.spawn(latency=args.latency, jitter=args.jitter, pr_files=args.pr_files)
+    try:
+        await github_stub.wait_ready(stub_url)
+        # 在导入 MCP 服务器之前配置环境变量（响应缓存在首次使用时按环境变量创建）
+        os.environ["GITHUB_API_BASE"] = stub_url
+        os.environ["GITHUB_CACHE_TTL"] = str(args.cache_ttl)
+        os.environ["GITHUB_PREFETCH"] = "1" if args.prefetch else "0"
+        from src.mcp.gitcode_mcp import mcp
+
+        test = LoadTest(
+            clients=args.clients,
+            duration=args.duration,
+            interval=args.interval,
+            warmup=args.warmup,
+            repos=args.repos,
+            pr_files_limit=args.max_files,
+            seed=args.seed
+        )
+        print(f"{args.clients} 个客户端，测量 {args.duration:.0f} 秒，桩服务 {stub_url}（延迟 {args.latency} ms）", flush=True)
+        return await test.run(mcp)
+    finally:
+        if stub_process is not None:
+            stub_process.terminate()
+            stub_process.wait(timeout=10)
+
+
+def main(argv=None) -> int:
+    """命令行入口，返回退出码"""
+    parser = argparse.ArgumentParser(description="MCP 服务器并发负载 / 浸泡测试")
+    parser.add_argument("--clients", type=int, default=32, help="并发客户端数，默认 32")
+    parser.add_argument("--duration", type=float, default=60, help="测量时长（秒），默认 60")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长（秒，不计入统计，结束时记录 RSS 基线），默认 5")
+    parser.add_argument("--interval", type=float, default=10, help="统计输出间隔（秒），默认 10")
+    parser.add_argument("--repos", type=int, default=20, help="轮流查询的仓库数，默认 20")
+    parser.add_argument("--max-files", type=int, help="get_pull_request_files 的 max_files 参数，默认使用工具的默认值（300）")
+    parser.add_argument("--stub-url", help="使用已启动的桩服务地址，默认在子进程中启动 scripts/github_stub.py")
+    parser.add_argument("--latency", type=float, default=20, help="桩服务响应延迟（毫秒），默认 20")
+    parser.add_argument("--jitter", type=float, default=10, help="桩服务随机附加延迟上限（毫秒），默认 10")
+    parser.add_argument("--pr-files", type=int, default=250, help="桩服务中每个 PR 的变更文件数，默认 250")
+    parser.add_argument("--cache-ttl", type=float, default=0, help="GitHub 响应缓存有效期（秒），默认 0（每次调用都请求桩服务）")
+    parser.add_argument("--prefetch", action="store_true", help="启用预取（默认关闭）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，默认 0")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="允许的最大错误率，默认 0.01")
+    parser.add_argument("--max-rss-growth", type=float, help="允许的最大 RSS 增长（MB），默认不检查")
+    parser.add_argument("--output", help="将完整报告（含每个统计周期的数据）写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_main(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    if report["error_rate"] > args.max_error_rate:
+        failures.append(f"错误率 {report['error_rate']:.4%} 超过 {args.max_error_rate:.4%}")
+    if args.max_rss_growth is not None and report["rss_growth_mb"] > args.max_rss_growth:
+        failures.append(f"RSS 增长 {report['rss_growth_mb']} MB 超过 {args.max_rss_growth} MB")
+    for failure in failures:
+        print(f"未通过: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
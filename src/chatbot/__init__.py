@@ -1,7 +1,19 @@
 """
 聊天机器人模块
 """
-from .chatbot import ChatBot
 
-__all__ = ['ChatBot']
+__all__ = ['ChatBot', 'CompletionCache', 'SessionStore']
 
+
+def __getattr__(name):
+    # 延迟导入，避免 import src.chatbot 时就加载 openai 等依赖
+    if name == 'ChatBot':
+        from .chatbot import ChatBot
+        return ChatBot
+    if name == 'CompletionCache':
+        from .completion_cache import CompletionCache
+        return CompletionCache
+    if name == 'SessionStore':
+        from .session_store import SessionStore
+        return SessionStore
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,299 @@
+"""
+批量运行聊天提示词
+从 JSONL 文件读取提示词，使用线程池并发执行对话（含工具调用循环），
+将回复、耗时和 token 用量写入输出 JSONL，支持中断后续跑
+
+用法:
+    python -m src.chatbot.batch prompts.jsonl -o results.jsonl -w 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set
+
+from ..config import get_env
+from .chatbot import ChatBot
+from .completion_cache import CompletionCache
+
+
+def load_prompts(path: str) -> Iterator[Dict]:
+    """
+    读取提示词 JSONL 文件
+
+    每行是一个 JSON 对象，提示词按以下顺序取值: prompt、content、title + body；
+    ID 按以下顺序取值: id、request_id，缺省时使用行号
+
+    Args:
+        path: JSONL 文件路径
+
+    Yields:
+        {"id": str, "prompt": str, "record": dict}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            prompt = record.get("prompt") or record.get("content")
+            if not prompt:
+                prompt = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            if not prompt:
+                raise ValueError(f"{path} 第 {line_no} 行缺少提示词（prompt / content / title / body）")
+            prompt_id = record.get("id") or record.get("request_id") or f"line-{line_no}"
+            yield {"id": str(prompt_id), "prompt": prompt, "record": record}
+
+
+def load_completed_ids(path: str, retry_failed: bool = False) -> Set[str]:
+    """
+    读取已有输出文件中已完成的提示词 ID（用于续跑）
+
+    Args:
+        path: 输出 JSONL 文件路径
+        retry_failed: 为 True 时失败的记录不算完成，会被重新执行
+
+    Returns:
+        已完成的 ID 集合
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断时可能留下不完整的最后一行
+                continue
+            if retry_failed and result.get("error"):
+                continue
+            completed.add(str(result.get("id")))
+    return completed
+
+
+class BatchRunner:
+    """使用线程池并发执行提示词的批量运行器，每个工作线程持有独立的 ChatBot"""
+
+    def __init__(self, output_path: str, workers: int = 4, model: str = "Qwen/Qwen3-235B-A22B", enable_tools: bool = True, max_iterations: int = 10, completion_cache: Optional[CompletionCache] = None, use_cache: bool = True, turn_timeout: Optional[float] = None):
+        """
+        初始化批量运行器
+
+        Args:
+            output_path: 输出 JSONL 文件路径（追加写入）
+            workers: 并发工作线程数
+            model: 使用的模型名称
+            enable_tools: 是否启用 GitHub 工具
+            max_iterations: 每个提示词的最大工具调用迭代次数
+            completion_cache: 可选的补全缓存，所有工作线程共用
+            use_cache: 是否读取补全缓存（为 False 时只写入，用于刷新缓存）
+            turn_timeout: 每个提示词的时间预算（秒），超时后返回已有的部分结果，None 表示不限时
+        """
+        self.output_path = output_path
+        self.workers = max(1, workers)
+        self.model = model
+        self.enable_tools = enable_tools
+        self.max_iterations = max_iterations
+        self.completion_cache = completion_cache
+        self.use_cache = use_cache
+        self.turn_timeout = turn_timeout
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._bots: List[ChatBot] = []
+        # 所有工作线程共用一个后台事件循环执行工具调用，复用 GitHub 连接
+        self._github_client = None
+        # 配置了多个服务端点（OPENAI_API_BASES）时所有工作线程共用一个端点池
+        self._endpoints = None
+
+    def _get_bot(self) -> ChatBot:
+        """获取当前线程的 ChatBot（首次调用时创建）"""
+        bot = getattr(self._local, "bot", None)
+        if bot is None:
+            with self._write_lock:
+                if self._github_client is None and self.enable_tools:
+                    from ..github.runner import SyncGitHubClient
+                    self._github_client = SyncGitHubClient()
+                if self._endpoints is None and get_env("OPENAI_API_BASES"):
+                    from .endpoints import EndpointPool
+                    self._endpoints = EndpointPool.from_env()
+            bot = ChatBot(
+                model=self.model,
+                enable_tools=self.enable_tools,
+                github_client=self._github_client,
+                completion_cache=self.completion_cache,
+                endpoints=self._endpoints,
+                turn_timeout=self.turn_timeout
+            )
+            self._local.bot = bot
+            with self._write_lock:
+                self._bots.append(bot)
+        return bot
+
+    def close(self):
+        """关闭所有工作线程的 ChatBot、共享的后台事件循环和端点池"""
+        for bot in self._bots:
+            bot.close()
+        self._bots = []
+        if self._github_client is not None:
+            self._github_client.close()
+            self._github_client = None
+        if self._endpoints is not None:
+            self._endpoints.close()
+            self._endpoints = None
+
+    def run_one(self, item: Dict) -> Dict:
+        """
+        执行单个提示词（每个提示词使用全新的对话历史）
+
+        Args:
+            item: load_prompts 产出的提示词字典
+
+        Returns:
+            结果字典
+        """
+        started = time.perf_counter()
+        response = None
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        cache_hits = 0
+        memo_hits = 0
+        try:
+            bot = self._get_bot()
+            bot.conversation_history = []
+            if bot.tool_memo is not None:
+                # 工具结果记忆只在同一个对话内有效
+                bot.tool_memo.clear()
+            response = bot.chat(item["prompt"], max_iterations=self.max_iterations, use_cache=self.use_cache)
+            usage = dict(bot.last_usage)
+            cache_hits = bot.last_cache_hits
+            memo_hits = bot.last_memo_hits
+            error = bot.last_error
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        return {
+            "id": item["id"],
+            "prompt": item["prompt"],
+            "response": None if error else response,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "usage": usage,
+            "cache_hits": cache_hits,
+            "memo_hits": memo_hits,
+            "model": self.model,
+            "finished_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        }
+
+    def _write(self, result: Dict):
+        """追加写入一条结果，每行写完立即刷新，保证中断后可续跑"""
+        with self._write_lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+
+    def run(self, items: List[Dict]) -> Dict:
+        """
+        并发执行一批提示词
+
+        Args:
+            items: 待执行的提示词列表
+
+        Returns:
+            汇总统计: {"total": int, "succeeded": int, "failed": int, "elapsed_s": float, "total_tokens": int, "cache": dict}
+        """
+        started = time.perf_counter()
+        succeeded = failed = total_tokens = 0
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-chat")
+        try:
+            futures = [executor.submit(self.run_one, item) for item in items]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                self._write(result)
+                total_tokens += result["usage"]["total_tokens"]
+                if result["error"]:
+                    failed += 1
+                else:
+                    succeeded += 1
+                status = f"失败: {result['error']}" if result["error"] else "完成"
+                print(f"[{done}/{len(items)}] {result['id']} {status} ({result['latency_ms']:.0f} ms)", file=sys.stderr)
+        except KeyboardInterrupt:
+            # 取消排队中的提示词，不等待正在执行的请求
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_s": round(time.perf_counter() - started, 2),
+            "total_tokens": total_tokens,
+            "cache": self.completion_cache.stats() if self.completion_cache is not None else None
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="从 JSONL 文件批量运行聊天提示词")
+    parser.add_argument("input", help="提示词 JSONL 文件路径")
+    parser.add_argument("-o", "--output", help="结果 JSONL 文件路径，默认为 <input>.results.jsonl")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并发工作线程数，默认 4")
+    parser.add_argument("--model", default="Qwen/Qwen3-235B-A22B", help="模型名称")
+    parser.add_argument("--no-tools", action="store_true", help="禁用 GitHub 工具")
+    parser.add_argument("--max-iterations", type=int, default=10, help="每个提示词的最大工具调用迭代次数，默认 10")
+    parser.add_argument("--retry-failed", action="store_true", help="续跑时重新执行之前失败的提示词")
+    parser.add_argument("--cache", metavar="PATH", help="补全缓存 SQLite 文件路径，启用后相同的请求直接返回缓存结果")
+    parser.add_argument("--cache-ttl", type=float, default=86400, help="补全缓存有效期（秒），默认 86400")
+    parser.add_argument("--refresh-cache", action="store_true", help="不读取补全缓存，重新请求模型并刷新缓存")
+    parser.add_argument("--timeout", type=float, help="每个提示词的时间预算（秒），覆盖模型调用、工具调用和 HTTP 请求，默认不限时")
+    parser.add_argument("--verbose", action="store_true", help="显示对话过程输出（默认只显示进度）")
+    args = parser.parse_args(argv)
+
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    completed = load_completed_ids(output_path, retry_failed=args.retry_failed)
+    items = [item for item in load_prompts(args.input) if item["id"] not in completed]
+
+    print(f"待执行 {len(items)} 个提示词（已完成 {len(completed)} 个），输出: {output_path}", file=sys.stderr)
+    if not items:
+        return
+
+    runner = BatchRunner(
+        output_path=output_path,
+        workers=args.workers,
+        model=args.model,
+        enable_tools=not args.no_tools,
+        max_iterations=args.max_iterations,
+        completion_cache=CompletionCache(args.cache, ttl=args.cache_ttl) if args.cache else None,
+        use_cache=not args.refresh_cache,
+        turn_timeout=args.timeout
+    )
+
+    # ChatBot 会把对话过程打印到标准输出，多线程并发时默认屏蔽，进度信息输出到标准错误
+    stdout = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    try:
+        summary = runner.run(items)
+    except KeyboardInterrupt:
+        print("\n已中断，已完成的结果已保存，重新运行相同命令即可续跑", file=sys.stderr)
+        return
+    finally:
+        runner.close()
+        if runner.completion_cache is not None:
+            runner.completion_cache.close()
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    print(
+        f"完成: 成功 {summary['succeeded']} 个，失败 {summary['failed']} 个，"
+        f"耗时 {summary['elapsed_s']} 秒，共 {summary['total_tokens']} tokens",
+        file=sys.stderr
+    )
+    if summary["cache"]:
+        print(f"补全缓存: 命中 {summary['cache']['hits']} 次，未命中 {summary['cache']['misses']} 次", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,29 +3,42 @@
 遵循 OpenAI API 兼容规范，支持 ModelScope 云端服务或其他兼容服务
 支持 Function Calling（工具调用）
 """
-import os
 import json
-import asyncio
 from typing import List, Dict, Optional, Any
-from dotenv import load_dotenv
-from openai import OpenAI
+from ..config import load_config, get_env
+from ..deadline import DeadlineExceeded, deadline_scope, expired, remaining
 
-# 加载环境变量
-load_dotenv()
+# GitHub 工具在首次创建启用工具的 ChatBot 时才导入（None 表示尚未尝试导入）
+GITHUB_TOOLS_AVAILABLE: Optional[bool] = None
+get_github_tools = call_tool = format_tool_result = canonical_arguments = None
 
-# 导入 GitHub 工具
-try:
-    from ..mcp.github_tools import get_github_tools, call_tool, format_tool_result
-    GITHUB_TOOLS_AVAILABLE = True
-except ImportError:
-    GITHUB_TOOLS_AVAILABLE = False
-    print("[警告] github_tools 模块未找到，Function Calling 功能将不可用")
+
+def _load_github_tools() -> bool:
+    """
+    导入 GitHub 工具模块（只尝试一次）
+    
+    Returns:
+        工具是否可用
+    """
+    global GITHUB_TOOLS_AVAILABLE, get_github_tools, call_tool, format_tool_result, canonical_arguments
+    if GITHUB_TOOLS_AVAILABLE is None:
+        try:
+            from ..mcp import github_tools
+            get_github_tools = github_tools.get_github_tools
+            call_tool = github_tools.call_tool
+            format_tool_result = github_tools.format_tool_result
+            canonical_arguments = github_tools.canonical_arguments
+            GITHUB_TOOLS_AVAILABLE = True
+        except ImportError:
+            GITHUB_TOOLS_AVAILABLE = False
+            print("[警告] github_tools 模块未找到，Function Calling 功能将不可用")
+    return GITHUB_TOOLS_AVAILABLE
 
 
 class ChatBot:
     """基于 ModelScope 的聊天机器人类（遵循 OpenAI API 兼容规范）"""
     
-    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None, model: str = "Qwen/Qwen3-235B-A22B", enable_tools: bool = True):
+    def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None, model: str = "Qwen/Qwen3-235B-A22B", enable_tools: bool = True, github_client: Optional[Any] = None, completion_cache: Optional[Any] = None, endpoints: Optional[Any] = None, turn_timeout: Optional[float] = None, session: Optional[Any] = None, profile: Optional[bool] = None, tool_memo_ttl: Optional[float] = None):
         """
         初始化聊天机器人（基于 ModelScope 或其他兼容 OpenAI API 的服务）
         
@@ -34,9 +47,34 @@ class ChatBot:
             api_base: API Base URL，如果不提供则从环境变量 OPENAI_API_BASE 读取（必需）
             model: 使用的模型名称，默认为 qwen
             enable_tools: 是否启用 GitHub 工具（Function Calling），默认 True
+            github_client: 可选的共享 SyncGitHubClient（多个 ChatBot 共用同一个后台事件循环和连接池），
+                不提供时在启用工具后按需创建
+            completion_cache: 可选的 CompletionCache，相同模型、消息和工具定义的补全请求直接返回缓存结果
+            endpoints: 可选的 EndpointPool（多个服务端点，按延迟路由并发送对冲请求）；
+                不提供且未指定 api_base 时，若设置了 OPENAI_API_BASES 环境变量则自动创建
+            turn_timeout: 每轮对话的默认时间预算（秒），覆盖模型调用、工具调用和 HTTP 请求，None 表示不限时
+            session: 可选的持久化会话（SessionStore.open 返回的 Session），对话历史从会话的最近消息窗口恢复，
+                每轮对话结束后新消息追加写入会话日志，内存中只保留会话窗口内的消息
+            profile: 是否对每轮对话进行性能分析（cProfile），不提供时读取环境变量 CHAT_PROFILE
+            tool_memo_ttl: 会话内工具结果记忆的有效期（秒），有效期内相同工具和参数的调用直接复用之前的结果，
+                结果未变化时只向模型发送引用；不提供时读取环境变量 CHAT_TOOL_MEMO_TTL（默认 300），0 表示禁用
         """
+        # 加载 .env 配置（进程内只加载一次）
+        load_config()
+        
+        # 多端点配置：使用端点池代替单个 OpenAI 客户端（接口相同）
+        self._owns_endpoints = False
+        if endpoints is None and not api_base and get_env("OPENAI_API_BASES"):
+            from .endpoints import EndpointPool
+            endpoints = EndpointPool.from_env(api_key=api_key)
+            self._owns_endpoints = True
+        self.endpoints = endpoints
+        if endpoints is not None:
+            api_key = api_key or endpoints.primary.api_key
+            api_base = endpoints.primary.api_base
+        
         # 从环境变量或参数获取 API Key（必需）
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.api_key = api_key or get_env("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError(
                 "请设置 OPENAI_API_KEY 环境变量（在 .env 文件中），或在初始化时传入 api_key 参数。\n"
@@ -44,7 +82,7 @@ class ChatBot:
             )
         
         # 从环境变量或参数获取 API Base URL（必需）
-        self.api_base = api_base or os.getenv("OPENAI_API_BASE")
+        self.api_base = api_base or get_env("OPENAI_API_BASE")
         if not self.api_base:
             raise ValueError(
                 "请设置 OPENAI_API_BASE 环境变量（在 .env 文件中），或在初始化时传入 api_base 参数。\n"
@@ -58,12 +96,40 @@ class ChatBot:
             "base_url": self.api_base
         }
         
-        self.client = OpenAI(**client_kwargs)
+        if endpoints is not None:
+            # 端点池提供相同的 chat.completions.create 接口，启动时在后台预热各端点的连接
+            self.client = endpoints
+            endpoints.preconnect()
+        else:
+            # openai 导入耗时较长，在创建客户端时才导入
+            from openai import OpenAI
+            self.client = OpenAI(**client_kwargs)
         self.model = model
-        self.conversation_history: List[Dict[str, str]] = []
+        self.session = session
+        self.conversation_history: List[Dict[str, str]] = session.messages if session is not None else []
+        
+        # 最近一轮对话的 token 用量（累计该轮所有 API 调用）和错误信息
+        self.last_usage: Dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.last_error: Optional[str] = None
+        
+        # 补全缓存（可选）及最近一轮对话命中缓存的 API 调用次数
+        self.completion_cache = completion_cache
+        self.last_cache_hits = 0
+        
+        # 每轮对话的默认时间预算（秒）
+        self.turn_timeout = turn_timeout
+        
+        # 性能分析：未启用时不导入 profiling 模块，每轮只多一次判断
+        if profile is None:
+            profile = get_env("CHAT_PROFILE", "0").strip().lower() in ("1", "true", "yes", "on")
+        self.profile = profile
+        self.last_profile: Optional[Dict[str, Any]] = None
         
         # 工具配置
-        self.enable_tools = enable_tools and GITHUB_TOOLS_AVAILABLE
+        self.enable_tools = enable_tools and _load_github_tools()
+        # 工具调用在后台事件循环上执行，由 ChatBot 持有；共享客户端由调用方负责关闭
+        self._github_client = github_client
+        self._owns_github_client = github_client is None
         if self.enable_tools:
             self.tools = get_github_tools()
             print(f"[已启用] GitHub 工具（Function Calling）")
@@ -73,11 +139,27 @@ class ChatBot:
             if enable_tools and not GITHUB_TOOLS_AVAILABLE:
                 print(f"[警告] GitHub 工具不可用，请确保 github_tools 模块已正确导入")
         
+        # 会话内工具结果记忆及最近一轮对话复用结果的工具调用次数
+        if tool_memo_ttl is None:
+            from .tool_memo import DEFAULT_TTL
+            tool_memo_ttl = float(get_env("CHAT_TOOL_MEMO_TTL", str(DEFAULT_TTL)))
+        self.tool_memo = None
+        if self.enable_tools and tool_memo_ttl > 0:
+            from .tool_memo import ToolMemo
+            self.tool_memo = ToolMemo(ttl=tool_memo_ttl)
+        self.last_memo_hits = 0
+        
+        # 缓存预热：配置了 GITHUB_WARMUP_REPOS / GITHUB_WARMUP_TOP 时在后台事件循环上预热，完成后输出耗时
+        if self.enable_tools and (get_env("GITHUB_WARMUP_REPOS") or get_env("GITHUB_WARMUP_TOP")):
+            self._start_warm_up()
+        
         # 显示连接信息
+        if endpoints is not None:
+            print(f"[端点池] {len(endpoints.endpoints)} 个服务端点（按延迟路由，超时发送对冲请求）")
         print(f"[已连接] 服务地址: {self.api_base}")
         print(f"[模型] {self.model}")
     
-    def chat(self, user_input: str, stream: bool = False, max_iterations: int = 10) -> str:
+    def chat(self, user_input: str, stream: bool = False, max_iterations: int = 10, use_cache: bool = True, timeout: Optional[float] = None, profile: Optional[bool] = None) -> str:
         """
         发送消息并获取回复（支持 Function Calling）
         
@@ -85,10 +167,52 @@ class ChatBot:
             user_input: 用户输入的消息
             stream: 是否使用流式输出，默认为 False（注意：Function Calling 不支持流式输出）
             max_iterations: Function Calling 最大迭代次数，防止无限循环，默认 10
+            use_cache: 是否使用补全缓存（配置了 completion_cache 时有效），为 False 时强制请求模型并刷新缓存
+            timeout: 本轮对话的时间预算（秒），默认使用 turn_timeout；截止时间会传递给模型调用、工具调用和 HTTP 请求，
+                工具超时后已取得的部分结果会带上超时标记交给模型，并预留一部分时间让模型给出最终回复
+            profile: 是否对本轮对话进行性能分析，默认使用初始化时的设置；结果以轮次 ID 保存为 .prof 文件，
+                热点函数摘要保存在 last_profile 中
         
         Returns:
             模型返回的回复内容
         """
+        if timeout is None:
+            timeout = self.turn_timeout
+        start = len(self.conversation_history)
+        self.last_profile = None
+        turn_profile = None
+        if profile if profile is not None else self.profile:
+            from .profiling import TurnProfile, new_turn_id
+            # 同时采样执行工具协程的后台事件循环线程（客户端尚未创建时按默认线程名，在线程启动后开始采样）
+            loop = getattr(self._github_client, "loop", None)
+            turn_profile = TurnProfile(
+                new_turn_id(self.session.id if self.session is not None else None),
+                thread_names=(getattr(loop, "name", "github-loop"),)
+            )
+        try:
+            with deadline_scope(timeout):
+                if turn_profile is None:
+                    return self._chat_turn(user_input, stream, max_iterations, use_cache, timeout)
+                with turn_profile:
+                    return self._chat_turn(user_input, stream, max_iterations, use_cache, timeout)
+        finally:
+            if turn_profile is not None:
+                from .profiling import format_summary
+                self.last_profile = turn_profile.summary
+                if self.last_profile is not None:
+                    print(format_summary(self.last_profile))
+            if self.session is not None:
+                # 本轮新增的消息写入会话日志，内存中的历史截断为会话窗口
+                self.session.extend(self.conversation_history[start:])
+                self.conversation_history = self.session.messages
+    
+    def _chat_turn(self, user_input: str, stream: bool, max_iterations: int, use_cache: bool, timeout: Optional[float]) -> str:
+        """执行一轮对话（在 chat 设置的截止时间内运行）"""
+        self.last_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self.last_error = None
+        self.last_cache_hits = 0
+        self.last_memo_hits = 0
+        
         # 将用户消息添加到对话历史
         self.conversation_history.append({
             "role": "user",
@@ -103,6 +227,11 @@ class ChatBot:
         # 构建消息列表（包含历史对话）
         messages = self.conversation_history.copy()
         
+        # 为最终回复预留的时间：工具调用只能使用截止时间之前扣除预留后的部分
+        answer_reserve = min(15.0, timeout * 0.25) if timeout is not None else None
+        # 工具调用超时或时间不足后，只让模型基于已有结果回答，不再调用工具
+        answer_only = False
+        
         try:
             # Function Calling 处理循环
             iteration = 0
@@ -111,11 +240,10 @@ class ChatBot:
                 
                 if stream:
                     # 流式输出（注意：Function Calling 不支持流式输出）
-                    stream_response = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
-                        stream=True
-                    )
+                    stream_kwargs = {"model": self.model, "messages": messages, "stream": True}
+                    if remaining() is not None:
+                        stream_kwargs["timeout"] = remaining()
+                    stream_response = self.client.chat.completions.create(**stream_kwargs)
                     
                     full_response = ""
                     chunk_count = 0
@@ -137,6 +265,7 @@ class ChatBot:
                     
                     if not full_response:
                         error_msg = f"流式输出未收到任何内容（收到 {chunk_count} 个 chunk）"
+                        self.last_error = error_msg
                         print(error_msg)
                         if chunk_count == 0:
                             print("提示: 可能 API 调用失败或服务未响应")
@@ -158,77 +287,127 @@ class ChatBot:
                     # 如果启用了工具，添加到 API 调用中
                     if self.enable_tools and self.tools:
                         api_kwargs["tools"] = self.tools
-                        api_kwargs["tool_choice"] = "auto"
+                        api_kwargs["tool_choice"] = "none" if answer_only else "auto"
                     
-                    response = self.client.chat.completions.create(**api_kwargs)
+                    completion = self._complete(api_kwargs, use_cache=use_cache)
                     
-                    if not response.choices or len(response.choices) == 0:
+                    if completion is None:
                         error_msg = "API 响应格式不正确：未找到 choices"
+                        self.last_error = error_msg
                         print(error_msg)
                         return error_msg
                     
-                    message = response.choices[0].message
-                    assistant_message = message.content
-                    tool_calls = message.tool_calls if hasattr(message, 'tool_calls') and message.tool_calls else None
+                    assistant_message = completion["content"]
+                    tool_calls = completion["tool_calls"]
                     
                     if tool_calls:
                         # 处理工具调用
                         print(f"[工具调用] 检测到 {len(tool_calls)} 个工具调用")
                         
-                        tool_calls_data = [
-                            {
-                                "id": tc.id,
-                                "type": tc.type,
-                                "function": {
-                                    "name": tc.function.name,
-                                    "arguments": tc.function.arguments
-                                }
-                            }
-                            for tc in tool_calls
-                        ]
-                        
                         self.conversation_history.append({
                             "role": "assistant",
                             "content": assistant_message,
-                            "tool_calls": tool_calls_data
+                            "tool_calls": tool_calls
                         })
                         
                         # 执行所有工具调用
                         tool_messages = []
                         for tool_call in tool_calls:
-                            tool_name = tool_call.function.name
-                            tool_args_str = tool_call.function.arguments
+                            tool_name = tool_call["function"]["name"]
+                            tool_args_str = tool_call["function"]["arguments"]
+                            
+                            if answer_only or (answer_reserve is not None and remaining() <= answer_reserve):
+                                # 剩余时间只够生成最终回复，其余工具调用不再执行
+                                answer_only = True
+                                print(f"  - 跳过工具: {tool_name}（本轮时间不足）")
+                                tool_messages.append({
+                                    "role": "tool",
+                                    "tool_call_id": tool_call["id"],
+                                    "name": tool_name,
+                                    "content": "工具调用超时: 本轮对话时间不足，该工具未执行（请根据已有信息回答）"
+                                })
+                                continue
                             
                             print(f"  - 调用工具: {tool_name}")
                             
                             try:
                                 tool_args = json.loads(tool_args_str)
+                                # 记忆以规范化并补全默认值后的参数为键（"123" 与 123、省略默认值与显式传入默认值视为相同）
+                                memo_args = canonical_arguments(tool_name, tool_args) if self.tool_memo is not None else None
+                                memoizable = memo_args is not None
                                 
-                                # 调用异步工具函数
-                                try:
-                                    loop = asyncio.get_event_loop()
-                                except RuntimeError:
-                                    loop = asyncio.new_event_loop()
-                                    asyncio.set_event_loop(loop)
+                                # 有效期内的相同调用不再执行：之前的完整结果仍在对话历史中时只发送引用
+                                memo_entry = self.tool_memo.lookup(tool_name, memo_args) if memoizable else None
+                                if memo_entry is not None:
+                                    from .tool_memo import reference_message
+                                    self.last_memo_hits += 1
+                                    if self._tool_result_visible(memo_entry.tool_call_id, tool_messages):
+                                        content = reference_message(memo_entry)
+                                        print(f"    [记忆] 相同调用的结果仍在有效期内，引用之前的结果")
+                                    else:
+                                        content = memo_entry.content
+                                        self.tool_memo.replace(tool_name, memo_args, tool_call["id"])
+                                        print(f"    [记忆] 相同调用的结果仍在有效期内，复用之前的结果")
+                                    tool_messages.append({
+                                        "role": "tool",
+                                        "tool_call_id": tool_call["id"],
+                                        "name": tool_name,
+                                        "content": content
+                                    })
+                                    continue
                                 
-                                tool_result = loop.run_until_complete(call_tool(tool_name, tool_args))
+                                # 在后台事件循环上执行异步工具函数（连接在多次调用之间复用），
+                                # 截止时间随协程传递到工具和 HTTP 请求，超时后协程被取消
+                                tool_budget = remaining() - answer_reserve if answer_reserve is not None else None
+                                with deadline_scope(tool_budget):
+                                    wait_timeout = remaining() + 2.0 if remaining() is not None else None
+                                    tool_result = self._get_github_client().run(call_tool(tool_name, tool_args), timeout=wait_timeout)
+                                data = tool_result.get("data")
+                                timed_out = tool_result.get("timed_out") or (isinstance(data, dict) and data.get("timed_out"))
+                                if timed_out:
+                                    answer_only = True
                                 formatted_result = format_tool_result(tool_name, tool_result)
                                 
+                                # 只记住完整的成功结果；结果与之前相同时发送引用代替完整结果
+                                content = formatted_result
+                                if memoizable and tool_result.get("success") and not timed_out:
+                                    previous = self.tool_memo.record(
+                                        tool_name, memo_args, tool_call["id"], formatted_result,
+                                        visible=lambda call_id: self._tool_result_visible(call_id, tool_messages)
+                                    )
+                                    if previous is not None:
+                                        from .tool_memo import reference_message
+                                        self.last_memo_hits += 1
+                                        content = reference_message(previous)
+                                
                                 tool_messages.append({
                                     "role": "tool",
-                                    "tool_call_id": tool_call.id,
+                                    "tool_call_id": tool_call["id"],
                                     "name": tool_name,
-                                    "content": formatted_result
+                                    "content": content
                                 })
                                 
-                                print(f"    [成功] 工具执行完成")
+                                if content is formatted_result:
+                                    print(f"    [成功] 工具执行完成")
+                                else:
+                                    print(f"    [成功] 工具执行完成，结果与之前相同，引用之前的结果")
                                 
                             except json.JSONDecodeError as e:
                                 error_msg = f"工具参数解析失败: {str(e)}"
                                 print(f"    [失败] {error_msg}")
                                 tool_messages.append({
                                     "role": "tool",
-                                    "tool_call_id": tool_call.id,
+                                    "tool_call_id": tool_call["id"],
+                                    "name": tool_name,
+                                    "content": error_msg
+                                })
+                            except TimeoutError:
+                                answer_only = True
+                                error_msg = "工具调用超时: 已超过截止时间，调用已取消（没有取得结果，请根据已有信息回答）"
+                                print(f"    [超时] {error_msg}")
+                                tool_messages.append({
+                                    "role": "tool",
+                                    "tool_call_id": tool_call["id"],
                                     "name": tool_name,
                                     "content": error_msg
                                 })
@@ -237,7 +416,7 @@ class ChatBot:
                                 print(f"    [失败] {error_msg}")
                                 tool_messages.append({
                                     "role": "tool",
-                                    "tool_call_id": tool_call.id,
+                                    "tool_call_id": tool_call["id"],
                                     "name": tool_name,
                                     "content": error_msg
                                 })
@@ -252,6 +431,7 @@ class ChatBot:
                     # 没有工具调用，正常返回回复
                     if assistant_message is None or assistant_message == "":
                         error_msg = "API 返回了空响应"
+                        self.last_error = error_msg
                         print(error_msg)
                         return error_msg
                     
@@ -268,9 +448,21 @@ class ChatBot:
                         print(safe_message)
                     
                     return assistant_message
-                    
+            
+            # 工具调用循环达到上限仍未得到最终回复
+            error_msg = f"已达到最大工具调用迭代次数（{max_iterations}），未得到最终回复"
+            self.last_error = error_msg
+            print(error_msg)
+            return error_msg
+        
+        except DeadlineExceeded:
+            error_msg = f"本轮对话超时（超过 {timeout} 秒），未得到最终回复"
+            self.last_error = error_msg
+            print(error_msg)
+            return error_msg
         except Exception as e:
             error_msg = f"调用 API 时发生错误: {str(e)}"
+            self.last_error = error_msg
             print(error_msg)
             # 打印详细的错误信息
             import traceback
@@ -285,9 +477,143 @@ class ChatBot:
                 print(f"  如果是本地服务，请确保服务正在运行")
             return error_msg
     
+    def _complete(self, api_kwargs: Dict[str, Any], use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        执行一次非流式补全请求（配置了补全缓存时先查缓存）
+        
+        Args:
+            api_kwargs: chat.completions.create 的参数
+            use_cache: 是否读取缓存；为 False 时仍会把新结果写入缓存
+        
+        Returns:
+            {"content": str, "tool_calls": list}，响应中没有 choices 时返回 None
+        """
+        if expired():
+            raise DeadlineExceeded("已超过截止时间")
+        
+        cache_key = None
+        # 只回答不调用工具（tool_choice 为 none）的请求发生在超时之后，结果不写入缓存
+        if self.completion_cache is not None and api_kwargs.get("tool_choice") != "none":
+            from .completion_cache import make_cache_key
+            cache_key = make_cache_key(api_kwargs["model"], api_kwargs["messages"], api_kwargs.get("tools"))
+            if use_cache:
+                cached = self.completion_cache.get(cache_key)
+                if cached is not None:
+                    self.last_cache_hits += 1
+                    print("[缓存] 命中补全缓存")
+                    return cached
+        
+        request_kwargs = api_kwargs
+        if remaining() is not None:
+            request_kwargs = dict(api_kwargs, timeout=remaining())
+        try:
+            response = self.client.chat.completions.create(**request_kwargs)
+        except Exception as e:
+            if expired():
+                raise DeadlineExceeded("模型调用超过截止时间") from e
+            raise
+        self._record_usage(response)
+        
+        if not response.choices or len(response.choices) == 0:
+            return None
+        
+        message = response.choices[0].message
+        tool_calls = message.tool_calls if hasattr(message, 'tool_calls') and message.tool_calls else None
+        completion = {
+            "content": message.content,
+            "tool_calls": [
+                {
+                    "id": tc.id,
+                    "type": tc.type,
+                    "function": {
+                        "name": tc.function.name,
+                        "arguments": tc.function.arguments
+                    }
+                }
+                for tc in tool_calls
+            ] if tool_calls else None
+        }
+        
+        # 空回复不缓存，避免把一次异常响应固定下来
+        if cache_key is not None and (completion["content"] or completion["tool_calls"]):
+            self.completion_cache.set(cache_key, completion)
+        return completion
+    
+    def _tool_result_visible(self, tool_call_id: str, pending: List[Dict[str, Any]]) -> bool:
+        """
+        判断某次工具调用的结果是否仍在模型可见的消息中
+        
+        Args:
+            tool_call_id: 工具调用 ID
+            pending: 本轮尚未加入对话历史的工具消息
+        
+        Returns:
+            是否可见
+        """
+        return any(
+            message.get("tool_call_id") == tool_call_id
+            for messages in (self.conversation_history, pending)
+            for message in messages
+        )
+    
+    def _get_github_client(self):
+        """
+        获取执行工具调用的同步 GitHub 客户端（首次调用时创建，启动后台事件循环）
+        
+        Returns:
+            SyncGitHubClient 实例
+        """
+        if self._github_client is None:
+            from ..github.runner import SyncGitHubClient
+            self._github_client = SyncGitHubClient()
+        return self._github_client
+    
+    def _start_warm_up(self):
+        """在工具调用使用的后台事件循环上启动缓存预热（不等待完成）"""
+        from ..github.warmup import start_warm_up
+        
+        async def schedule():
+            return start_warm_up(report=print) is not None
+        
+        if self._get_github_client().run(schedule()):
+            print("[预热] 正在后台预热 GitHub 缓存")
+    
+    def close(self):
+        """释放资源：关闭 ChatBot 自己创建的后台事件循环、连接池和端点池，写入会话快照"""
+        if self._owns_github_client and self._github_client is not None:
+            self._github_client.close()
+            self._github_client = None
+        if self._owns_endpoints and self.endpoints is not None:
+            self.endpoints.close()
+        if self.session is not None:
+            self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _record_usage(self, response: Any):
+        """
+        累计一次 API 调用的 token 用量到 last_usage
+        
+        Args:
+            response: chat.completions.create 的返回结果
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        for key in self.last_usage:
+            self.last_usage[key] += getattr(usage, key, 0) or 0
+    
     def clear_history(self):
-        """清空对话历史"""
+        """清空对话历史（使用持久化会话时只清空内存窗口，磁盘上的日志保留）"""
         self.conversation_history = []
+        if self.session is not None:
+            self.session.clear_window()
+        if self.tool_memo is not None:
+            self.tool_memo.clear()
         print("对话历史已清空")
     
     def get_history(self) -> List[Dict[str, str]]:
@@ -310,8 +636,16 @@ class ChatBot:
         print(f"模型已切换为: {model}")
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """主函数 - 交互式聊天界面"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="交互式聊天机器人")
+    parser.add_argument("--session", metavar="ID", help="恢复指定 ID 的会话（不存在时以该 ID 新建）")
+    parser.add_argument("--new-session", action="store_true", help="新建持久化会话，对话历史保存到磁盘")
+    parser.add_argument("--session-dir", help="会话文件目录，默认 CHAT_SESSION_DIR 环境变量或 .cache/sessions")
+    args = parser.parse_args(argv)
+    
     print("=" * 60)
     print("基于 ModelScope 的聊天机器人")
     print("遵循 OpenAI API 兼容规范")
@@ -326,9 +660,16 @@ def main():
     print("=" * 50)
     print()
     
+    chatbot = None
     try:
         # 初始化聊天机器人
-        chatbot = ChatBot()
+        session = None
+        if args.session or args.new_session:
+            from .session_store import SessionStore
+            session = SessionStore(args.session_dir).open(args.session)
+            print(f"[会话] ID: {session.id}，已恢复 {len(session.messages)} 条消息（共 {session.count} 条），"
+                  f"使用 --session {session.id} 继续该会话")
+        chatbot = ChatBot(session=session)
         stream_mode = False
         
         while True:
@@ -389,6 +730,9 @@ def main():
         print("\n\n程序已中断")
     except Exception as e:
         print(f"\n发生错误: {str(e)}")
+    finally:
+        if chatbot is not None:
+            chatbot.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+"""
+大模型补全结果缓存
+以模型名称、规范化后的消息列表和工具定义的哈希作为键，缓存一次 chat.completions 调用的结果，
+包含内存（LRU）和磁盘（SQLite）两级，按 TTL 失效；工具调用循环中的每一轮都单独缓存，
+工具结果不变时重复的问题可以整轮直接回放
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def _normalize_content(content: Any) -> Any:
+    """规范化消息内容：字符串去除首尾空白，统一换行符"""
+    if isinstance(content, str):
+        return content.replace("\r\n", "\n").strip()
+    return content
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    规范化消息列表，使语义相同的对话生成相同的缓存键
+
+    - 去除值为 None 的字段和内容首尾空白
+    - 工具调用 ID（每次请求随机生成）替换为按出现顺序编号的稳定 ID
+    - 工具调用参数按键排序后重新序列化
+
+    Args:
+        messages: OpenAI 格式的消息列表
+
+    Returns:
+        规范化后的消息列表（不修改原列表）
+    """
+    call_ids: Dict[str, str] = {}
+
+    def stable_id(call_id: Optional[str]) -> str:
+        if call_id not in call_ids:
+            call_ids[call_id] = f"call_{len(call_ids)}"
+        return call_ids[call_id]
+
+    normalized = []
+    for message in messages:
+        item = {"role": message.get("role"), "content": _normalize_content(message.get("content"))}
+        if message.get("name"):
+            item["name"] = message["name"]
+        if message.get("tool_calls"):
+            calls = []
+            for call in message["tool_calls"]:
+                function = call.get("function", {})
+                arguments = function.get("arguments")
+                try:
+                    arguments = json.dumps(json.loads(arguments), ensure_ascii=False, sort_keys=True)
+                except (TypeError, ValueError):
+                    pass
+                calls.append({
+                    "id": stable_id(call.get("id")),
+                    "name": function.get("name"),
+                    "arguments": arguments
+                })
+            item["tool_calls"] = calls
+        if message.get("tool_call_id"):
+            item["tool_call_id"] = stable_id(message["tool_call_id"])
+        normalized.append({key: value for key, value in item.items() if value is not None})
+    return normalized
+
+
+def make_cache_key(model: str, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    计算补全请求的缓存键
+
+    Args:
+        model: 模型名称
+        messages: 消息列表
+        tools: 工具定义列表（未启用工具时为 None）
+
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    payload = {
+        "model": model,
+        "messages": normalize_messages(messages),
+        "tools": tools or []
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """线程安全的两级补全缓存（内存 LRU + 可选的 SQLite 磁盘缓存）"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600, max_entries: int = 1024):
+        """
+        初始化补全缓存
+
+        Args:
+            path: 磁盘缓存的 SQLite 文件路径，不提供时只使用内存缓存
+            ttl: 缓存有效期（秒），默认 1 小时
+            max_entries: 内存缓存最多保留的条目数
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存（先查内存，再查磁盘，磁盘命中后回填内存）
+
+        Args:
+            key: make_cache_key 生成的缓存键
+
+        Returns:
+            缓存的补全结果，未命中或已过期时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if now - row[1] <= self.ttl:
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.hits += 1
+                        return value
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        写入缓存（内存和磁盘）
+
+        Args:
+            key: 缓存键
+            value: 可 JSON 序列化的补全结果
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now)
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, created_at: float, value: Dict[str, Any]):
+        """写入内存缓存并淘汰最久未使用的条目（调用方持有锁）"""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """
+        清除已过期的条目
+
+        Returns:
+            清除的磁盘条目数
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for key in [key for key, (created_at, _) in self._memory.items() if created_at < cutoff]:
+                del self._memory[key]
+            if self._conn is None:
+                return 0
+            cursor = self._conn.execute("DELETE FROM completions WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM completions")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计: {"hits": int, "misses": int, "hit_rate": float, "memory_entries": int}"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def close(self):
+        """关闭磁盘缓存连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
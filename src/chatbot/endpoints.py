@@ -0,0 +1,325 @@
+"""
+大模型服务端点池
+管理多个兼容 OpenAI API 的服务端点（地址 + API Key），按观测到的延迟路由请求并跟踪健康状态；
+主端点在 p95 延迟内未返回时向次优端点发送对冲（hedged）请求，取先成功的结果；
+对外提供与 OpenAI 客户端相同的 chat.completions.create 接口，可直接替换 ChatBot.client
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..config import get_env
+
+
+class Endpoint:
+    """单个服务端点及其延迟、健康统计"""
+
+    def __init__(self, api_base: str, api_key: str, name: Optional[str] = None, max_samples: int = 50):
+        """
+        初始化端点（OpenAI 客户端在首次使用时创建）
+
+        Args:
+            api_base: API Base URL
+            api_key: API Key
+            name: 端点名称，默认使用 api_base
+            max_samples: 用于计算延迟分位数的最近样本数
+        """
+        self.api_base = api_base
+        self.api_key = api_key
+        self.name = name or api_base
+        self._client = None
+        self._samples: deque = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.ewma: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def client(self):
+        """该端点的 OpenAI 兼容客户端"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.api_base)
+        return self._client
+
+    @property
+    def sample_count(self) -> int:
+        """已记录的延迟样本数"""
+        return len(self._samples)
+
+    @property
+    def healthy(self) -> bool:
+        """端点当前是否健康（连续失败后会在冷却期内标记为不健康）"""
+        return time.monotonic() >= self.unhealthy_until
+
+    def record_success(self, latency: float):
+        """记录一次成功请求的延迟（秒）"""
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self._samples.append(latency)
+            self.ewma = latency if self.ewma is None else 0.7 * self.ewma + 0.3 * latency
+
+    def record_failure(self, failure_threshold: int, cooldown: float):
+        """记录一次失败请求，连续失败达到阈值时进入冷却期"""
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= failure_threshold:
+                self.unhealthy_until = time.monotonic() + cooldown
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        最近样本的延迟分位数
+
+        Args:
+            q: 分位数（0~1）
+
+        Returns:
+            延迟（秒），没有样本时返回 None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self) -> Dict[str, Any]:
+        """端点统计"""
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class _Completions:
+    """提供 pool.chat.completions.create(...) 调用方式"""
+
+    def __init__(self, pool: "EndpointPool"):
+        self._pool = pool
+
+    def create(self, **kwargs):
+        return self._pool.create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, pool: "EndpointPool"):
+        self.completions = _Completions(pool)
+
+
+class EndpointPool:
+    """按延迟路由、支持对冲请求和故障转移的端点池"""
+
+    def __init__(self, endpoints: Sequence[Endpoint], hedge_delay: Optional[float] = None, hedge_percentile: float = 0.95, initial_hedge_delay: float = 10.0, min_samples: int = 5, failure_threshold: int = 3, cooldown: float = 30.0):
+        """
+        初始化端点池
+
+        Args:
+            endpoints: 端点列表（至少一个）
+            hedge_delay: 固定的对冲延迟（秒），不提供时使用主端点的延迟分位数
+            hedge_percentile: 自适应对冲延迟使用的分位数，默认 p95
+            initial_hedge_delay: 主端点样本不足时使用的对冲延迟（秒）
+            min_samples: 使用分位数计算对冲延迟所需的最少样本数
+            failure_threshold: 连续失败多少次后标记为不健康
+            cooldown: 不健康端点的冷却时间（秒）
+        """
+        if not endpoints:
+            raise ValueError("端点池至少需要一个端点")
+        self.endpoints: List[Endpoint] = list(endpoints)
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.chat = _Chat(self)
+        # 对冲中落败的请求会在后台线程继续执行直至完成
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 4 * len(self.endpoints)), thread_name_prefix="llm-endpoint")
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
+        self._preconnected = False
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str] = None, api_base: Optional[str] = None, **kwargs) -> "EndpointPool":
+        """
+        从环境变量创建端点池
+
+        OPENAI_API_BASES 为逗号分隔的多个地址，OPENAI_API_KEYS 为对应的逗号分隔 Key（只有一个时所有地址共用）；
+        未设置时退回 OPENAI_API_BASE / OPENAI_API_KEY。OPENAI_HEDGE_DELAY 可设置固定的对冲延迟（秒）
+
+        Args:
+            api_key: 覆盖环境变量的 API Key
+            api_base: 覆盖环境变量的 API Base URL（只使用这一个地址）
+            **kwargs: 传递给 EndpointPool 的其他参数
+
+        Returns:
+            EndpointPool 实例
+        """
+        bases = [api_base] if api_base else _split(get_env("OPENAI_API_BASES")) or _split(get_env("OPENAI_API_BASE"))
+        keys = [api_key] if api_key else _split(get_env("OPENAI_API_KEYS")) or _split(get_env("OPENAI_API_KEY"))
+        if not bases or not keys:
+            raise ValueError("请设置 OPENAI_API_BASES / OPENAI_API_KEYS（或 OPENAI_API_BASE / OPENAI_API_KEY）环境变量")
+        if len(keys) not in (1, len(bases)):
+            raise ValueError(f"OPENAI_API_KEYS 的数量（{len(keys)}）必须为 1 或与 OPENAI_API_BASES 的数量（{len(bases)}）一致")
+        if "hedge_delay" not in kwargs and get_env("OPENAI_HEDGE_DELAY"):
+            kwargs["hedge_delay"] = float(get_env("OPENAI_HEDGE_DELAY"))
+        endpoints = [Endpoint(base, keys[i] if len(keys) > 1 else keys[0]) for i, base in enumerate(bases)]
+        return cls(endpoints, **kwargs)
+
+    @property
+    def primary(self) -> Endpoint:
+        """当前排名第一的端点"""
+        return self.ranked()[0]
+
+    def ranked(self) -> List[Endpoint]:
+        """
+        按优先级排序的端点：健康的在前，尚无延迟样本的优先试探，其余按延迟 EWMA 升序
+
+        Returns:
+            端点列表
+        """
+        return sorted(
+            self.endpoints,
+            key=lambda ep: (not ep.healthy, ep.ewma is not None, ep.ewma or 0.0)
+        )
+
+    def hedge_delay_for(self, endpoint: Endpoint) -> float:
+        """主端点为 endpoint 时的对冲延迟（秒）"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if endpoint.sample_count < self.min_samples:
+            return self.initial_hedge_delay
+        return endpoint.percentile(self.hedge_percentile)
+
+    def _call(self, endpoint: Endpoint, kwargs: Dict[str, Any]):
+        """在指定端点上执行请求并记录延迟或失败（请求本身有误的 4xx 错误不计入端点健康统计）"""
+        started = time.perf_counter()
+        try:
+            response = endpoint.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if self._retryable(e):
+                endpoint.record_failure(self.failure_threshold, self.cooldown)
+            raise
+        endpoint.record_success(time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        """请求错误是否值得换端点重试（请求本身有误的 4xx 错误在其他端点上同样会失败）"""
+        status = getattr(error, "status_code", None)
+        return status is None or status >= 500 or status in (408, 409, 429)
+
+    def create(self, **kwargs):
+        """
+        发送 chat.completions 请求（与 OpenAI 客户端的 chat.completions.create 参数一致）
+
+        非流式请求: 先发往排名第一的端点，超过对冲延迟仍未返回时向下一个端点发送相同请求，
+        返回先成功的响应；端点失败时自动转移到下一个端点。流式请求只路由到排名第一的端点
+
+        Returns:
+            OpenAI ChatCompletion 响应（或流式迭代器）
+        """
+        self._count("requests")
+        candidates = self.ranked()
+        if kwargs.get("stream"):
+            return self._call(candidates[0], kwargs)
+
+        pending: Dict[Any, Endpoint] = {}
+        errors: List[Exception] = []
+        fatal: Optional[Exception] = None
+        next_index = 0
+        hedged = False
+        started = time.monotonic()
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            pending[self._executor.submit(self._call, endpoint, kwargs)] = endpoint
+
+        launch()
+        while pending:
+            timeout = None
+            if not hedged and next_index < len(candidates):
+                timeout = max(0.0, self.hedge_delay_for(candidates[0]) - (time.monotonic() - started))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 主端点超过对冲延迟仍未返回，向下一个端点发送相同请求
+                hedged = True
+                self._count("hedged")
+                launch()
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    if not self._retryable(e):
+                        # 其他端点同样会失败，不再故障转移，但仍等待进行中的请求
+                        fatal = fatal or e
+                    errors.append(e)
+                    if fatal is None and not pending and next_index < len(candidates):
+                        self._count("failovers")
+                        launch()
+                    continue
+                if hedged and endpoint is not candidates[0]:
+                    self._count("hedge_wins")
+                return response
+        raise fatal or errors[-1]
+
+    def preconnect(self, wait_for: bool = False, timeout: float = 10.0):
+        """
+        预热所有端点的连接（建立 TCP/TLS 连接并检查可用性），失败的端点计入健康统计；
+        多个 ChatBot 共用端点池时只执行一次
+
+        Args:
+            wait_for: 是否等待预热完成
+            timeout: 等待的最长秒数
+        """
+        with self._lock:
+            if self._preconnected:
+                return
+            self._preconnected = True
+
+        def warm(endpoint: Endpoint):
+            try:
+                endpoint.client.with_options(max_retries=0, timeout=timeout).models.list()
+            except Exception:
+                endpoint.record_failure(self.failure_threshold, self.cooldown)
+
+        futures = [self._executor.submit(warm, endpoint) for endpoint in self.endpoints]
+        if wait_for:
+            wait(futures, timeout=timeout)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """端点池统计: 请求数、对冲次数、对冲获胜次数、故障转移次数和各端点统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["endpoints"] = [endpoint.stats() for endpoint in self.ranked()]
+        return stats
+
+    def close(self):
+        """关闭后台线程池（不等待进行中的对冲请求）"""
+        self._executor.shutdown(wait=False)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    """拆分逗号分隔的配置值"""
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
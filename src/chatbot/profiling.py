@@ -0,0 +1,253 @@
+"""
+对话轮次性能分析
+按需采样记录一轮对话的耗时分布：后台采样线程按固定间隔读取调用 chat 的线程（模型调用、JSON 解析、
+format_tool_result 等）和执行工具协程的后台事件循环线程（HTTP 请求、响应解析）的调用栈（sys._current_frames），
+统计每个函数的自身耗时和累计耗时，以轮次 ID 保存为 pstats 格式的 .prof 文件，并生成热点函数摘要。
+cProfile 只记录启用它的线程，无法覆盖后台事件循环线程，因此使用采样。C 函数（如 json.loads 的解析部分）
+不在 Python 调用栈中，其耗时计入调用它的 Python 函数；事件循环空闲等待 I/O 的样本不计入。
+未启用时 ChatBot 不会导入本模块
+
+用法:
+    python -m src.chatbot.profiling .cache/profiles/<turn_id>.prof --limit 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import get_env
+
+# 默认的分析文件目录，可通过环境变量 CHAT_PROFILE_DIR 配置
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+
+# 默认采样间隔（秒）
+DEFAULT_INTERVAL = 0.005
+
+# 事件循环空闲等待 I/O 时栈顶的函数（文件名, 函数名），这些样本不计入
+_IDLE_FRAMES = {("selectors.py", "select")}
+
+
+def new_turn_id(prefix: Optional[str] = None) -> str:
+    """
+    生成轮次 ID（时间戳 + 随机后缀，可加前缀如会话 ID）
+
+    Args:
+        prefix: 可选前缀
+
+    Returns:
+        轮次 ID
+    """
+    turn_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    return f"{prefix}-{turn_id}" if prefix else turn_id
+
+
+def summarize(stats: Any, limit: int = 15, sort: str = "tottime") -> List[Dict[str, Any]]:
+    """
+    提取热点函数
+
+    Args:
+        stats: pstats.Stats 实例
+        limit: 返回的函数数
+        sort: 排序字段，tottime（函数自身耗时）或 cumtime（包含子调用的累计耗时）
+
+    Returns:
+        [{"function", "samples", "tottime_ms", "cumtime_ms"}]，按 sort 降序（samples 为包含该函数的样本数）
+    """
+    rows = []
+    for (filename, line, name), (_, samples, tottime, cumtime, _) in stats.stats.items():
+        if filename == "~":
+            # 内置函数，如 {method 'poll' of 'select.epoll' objects}
+            function = name
+        else:
+            function = f"{_short_path(filename)}:{line}({name})"
+        rows.append({
+            "function": function,
+            "samples": samples,
+            "tottime_ms": round(tottime * 1000, 2),
+            "cumtime_ms": round(cumtime * 1000, 2)
+        })
+    key = "cumtime_ms" if sort.startswith("cum") else "tottime_ms"
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return rows[:limit]
+
+
+def _short_path(filename: str) -> str:
+    """缩短文件路径：项目内文件显示相对路径，第三方库从 site-packages 之后开始显示"""
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    try:
+        relative = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if relative.startswith("..") else relative
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """
+    将分析摘要格式化为文本表格
+
+    Args:
+        summary: TurnProfile.summary
+
+    Returns:
+        多行文本
+    """
+    lines = [f"[性能分析] 轮次 {summary['turn_id']}，耗时 {summary['wall_ms']} ms，已保存: {summary['path']}"]
+    lines.append(f"  {'自身(ms)':>10} {'累计(ms)':>10} {'样本数':>8}  函数")
+    for row in summary["top"]:
+        lines.append(f"  {row['tottime_ms']:>10} {row['cumtime_ms']:>10} {row['samples']:>8}  {row['function']}")
+    return "\n".join(lines)
+
+
+class _Sampler:
+    """采样线程：按固定间隔读取目标线程的调用栈，累计每个函数的样本数、自身耗时、累计耗时和调用方"""
+
+    def __init__(self, thread_ids: Iterable[int], thread_names: Iterable[str], interval: float):
+        self.interval = interval
+        self._idents = set(thread_ids)
+        # 尚未找到的线程（如首次工具调用时才启动的后台事件循环），采样过程中按名称查找
+        self._pending_names = set(thread_names)
+        # (文件名, 行号, 函数名) -> [样本数, 自身耗时, 累计耗时, {调用方: 样本数}]
+        self.stats: Dict[Tuple[str, int, str], list] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="turn-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _resolve(self):
+        """按名称查找尚未找到的目标线程"""
+        for thread in threading.enumerate():
+            if thread.name in self._pending_names and thread.ident is not None:
+                self._idents.add(thread.ident)
+                self._pending_names.discard(thread.name)
+
+    def _run(self):
+        last = time.perf_counter()
+        ticks = 0
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            if self._pending_names and ticks % 20 == 0:
+                self._resolve()
+            ticks += 1
+            frames = sys._current_frames()
+            for ident in self._idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._record(frame, elapsed)
+            del frames
+
+    def _record(self, frame: Any, elapsed: float):
+        """记录一个线程的一次采样（栈顶函数计入自身耗时，栈中每个函数计入累计耗时）"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if not stack or (os.path.basename(stack[0][0]), stack[0][2]) in _IDLE_FRAMES:
+            return
+        seen = set()
+        for index, key in enumerate(stack):
+            if key in seen:
+                # 递归调用只计一次
+                continue
+            seen.add(key)
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = [0, 0.0, 0.0, {}]
+            entry[0] += 1
+            entry[2] += elapsed
+            if index + 1 < len(stack):
+                caller = stack[index + 1]
+                entry[3][caller] = entry[3].get(caller, 0) + 1
+        self.stats[stack[0]][1] += elapsed
+
+
+class TurnProfile:
+    """一轮对话的性能分析（with 块内采样调用线程和指定名称的线程，如执行工具的后台事件循环线程）"""
+
+    def __init__(self, turn_id: Optional[str] = None, directory: Optional[str] = None, limit: int = 15, thread_names: Iterable[str] = (), interval: float = DEFAULT_INTERVAL):
+        """
+        初始化性能分析
+
+        Args:
+            turn_id: 轮次 ID，不提供时自动生成
+            directory: 保存 .prof 文件的目录，默认读取环境变量 CHAT_PROFILE_DIR，未设置时为 .cache/profiles
+            limit: 摘要中保留的热点函数数
+            thread_names: 除调用线程外同时采样的线程名称（线程可以在分析开始后才启动）
+            interval: 采样间隔（秒）
+        """
+        self.turn_id = turn_id or new_turn_id()
+        self.directory = directory or get_env("CHAT_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        self.limit = limit
+        self.thread_names = tuple(thread_names)
+        self.interval = interval
+        self.path = os.path.join(self.directory, f"{self.turn_id}.prof")
+        self.summary: Optional[Dict[str, Any]] = None
+        self._sampler: Optional[_Sampler] = None
+        self._started = 0.0
+
+    def __enter__(self) -> "TurnProfile":
+        self._started = time.perf_counter()
+        self._sampler = _Sampler([threading.get_ident()], self.thread_names, self.interval)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._sampler.stop()
+        self._save(time.perf_counter() - self._started)
+
+    def _save(self, wall: float):
+        """以 pstats 格式保存 .prof 文件并生成摘要"""
+        import marshal
+        import pstats
+
+        if not self._sampler.stats:
+            return
+        # pstats 格式: (文件名, 行号, 函数名) -> (原始调用次数, 调用次数, 自身耗时, 累计耗时, {调用方: 次数})，次数记为样本数
+        raw = {
+            key: (samples, samples, tottime, cumtime, callers)
+            for key, (samples, tottime, cumtime, callers) in self._sampler.stats.items()
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "wb") as f:
+            marshal.dump(raw, f)
+        self.summary = {
+            "turn_id": self.turn_id,
+            "path": self.path,
+            "wall_ms": round(wall * 1000, 1),
+            "top": summarize(pstats.Stats(self.path), self.limit)
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口：显示已保存的 .prof 文件的热点函数"""
+    import pstats
+
+    parser = argparse.ArgumentParser(description="显示对话轮次性能分析文件的热点函数")
+    parser.add_argument("path", help=".prof 文件路径")
+    parser.add_argument("--limit", type=int, default=20, help="显示的函数数，默认 20")
+    parser.add_argument("--sort", choices=["tottime", "cumtime"], default="tottime", help="排序字段，默认 tottime（函数自身耗时）")
+    args = parser.parse_args(argv)
+
+    stats = pstats.Stats(args.path)
+    summary = {
+        "turn_id": os.path.splitext(os.path.basename(args.path))[0],
+        "path": args.path,
+        "wall_ms": round(stats.total_tt * 1000, 1),
+        "top": summarize(stats, args.limit, args.sort)
+    }
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
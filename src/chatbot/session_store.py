@@ -0,0 +1,287 @@
+"""
+对话会话持久化
+每个会话的消息以长度前缀的二进制记录追加写入日志文件（较大的记录使用 zlib 压缩），
+并定期写入快照（日志偏移量 + 最近的消息窗口）；按会话 ID 恢复时只需读取快照和快照之后的日志尾部。
+内存中只保留最近的消息窗口，更早的对话保留在磁盘上，可通过 Session.iter_all() 读取
+"""
+import json
+import os
+import re
+import struct
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..config import get_env
+
+# 记录头: 负载长度（4 字节，大端）+ 标志位（1 字节）
+_HEADER = struct.Struct(">IB")
+_FLAG_ZLIB = 1
+# 负载超过该字节数时压缩（工具结果等长文本压缩效果明显）
+_COMPRESS_MIN = 512
+
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def _check_session_id(session_id: str) -> str:
+    """校验会话 ID（会话 ID 用作文件名，不允许路径分隔符等字符）"""
+    if not _SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"会话 ID 只能包含字母、数字、下划线、点和短横线（最长 64 个字符）: {session_id}")
+    return session_id
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    """将一条消息编码为日志记录"""
+    payload = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    flags = 0
+    if len(payload) > _COMPRESS_MIN:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, _FLAG_ZLIB
+    return _HEADER.pack(len(payload), flags) + payload
+
+
+def _read_records(path: str, offset: int = 0, end: Optional[int] = None) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    从日志文件的指定偏移量开始读取记录
+
+    Args:
+        path: 日志文件路径
+        offset: 起始偏移量
+        end: 结束偏移量（不提供时读到文件末尾）
+
+    Yields:
+        (消息, 该记录结束处的偏移量)；遇到不完整的记录（写入中断）时停止
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        position = offset
+        while end is None or position < end:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, flags = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            if flags & _FLAG_ZLIB:
+                payload = zlib.decompress(payload)
+            position += _HEADER.size + length
+            yield json.loads(payload), position
+
+
+def trim_window(messages: List[Dict[str, Any]], max_messages: int) -> List[Dict[str, Any]]:
+    """
+    截取最近的消息窗口，只在用户消息处截断（不拆开工具调用和对应的工具结果）
+
+    Args:
+        messages: 消息列表
+        max_messages: 窗口最多保留的消息数（最后一轮对话超过该数量时完整保留最后一轮）
+
+    Returns:
+        截取后的消息列表
+    """
+    if len(messages) <= max_messages:
+        return messages
+    user_indexes = [i for i, message in enumerate(messages) if message.get("role") == "user"]
+    if not user_indexes:
+        return messages
+    start = next((i for i in user_indexes if i >= len(messages) - max_messages), user_indexes[-1])
+    return messages[start:]
+
+
+class Session:
+    """单个持久化会话：追加写入日志，内存中保留最近的消息窗口"""
+
+    def __init__(self, session_id: str, directory: str, window: int = 200, snapshot_every: int = 50):
+        """
+        打开会话（文件不存在时创建，存在时从快照和日志尾部恢复）
+
+        Args:
+            session_id: 会话 ID
+            directory: 会话文件所在目录
+            window: 内存中保留的最大消息数
+            snapshot_every: 每追加多少条消息写入一次快照
+        """
+        self.id = session_id
+        self.window = max(1, window)
+        self.snapshot_every = max(1, snapshot_every)
+        self.log_path = os.path.join(directory, f"{session_id}.log")
+        self.snapshot_path = os.path.join(directory, f"{session_id}.snapshot.json")
+        self.count = 0
+        self._messages: List[Dict[str, Any]] = []
+        self._offset = 0
+        self._unsnapshotted = 0
+        self._load()
+        self._file = open(self.log_path, "ab")
+
+    def _load(self):
+        """从快照恢复消息窗口，再读取快照之后追加的日志记录"""
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        start = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                if snapshot["offset"] <= size:
+                    start = snapshot["offset"]
+                    self.count = snapshot["count"]
+                    self._messages = snapshot["window"]
+            except (OSError, ValueError, KeyError):
+                # 快照损坏时从头读取日志
+                start, self.count, self._messages = 0, 0, []
+        self._offset = start
+        if size > start:
+            for message, position in _read_records(self.log_path, start):
+                self._messages.append(message)
+                self.count += 1
+                self._unsnapshotted += 1
+                self._offset = position
+                # 没有快照时日志可能很长，读取过程中定期截断窗口
+                if len(self._messages) > 2 * self.window:
+                    self._messages = trim_window(self._messages, self.window)
+            self._messages = trim_window(self._messages, self.window)
+            if self._offset < size:
+                # 丢弃写入中断留下的不完整记录
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(self._offset)
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """内存中的最近消息窗口（副本）"""
+        return list(self._messages)
+
+    def append(self, message: Dict[str, Any]):
+        """追加一条消息"""
+        self.extend([message])
+
+    def extend(self, messages: List[Dict[str, Any]]):
+        """
+        追加多条消息（一次写入日志），超过窗口大小时截断内存中的旧消息
+
+        Args:
+            messages: OpenAI 格式的消息列表
+        """
+        if not messages:
+            return
+        data = b"".join(_encode(message) for message in messages)
+        self._file.write(data)
+        self._file.flush()
+        self._offset += len(data)
+        self.count += len(messages)
+        self._messages = trim_window(self._messages + list(messages), self.window)
+        self._unsnapshotted += len(messages)
+        if self._unsnapshotted >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """写入快照（先写临时文件再替换，避免中断时损坏已有快照）"""
+        snapshot = {
+            "offset": self._offset,
+            "count": self.count,
+            "window": self._messages,
+            "updated_at": time.time()
+        }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.snapshot_path)
+        self._unsnapshotted = 0
+
+    def clear_window(self):
+        """清空内存中的消息窗口（磁盘上的日志保留，恢复会话时从空窗口开始）"""
+        self._messages = []
+        self.snapshot()
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """
+        按顺序读取会话的全部消息（包括已移出内存窗口的旧消息）
+
+        Yields:
+            消息字典
+        """
+        self._file.flush()
+        for message, _ in _read_records(self.log_path, 0, self._offset):
+            yield message
+
+    def close(self):
+        """写入最终快照并关闭日志文件"""
+        if self._file.closed:
+            return
+        if self._unsnapshotted:
+            self.snapshot()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SessionStore:
+    """会话存储目录，按会话 ID 创建或恢复会话"""
+
+    def __init__(self, directory: Optional[str] = None, window: int = 200, snapshot_every: int = 50):
+        """
+        初始化会话存储
+
+        Args:
+            directory: 会话文件目录，默认读取环境变量 CHAT_SESSION_DIR，未设置时为 .cache/sessions
+            window: 每个会话在内存中保留的最大消息数
+            snapshot_every: 每追加多少条消息写入一次快照
+        """
+        self.directory = directory or get_env("CHAT_SESSION_DIR", os.path.join(".cache", "sessions"))
+        self.window = window
+        self.snapshot_every = snapshot_every
+        os.makedirs(self.directory, exist_ok=True)
+
+    def open(self, session_id: Optional[str] = None) -> Session:
+        """
+        打开会话
+
+        Args:
+            session_id: 会话 ID，不提供时创建新会话
+
+        Returns:
+            Session 实例
+        """
+        session_id = uuid.uuid4().hex[:12] if session_id is None else _check_session_id(session_id)
+        return Session(session_id, self.directory, window=self.window, snapshot_every=self.snapshot_every)
+
+    def exists(self, session_id: str) -> bool:
+        """会话是否存在"""
+        return os.path.exists(os.path.join(self.directory, f"{_check_session_id(session_id)}.log"))
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """
+        列出所有会话（按最近修改时间倒序）
+
+        Returns:
+            [{"id", "size", "modified"}]
+        """
+        sessions = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".log"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            sessions.append({"id": name[:-4], "size": stat.st_size, "modified": stat.st_mtime})
+        sessions.sort(key=lambda item: item["modified"], reverse=True)
+        return sessions
+
+    def delete(self, session_id: str) -> bool:
+        """
+        删除会话的日志和快照
+
+        Returns:
+            是否删除了文件
+        """
+        _check_session_id(session_id)
+        deleted = False
+        for suffix in (".log", ".snapshot.json"):
+            path = os.path.join(self.directory, f"{session_id}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+                deleted = True
+        return deleted
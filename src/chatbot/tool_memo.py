@@ -0,0 +1,156 @@
+"""
+会话内的工具调用记忆
+同一个会话中模型经常用相同的参数重复调用工具（如话题岔开后重新搜索同一个仓库、重新列出 PR）。
+以工具名称和规范化后的参数为键记住成功的工具结果：有效期内的重复调用不再执行，直接复用结果；
+超过有效期后重新执行，结果与之前相同时同样不再插入完整结果。之前的完整结果仍在对话历史中时，
+只向模型发送一条简短的引用，节省提示词 token
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# 默认有效期（秒）
+DEFAULT_TTL = 300
+
+
+def make_memo_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """
+    计算工具调用的记忆键（参数按键排序，去除值为 None 的参数）
+
+    Args:
+        tool_name: 工具名称
+        arguments: 工具参数，应为规范形式（github_tools.canonical_arguments：规范化并补全默认值），
+            使 "123" 与 123、"Open" 与 "open"、省略默认值与显式传入默认值得到相同的键
+
+    Returns:
+        记忆键
+    """
+    canonical = {key: value for key, value in arguments.items() if value is not None}
+    encoded = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return f"{tool_name}:{encoded}"
+
+
+class MemoEntry:
+    """一次工具调用的结果"""
+
+    __slots__ = ("tool_call_id", "content", "digest", "fetched_at")
+
+    def __init__(self, tool_call_id: str, content: str, fetched_at: float):
+        self.tool_call_id = tool_call_id
+        self.content = content
+        self.digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        self.fetched_at = fetched_at
+
+
+class ToolMemo:
+    """线程安全的工具结果记忆（LRU）"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = 256):
+        """
+        初始化工具结果记忆
+
+        Args:
+            ttl: 有效期（秒），有效期内的重复调用不再执行
+            max_entries: 最多保留的条目数
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, MemoEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.unchanged = 0
+        self.misses = 0
+
+    def lookup(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[MemoEntry]:
+        """
+        查找有效期内的结果
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+
+        Returns:
+            有效期内的结果，没有或已过期时返回 None（调用方需要执行工具并调用 record）
+        """
+        key = make_memo_key(tool_name, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry.fetched_at > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def record(self, tool_name: str, arguments: Dict[str, Any], tool_call_id: str, content: str, visible: Callable[[str], bool]) -> Optional[MemoEntry]:
+        """
+        记录一次工具执行的结果
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            tool_call_id: 本次工具调用的 ID
+            content: 格式化后的工具结果
+            visible: 判断某个工具调用 ID 的完整结果是否仍在对话历史中
+
+        Returns:
+            结果与之前相同且之前的完整结果仍可见时返回之前的条目（调用方发送引用），否则返回 None
+        """
+        key = make_memo_key(tool_name, arguments)
+        now = time.time()
+        entry = MemoEntry(tool_call_id, content, now)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.digest == entry.digest and visible(previous.tool_call_id):
+                previous.fetched_at = now
+                self._entries.move_to_end(key)
+                self.unchanged += 1
+                return previous
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return None
+
+    def replace(self, tool_name: str, arguments: Dict[str, Any], tool_call_id: str):
+        """之前的完整结果已不在对话历史中、本次重新发送了完整结果时，更新条目引用的工具调用 ID"""
+        key = make_memo_key(tool_name, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.tool_call_id = tool_call_id
+
+    def clear(self):
+        """清空记忆"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """统计: {"hits": int, "unchanged": int, "misses": int, "entries": int}"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "unchanged": self.unchanged,
+                "misses": self.misses,
+                "entries": len(self._entries)
+            }
+
+
+def reference_message(entry: MemoEntry) -> str:
+    """
+    生成引用之前结果的工具消息内容
+
+    Args:
+        entry: 之前的结果
+
+    Returns:
+        消息内容
+    """
+    age = max(0, round(time.time() - entry.fetched_at))
+    return (
+        f"结果与之前的工具调用（tool_call_id: {entry.tool_call_id}）相同，未重复插入，"
+        f"请直接参考该结果（{age} 秒前获取）"
+    )
@@ -0,0 +1,57 @@
+"""
+项目配置加载
+集中管理 .env 文件和环境变量的读取，保证 .env 只在进程内加载一次
+"""
+import os
+import threading
+from typing import Optional
+
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load_config(dotenv_path: Optional[str] = None, override: bool = False) -> bool:
+    """
+    加载 .env 文件到环境变量（进程内只执行一次，重复调用直接返回）
+
+    程序入口（聊天机器人、MCP 服务器、批量脚本）应在启动时显式调用；
+    库函数通过 get_env 读取配置时也会确保已加载
+
+    Args:
+        dotenv_path: 可选的 .env 文件路径，不提供时按 python-dotenv 的规则自动查找
+        override: 是否覆盖已存在的环境变量
+
+    Returns:
+        本次调用是否实际执行了加载
+    """
+    global _loaded
+    if _loaded:
+        return False
+    with _load_lock:
+        if _loaded:
+            return False
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            # 未安装 python-dotenv 时只使用进程环境变量
+            pass
+        else:
+            load_dotenv(dotenv_path=dotenv_path, override=override)
+        _loaded = True
+    return True
+
+
+def get_env(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    读取配置项（首次读取时加载 .env）
+
+    Args:
+        name: 环境变量名
+        default: 未设置时的默认值
+
+    Returns:
+        配置值
+    """
+    if not _loaded:
+        load_config()
+    return os.getenv(name, default)
@@ -0,0 +1,93 @@
+"""
+截止时间传递
+使用 contextvars 在一轮对话、工具调用和 HTTP 请求之间传递同一个截止时间：
+外层设置截止时间后，内层调用通过 remaining() 获取剩余时间作为超时，
+协程、asyncio 任务以及 run_coroutine_threadsafe 提交到后台事件循环的协程都会继承该截止时间
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 当前上下文的截止时间（time.monotonic() 时间戳），None 表示不限时
+_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """已超过截止时间"""
+
+
+def get_deadline() -> Optional[float]:
+    """获取当前上下文的截止时间（time.monotonic() 时间戳），未设置时返回 None"""
+    return _deadline.get()
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """
+    距离截止时间的剩余秒数
+
+    Args:
+        default: 未设置截止时间时的返回值
+
+    Returns:
+        剩余秒数（已超时时为 0），未设置截止时间时返回 default
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    """当前上下文的截止时间是否已过"""
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    在代码块内设置截止时间（嵌套时取更早的截止时间，外层截止时间不会被延长）
+
+    Args:
+        seconds: 从现在起的秒数，None 表示沿用外层截止时间
+
+    Yields:
+        生效的截止时间（time.monotonic() 时间戳）或 None
+    """
+    current = _deadline.get()
+    if seconds is None:
+        yield current
+        return
+    deadline = time.monotonic() + max(0.0, seconds)
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+async def run_with_deadline(awaitable: Awaitable[T], grace: float = 0.0) -> T:
+    """
+    在当前截止时间内等待协程完成，超时时取消协程并抛出 DeadlineExceeded
+
+    Args:
+        awaitable: 要等待的协程
+        grace: 截止时间之后额外等待的秒数（协程自身会在截止时间返回部分结果时，留出返回的时间）
+
+    Returns:
+        协程的返回值
+    """
+    import asyncio
+
+    timeout = remaining()
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout + grace)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("已超过截止时间")
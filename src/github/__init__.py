@@ -5,13 +5,27 @@ from .server import (
     search_repository_by_url,
     get_pull_requests_by_repo_id,
     get_pull_request_files_by_repo_id,
+    iter_pull_request_files,
     get_commits_by_repo_id
 )
+from .mirror import search_commits_and_pull_requests
+from .analytics import get_repository_analytics
+from .batch import query_repositories, iter_repositories, query_pull_request_files, iter_pull_request_file_listings
+from .runner import BackgroundLoop, SyncGitHubClient
 
 __all__ = [
     'search_repository_by_url',
     'get_pull_requests_by_repo_id',
     'get_pull_request_files_by_repo_id',
-    'get_commits_by_repo_id'
+    'iter_pull_request_files',
+    'get_commits_by_repo_id',
+    'search_commits_and_pull_requests',
+    'get_repository_analytics',
+    'query_repositories',
+    'iter_repositories',
+    'query_pull_request_files',
+    'iter_pull_request_file_listings',
+    'BackgroundLoop',
+    'SyncGitHubClient'
 ]
 
@@ -0,0 +1,273 @@
+"""
+仓库数据分析
+基于本地镜像中的 PR 和提交数据计算聚合指标（合并耗时、贡献者排行、提交时间分布等）
+数据按列组织，安装了 NumPy 时使用向量化计算（首次计算时导入），否则退化为纯 Python 实现
+"""
+import heapq
+import statistics
+from collections import Counter
+from itertools import compress
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .mirror import get_mirror, sync_repository
+
+# NumPy 为可选依赖，导入耗时较长，首次计算时才加载
+np = None
+_numpy_checked = False
+
+
+def _load_numpy():
+    """首次调用时尝试导入 NumPy，未安装时保持 np 为 None"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_checked = True
+    return np
+
+
+# 支持的分析指标
+METRICS = ("merge_time", "top_contributors", "commits_by_weekday", "commits_by_hour")
+
+WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
+# 提交相关指标共用同一组列，只需从镜像读取一次
+_COMMIT_FIELDS = ("author_name", "author_email", "author_date")
+
+
+# 列式数据缓存：(表名, 列名, 仓库 ID) -> (镜像版本号, 列数据)
+_column_cache: Dict[Tuple, Tuple[int, Dict[str, Any]]] = {}
+
+
+def _load_columns(table: str, fields: Tuple[str, ...], repo_id: Optional[int], epoch_fields: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """
+    从镜像读取列数据并转换为列式数组，镜像未变化时复用缓存
+
+    逐行读取 SQLite 是主要开销，缓存后重复查询只需向量化计算
+    """
+    _load_numpy()
+    mirror = get_mirror()
+    key = (table, fields, repo_id, epoch_fields)
+    version = mirror.version(repo_id)
+    cached = _column_cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    cols = mirror.columns(table, list(fields), repo_id, epoch_fields=epoch_fields)
+    for field in epoch_fields:
+        cols[field] = _epoch_array(cols[field])
+    _column_cache[key] = (version, cols)
+    return cols
+
+
+def _epoch_array(values: List[Optional[int]]):
+    """
+    将 Unix 时间戳列（秒）转换为列式数组
+
+    Returns:
+        NumPy 可用时返回 float64 数组（缺失值为 NaN），否则原样返回列表（缺失值为 None）
+    """
+    if np is not None:
+        return np.array([np.nan if value is None else value for value in values], dtype="float64")
+    return values
+
+
+def _parse_bound(value: Optional[str]) -> Optional[float]:
+    """解析 since / until 时间边界（无时区信息时按 UTC 处理）"""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _window_mask(seconds, since: Optional[float], until: Optional[float]):
+    """计算落在 [since, until) 时间窗口内的行"""
+    if np is not None:
+        mask = ~np.isnan(seconds)
+        if since is not None:
+            mask &= seconds >= since
+        if until is not None:
+            mask &= seconds < until
+        return mask
+    return [
+        value is not None
+        and (since is None or value >= since)
+        and (until is None or value < until)
+        for value in seconds
+    ]
+
+
+def merge_time_stats(repo_id: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None) -> Dict:
+    """
+    计算 PR 从创建到合并的耗时统计（按合并时间筛选窗口）
+
+    Returns:
+        {"merged_count": int, "median_hours": float, "mean_hours": float, "p90_hours": float}
+    """
+    cols = _load_columns("pull_requests", ("created_at", "merged_at"), repo_id, epoch_fields=("created_at", "merged_at"))
+    created = cols["created_at"]
+    merged = cols["merged_at"]
+    mask = _window_mask(merged, _parse_bound(since), _parse_bound(until))
+
+    if np is not None:
+        hours = (merged[mask] - created[mask]) / 3600.0
+        hours = hours[~np.isnan(hours)]
+        if hours.size == 0:
+            return {"merged_count": 0, "median_hours": None, "mean_hours": None, "p90_hours": None}
+        return {
+            "merged_count": int(hours.size),
+            "median_hours": round(float(np.median(hours)), 2),
+            "mean_hours": round(float(hours.mean()), 2),
+            "p90_hours": round(float(np.percentile(hours, 90)), 2)
+        }
+
+    hours = [
+        (m - c) / 3600.0
+        for c, m, keep in zip(created, merged, mask)
+        if keep and c is not None
+    ]
+    if not hours:
+        return {"merged_count": 0, "median_hours": None, "mean_hours": None, "p90_hours": None}
+    hours.sort()
+    return {
+        "merged_count": len(hours),
+        "median_hours": round(statistics.median(hours), 2),
+        "mean_hours": round(statistics.fmean(hours), 2),
+        "p90_hours": round(statistics.quantiles(hours, n=10, method="inclusive")[-1], 2) if len(hours) > 1 else round(hours[0], 2)
+    }
+
+
+def top_contributors(repo_id: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None, top_n: int = 10) -> List[Dict]:
+    """
+    按提交数统计贡献者排行（按作者提交时间筛选窗口）
+
+    Returns:
+        [{"author": str, "commits": int}, ...]
+    """
+    cols = _load_columns("commits", _COMMIT_FIELDS, repo_id, epoch_fields=("author_date",))
+    mask = _window_mask(cols["author_date"], _parse_bound(since), _parse_bound(until))
+    authors = [name or email or "未知" for name, email in zip(cols["author_name"], cols["author_email"])]
+
+    # 时间窗口过滤使用向量化掩码；作者是字符串列，哈希计数比排序去重（np.unique）更快
+    if np is not None:
+        mask = mask.tolist()
+    counter = Counter(compress(authors, mask))
+    return [
+        {"author": author, "commits": count}
+        for author, count in heapq.nlargest(top_n, counter.items(), key=lambda item: (item[1], item[0]))
+    ]
+
+
+def commit_distribution(repo_id: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None, by: str = "weekday") -> List[int]:
+    """
+    统计提交的时间分布（UTC）
+
+    Args:
+        by: 分布维度，可选值: weekday（周一到周日 7 个桶）, hour（0-23 时 24 个桶）
+
+    Returns:
+        每个桶的提交数列表
+    """
+    seconds = _load_columns("commits", _COMMIT_FIELDS, repo_id, epoch_fields=("author_date",))["author_date"]
+    mask = _window_mask(seconds, _parse_bound(since), _parse_bound(until))
+    buckets = 7 if by == "weekday" else 24
+
+    if np is not None:
+        selected = seconds[mask].astype("int64")
+        if by == "weekday":
+            # 1970-01-01 是周四，偏移 3 天后周一为 0
+            keys = (selected // 86400 + 3) % 7
+        else:
+            keys = (selected // 3600) % 24
+        return np.bincount(keys, minlength=buckets).tolist()
+
+    counts = [0] * buckets
+    for value, keep in zip(seconds, mask):
+        if keep:
+            value = int(value)
+            counts[(value // 86400 + 3) % 7 if by == "weekday" else (value // 3600) % 24] += 1
+    return counts
+
+
+async def get_repository_analytics(repo_id: int, metric: str = "merge_time", since: Optional[str] = None, until: Optional[str] = None, top_n: int = 10, sync_pages: int = 0, on_page: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
+    """
+    计算仓库的聚合分析指标（基于本地镜像中的 PR 和提交数据）
+
+    Args:
+        repo_id: 仓库 ID（整数）
+        metric: 分析指标，可选值:
+            - merge_time: PR 合并耗时（中位数、平均值、P90，单位小时）
+            - top_contributors: 提交数最多的贡献者
+            - commits_by_weekday: 按星期统计提交数
+            - commits_by_hour: 按小时（UTC）统计提交数
+        since: 只统计此日期之后的数据（ISO 8601 格式）
+        until: 只统计此日期之前的数据（ISO 8601 格式）
+        top_n: 贡献者排行返回数量，默认 10
+        sync_pages: 计算前从 GitHub 同步的页数（每页 100 条），默认 0 表示只使用已有数据
+        on_page: 可选的异步回调，同步时每个页请求完成时调用（见 sync_repository）
+
+    Returns:
+        包含分析结果和状态的字典:
+        {
+            "success": bool,
+            "data": {
+                "repository_id": int,
+                "metric": str,
+                "since": str,
+                "until": str,
+                "indexed": dict,    # 镜像中的 PR / 提交数量
+                "result": dict/list
+            },
+            "error": str,
+            "status_code": int
+        }
+    """
+    if metric not in METRICS:
+        return {
+            "success": False,
+            "error": f"不支持的分析指标: {metric}，可选值: {', '.join(METRICS)}",
+            "status_code": 400,
+            "data": None
+        }
+
+    if sync_pages:
+        sync_result = await sync_repository(repo_id, pages=sync_pages, on_page=on_page)
+        if not sync_result["success"]:
+            return sync_result
+
+    try:
+        if metric == "merge_time":
+            result = merge_time_stats(repo_id, since, until)
+        elif metric == "top_contributors":
+            result = top_contributors(repo_id, since, until, top_n)
+        elif metric == "commits_by_weekday":
+            result = dict(zip(WEEKDAY_NAMES, commit_distribution(repo_id, since, until, by="weekday")))
+        else:
+            result = {f"{hour:02d}": count for hour, count in enumerate(commit_distribution(repo_id, since, until, by="hour"))}
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": f"时间参数格式错误: {str(e)}",
+            "status_code": 400,
+            "data": None
+        }
+
+    return {
+        "success": True,
+        "data": {
+            "repository_id": repo_id,
+            "metric": metric,
+            "since": since,
+            "until": until,
+            "indexed": get_mirror().count(repo_id),
+            "result": result
+        },
+        "error": None,
+        "status_code": 200
+    }
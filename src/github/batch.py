@@ -0,0 +1,437 @@
+"""
+多仓库批量查询
+在一组仓库上并发执行 Pull Requests / 提交查询，按完成顺序流式返回每个仓库的结果，并生成合并排序后的汇总；
+以及并发读取多个 PR 的变更文件，生成按文件去重合并的变更统计（churn 表）
+"""
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from ..deadline import DeadlineExceeded, remaining
+from .server import (
+    search_repository_by_url,
+    get_pull_requests_by_repo_id,
+    get_pull_request_files_by_repo_id,
+    get_commits_by_repo_id
+)
+
+
+# 支持的批量操作
+OPERATIONS = ("pull_requests", "commits")
+
+# 各操作接受的查询参数，其余参数（如只对提交有效的 since）会被忽略
+_OPERATION_PARAMS = {
+    "pull_requests": ("state", "per_page", "page", "sort", "direction"),
+    "commits": ("sha", "path", "author", "since", "until", "per_page", "page")
+}
+
+# 默认并发数，避免瞬间打满 GitHub 的并发限制
+DEFAULT_CONCURRENCY = 8
+
+
+async def _resolve_repository(repo: Union[int, str]) -> Dict:
+    """
+    将仓库 ID 或名称解析为仓库 ID
+
+    Returns:
+        {"success": bool, "repository_id": int, "full_name": str, "error": str}
+    """
+    if isinstance(repo, int) or (isinstance(repo, str) and repo.strip().isdigit()):
+        return {"success": True, "repository_id": int(repo), "full_name": None, "error": None}
+
+    result = await search_repository_by_url(str(repo), per_page=1)
+    if not result["success"]:
+        return {"success": False, "repository_id": None, "full_name": None, "error": result["error"]}
+    repositories = result["data"]["repositories"]
+    if not repositories:
+        return {"success": False, "repository_id": None, "full_name": None, "error": f"未找到仓库: {repo}"}
+    return {
+        "success": True,
+        "repository_id": repositories[0]["id"],
+        "full_name": repositories[0]["full_name"],
+        "error": None
+    }
+
+
+async def _query_repository(index: int, repo: Union[int, str], operation: str, semaphore: asyncio.Semaphore, params: Dict) -> Dict:
+    """在信号量限制下查询单个仓库（index 为输入列表中的位置）"""
+    async with semaphore:
+        started = time.perf_counter()
+        resolved = await _resolve_repository(repo)
+        entry = {
+            "index": index,
+            "repo": repo,
+            "repository_id": resolved["repository_id"],
+            "full_name": resolved["full_name"],
+            "success": False,
+            "error": resolved["error"],
+            "total": 0,
+            "items": []
+        }
+        if resolved["success"]:
+            kwargs = {
+                key: value for key, value in params.items()
+                if key in _OPERATION_PARAMS[operation] and value is not None
+            }
+            if operation == "pull_requests":
+                result = await get_pull_requests_by_repo_id(resolved["repository_id"], **kwargs)
+                items_key = "pull_requests"
+            else:
+                result = await get_commits_by_repo_id(resolved["repository_id"], **kwargs)
+                items_key = "commits"
+            entry["success"] = result["success"]
+            entry["error"] = result["error"]
+            if result["success"]:
+                entry["items"] = result["data"][items_key]
+                entry["total"] = len(entry["items"])
+        entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return entry
+
+
+async def iter_repositories(repos: List[Union[int, str]], operation: str = "pull_requests", concurrency: int = DEFAULT_CONCURRENCY, **params) -> AsyncIterator[Dict]:
+    """
+    并发查询多个仓库，按完成顺序逐个产出结果
+
+    Args:
+        repos: 仓库 ID 或名称（owner/repo、URL 等 search_repository_by_url 支持的格式）列表
+        operation: 查询类型，可选值: pull_requests, commits
+        concurrency: 最大并发仓库数
+        **params: 传递给 get_pull_requests_by_repo_id / get_commits_by_repo_id 的查询参数，
+            不适用于当前操作的参数和值为 None 的参数会被忽略
+
+    Yields:
+        每个仓库的结果字典，包含 index（输入位置）、repo、repository_id、full_name、success、error、total、items、elapsed_ms
+
+    Raises:
+        DeadlineExceeded: 超过当前截止时间时仍有仓库未完成（已产出的结果不受影响）
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.ensure_future(_query_repository(index, repo, operation, semaphore, params))
+        for index, repo in enumerate(repos)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=remaining()):
+            try:
+                entry = await next_done
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("已超过截止时间，部分仓库未完成查询")
+            yield entry
+    finally:
+        # 调用方提前结束迭代时取消尚未完成的查询
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def _sort_key(operation: str) -> Callable[[Dict], str]:
+    """合并结果的排序键：PR 按创建时间，提交按作者时间"""
+    if operation == "pull_requests":
+        return lambda item: item.get("created_at") or ""
+    return lambda item: (item.get("author") or {}).get("date") or ""
+
+
+async def query_repositories(repos: List[Union[int, str]], operation: str = "pull_requests", concurrency: int = DEFAULT_CONCURRENCY, max_items: int = 100, on_result: Optional[Callable[[Dict], Awaitable[None]]] = None, **params) -> Dict:
+    """
+    在多个仓库上批量查询 Pull Requests 或提交，返回每个仓库的结果和合并排序后的汇总
+
+    Args:
+        repos: 仓库 ID 或名称列表
+        operation: 查询类型，可选值: pull_requests, commits，默认 pull_requests
+        concurrency: 最大并发仓库数，默认 8
+        max_items: 合并汇总中保留的最大条目数，默认 100
+        on_result: 可选的异步回调，每个仓库查询完成时调用（用于流式推送）
+        **params: 传递给单仓库查询函数的参数（如 state、per_page、since、until、author）
+
+    Returns:
+        包含批量结果和状态的字典:
+        {
+            "success": bool,
+            "data": {
+                "operation": str,
+                "total_repositories": int,
+                "succeeded": int,
+                "failed": int,
+                "total_items": int,          # 所有仓库返回的条目总数
+                "repositories": list,        # 每个仓库的摘要（按输入顺序）
+                "items": list,               # 合并后按时间倒序排列的条目，带 repository_id / full_name
+                "timed_out": bool            # 是否因超过截止时间而只返回部分仓库的结果
+            },
+            "error": str,
+            "status_code": int
+        }
+    """
+    if operation not in OPERATIONS:
+        return {
+            "success": False,
+            "error": f"不支持的批量操作: {operation}，可选值: {', '.join(OPERATIONS)}",
+            "status_code": 400,
+            "data": None
+        }
+    if not repos:
+        return {
+            "success": False,
+            "error": "仓库列表不能为空",
+            "status_code": 400,
+            "data": None
+        }
+
+    entries: Dict[int, Dict] = {}
+    timed_out = False
+    try:
+        async for entry in iter_repositories(repos, operation, concurrency, **params):
+            entries[entry["index"]] = entry
+            if on_result is not None:
+                # 附带进度：已完成的 PR 数和去重后的 PR 总数
+                await on_result(dict(entry, completed=len(entries), total_pull_requests=len(keys)))
+    except DeadlineExceeded:
+        # 超过截止时间：保留已完成的仓库结果，未完成的标记为超时
+        timed_out = True
+        for index, repo in enumerate(repos):
+            if index not in entries:
+                entries[index] = {
+                    "index": index,
+                    "repo": repo,
+                    "repository_id": None,
+                    "full_name": None,
+                    "success": False,
+                    "error": "已超时（超过截止时间未完成）",
+                    "total": 0,
+                    "items": [],
+                    "elapsed_ms": None
+                }
+
+    merged = []
+    summaries = []
+    for index in sorted(entries):
+        entry = entries[index]
+        for item in entry["items"]:
+            merged.append({**item, "repository_id": entry["repository_id"], "full_name": entry["full_name"]})
+        summaries.append({key: value for key, value in entry.items() if key not in ("index", "items")})
+    merged.sort(key=_sort_key(operation), reverse=True)
+
+    succeeded = sum(1 for entry in summaries if entry["success"])
+    # 单个 PR 在截止时间内只读取了部分页面时，整体结果同样是部分结果
+    timed_out = timed_out or any(entry["timed_out"] for entry in summaries)
+    return {
+        "success": succeeded > 0,
+        "data": {
+            "operation": operation,
+            "total_repositories": len(summaries),
+            "succeeded": succeeded,
+            "failed": len(summaries) - succeeded,
+            "total_items": len(merged),
+            "repositories": summaries,
+            "items": merged[:max_items],
+            "timed_out": timed_out
+        },
+        "error": None if succeeded else "所有仓库查询均失败",
+        "status_code": 200 if succeeded else 502
+    }
+
+
+def _pull_request_key(pr: Union[Dict, Sequence[int]]) -> Tuple[int, int]:
+    """将 {"repo_id": ..., "pr_number": ...} 或 (repo_id, pr_number) 转换为 (仓库 ID, PR 编号)"""
+    if isinstance(pr, dict):
+        return int(pr["repo_id"]), int(pr["pr_number"])
+    repo_id, pr_number = pr
+    return int(repo_id), int(pr_number)
+
+
+async def _query_pull_request_files(index: int, repo_id: int, pr_number: int, semaphore: asyncio.Semaphore, include_patch: bool) -> Dict:
+    """在信号量限制下读取单个 PR 的全部变更文件（index 为去重后列表中的位置）"""
+    async with semaphore:
+        started = time.perf_counter()
+        # churn 表需要全部文件
+        result = await get_pull_request_files_by_repo_id(repo_id, pr_number, include_patch=include_patch, max_files=None)
+        entry = {
+            "index": index,
+            "repository_id": repo_id,
+            "pull_request_number": pr_number,
+            "success": result["success"],
+            "error": result["error"],
+            "total_files": 0,
+            "total_additions": 0,
+            "total_deletions": 0,
+            "changed_files": 0,
+            "truncated": False,
+            "complete": False,
+            "timed_out": False,
+            "files": []
+        }
+        if result["success"]:
+            data = result["data"]
+            # timed_out: 超过截止时间，只读取了部分页面
+            for key in ("total_files", "total_additions", "total_deletions", "changed_files", "truncated", "complete", "timed_out", "files"):
+                entry[key] = data[key]
+        entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return entry
+
+
+async def iter_pull_request_file_listings(prs: List[Union[Dict, Sequence[int]]], concurrency: int = DEFAULT_CONCURRENCY, include_patch: bool = False) -> AsyncIterator[Dict]:
+    """
+    并发读取多个 PR 的变更文件，按完成顺序逐个产出结果（重复的 PR 只读取一次）
+
+    Args:
+        prs: PR 列表，每项为 {"repo_id": int, "pr_number": int} 或 (repo_id, pr_number)
+        concurrency: 最大并发 PR 数
+        include_patch: 是否保留每个文件的补丁内容
+
+    Yields:
+        每个 PR 的结果字典，包含 index（去重后的位置）、repository_id、pull_request_number、success、error、
+        total_files、total_additions、total_deletions、changed_files、truncated、complete、timed_out、files、elapsed_ms
+
+    Raises:
+        DeadlineExceeded: 超过当前截止时间时仍有 PR 未完成（已产出的结果不受影响）
+    """
+    keys = list(dict.fromkeys(_pull_request_key(pr) for pr in prs))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.ensure_future(_query_pull_request_files(index, repo_id, pr_number, semaphore, include_patch))
+        for index, (repo_id, pr_number) in enumerate(keys)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=remaining()):
+            try:
+                entry = await next_done
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("已超过截止时间，部分 PR 未完成查询")
+            yield entry
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def query_pull_request_files(prs: List[Union[Dict, Sequence[int]]], concurrency: int = DEFAULT_CONCURRENCY, include_patch: bool = False, max_files_per_pr: int = 20, max_rows: int = 100, on_result: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
+    """
+    批量读取多个 PR 的变更文件，返回每个 PR 的结果和按文件去重合并的变更统计
+
+    同一仓库中被多个 PR 修改的文件在 churn 表中合并为一行，增删行数累加并列出相关的 PR 编号；
+    统计包含每个 PR 的全部文件，max_files_per_pr 只限制每个 PR 结果中返回的文件列表
+
+    Args:
+        prs: PR 列表，每项为 {"repo_id": int, "pr_number": int} 或 (repo_id, pr_number)，重复项只读取一次
+        concurrency: 最大并发 PR 数，默认 8
+        include_patch: 每个 PR 的文件列表是否包含补丁内容，默认 False
+        max_files_per_pr: 每个 PR 结果中最多返回的文件数，默认 20
+        max_rows: churn 表最多保留的行数（按变更行数倒序），默认 100
+        on_result: 可选的异步回调，每个 PR 读取完成时调用（用于流式推送），参数为该 PR 的结果，
+            另外包含 completed（已完成的 PR 数）和 total_pull_requests（去重后的 PR 总数）
+
+    Returns:
+        包含批量结果和状态的字典:
+        {
+            "success": bool,
+            "data": {
+                "total_pull_requests": int,  # 去重后的 PR 数
+                "succeeded": int,
+                "failed": int,
+                "total_files": int,          # 去重后的文件数（仓库 + 文件名）
+                "total_additions": int,
+                "total_deletions": int,
+                "pull_requests": list,       # 每个 PR 的结果（按输入顺序），files 最多 max_files_per_pr 个
+                "churn": [                   # 按变更行数倒序的文件统计
+                    {
+                        "repository_id": int,
+                        "filename": str,
+                        "pull_requests": list,   # 修改了该文件的 PR 编号（升序）
+                        "additions": int,
+                        "deletions": int,
+                        "changes": int
+                    }
+                ],
+                "timed_out": bool            # 是否因超过截止时间而只返回部分 PR 或部分文件的结果
+            },
+            "error": str,
+            "status_code": int
+        }
+    """
+    if not prs:
+        return {
+            "success": False,
+            "error": "PR 列表不能为空",
+            "status_code": 400,
+            "data": None
+        }
+    try:
+        keys = list(dict.fromkeys(_pull_request_key(pr) for pr in prs))
+    except (KeyError, TypeError, ValueError):
+        return {
+            "success": False,
+            "error": "PR 列表的每一项需要包含 repo_id 和 pr_number",
+            "status_code": 400,
+            "data": None
+        }
+
+    entries: Dict[int, Dict] = {}
+    churn: Dict[Tuple[int, str], Dict] = {}
+    timed_out = False
+    try:
+        async for entry in iter_pull_request_file_listings(keys, concurrency, include_patch):
+            for file in entry["files"]:
+                row = churn.get((entry["repository_id"], file["filename"]))
+                if row is None:
+                    row = churn[(entry["repository_id"], file["filename"])] = {
+                        "repository_id": entry["repository_id"],
+                        "filename": file["filename"],
+                        "pull_requests": [],
+                        "additions": 0,
+                        "deletions": 0,
+                        "changes": 0
+                    }
+                row["pull_requests"].append(entry["pull_request_number"])
+                row["additions"] += file["additions"]
+                row["deletions"] += file["deletions"]
+                row["changes"] += file["changes"]
+            entry["files"] = entry["files"][:max(0, max_files_per_pr)]
+            entries[entry["index"]] = entry
+            if on_result is not None:
+                # 附带进度：已完成的 PR 数和去重后的 PR 总数
+                await on_result(dict(entry, completed=len(entries), total_pull_requests=len(keys)))
+    except DeadlineExceeded:
+        # 超过截止时间：保留已完成的 PR 结果，未完成的标记为超时
+        timed_out = True
+        for index, (repo_id, pr_number) in enumerate(keys):
+            if index not in entries:
+                entries[index] = {
+                    "index": index,
+                    "repository_id": repo_id,
+                    "pull_request_number": pr_number,
+                    "success": False,
+                    "error": "已超时（超过截止时间未完成）",
+                    "total_files": 0,
+                    "total_additions": 0,
+                    "total_deletions": 0,
+                    "changed_files": 0,
+                    "truncated": False,
+                    "complete": False,
+                    "timed_out": True,
+                    "files": [],
+                    "elapsed_ms": None
+                }
+
+    summaries = [{key: value for key, value in entries[index].items() if key != "index"} for index in sorted(entries)]
+    rows = sorted(churn.values(), key=lambda row: (-row["changes"], row["repository_id"], row["filename"]))
+    for row in rows:
+        row["pull_requests"].sort()
+
+    succeeded = sum(1 for entry in summaries if entry["success"])
+    # 单个 PR 在截止时间内只读取了部分页面时，整体结果同样是部分结果
+    timed_out = timed_out or any(entry["timed_out"] for entry in summaries)
+    return {
+        "success": succeeded > 0,
+        "data": {
+            "total_pull_requests": len(summaries),
+            "succeeded": succeeded,
+            "failed": len(summaries) - succeeded,
+            "total_files": len(rows),
+            "total_additions": sum(row["additions"] for row in rows),
+            "total_deletions": sum(row["deletions"] for row in rows),
+            "pull_requests": summaries,
+            "churn": rows[:max(0, max_rows)],
+            "timed_out": timed_out
+        },
+        "error": None if succeeded else "所有 PR 查询均失败",
+        "status_code": 200 if succeeded else 502
+    }
@@ -0,0 +1,312 @@
+"""
+GitHub API 响应缓存
+缓存成功的 GET 响应（按调用身份、URL 和查询参数区分），按 TTL 失效；
+相同请求在进行中时合并为一次网络请求（single-flight），并统计预取条目的命中和浪费
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..config import get_env
+
+# 默认缓存有效期（秒），可通过环境变量 GITHUB_CACHE_TTL 配置，设为 0 禁用缓存
+DEFAULT_TTL = 30
+
+# 当前上下文中的请求是否由预取发起（预取任务中设置为 True，github_api_request 据此标记缓存条目）
+prefetching: contextvars.ContextVar = contextvars.ContextVar("github_prefetching", default=False)
+
+
+def make_identity(token: Optional[str], username: Optional[str] = None) -> str:
+    """
+    生成调用身份标识（不同 Token / 用户名看到的数据可能不同，缓存互不共享）
+
+    Args:
+        token: GitHub Token
+        username: 用户名
+
+    Returns:
+        身份标识字符串（Token 只保留哈希）
+    """
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16] if token else "anonymous"
+    return f"{token_hash}:{username or ''}"
+
+
+def make_key(method: str, url: str, params: Optional[Dict] = None, identity: str = "") -> str:
+    """
+    生成缓存键
+
+    Args:
+        method: HTTP 方法
+        url: 完整请求 URL
+        params: 查询参数
+        identity: make_identity 生成的身份标识
+
+    Returns:
+        缓存键
+    """
+    query = json.dumps(params or {}, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{identity}|{method.upper()} {url}?{query}"
+
+
+class _Entry:
+    """缓存条目"""
+
+    __slots__ = ("value", "expires_at", "prefetched")
+
+    def __init__(self, value: Dict, expires_at: float, prefetched: bool):
+        self.value = value
+        self.expires_at = expires_at
+        self.prefetched = prefetched
+
+
+class _Flight:
+    """进行中的请求：loader 在独立任务中运行，所有等待者都离开后才取消"""
+
+    __slots__ = ("task", "prefetched", "waiters")
+
+    def __init__(self, prefetched: bool):
+        self.task: Optional[asyncio.Task] = None
+        self.prefetched = prefetched
+        self.waiters = 0
+
+
+class ResponseCache:
+    """线程安全的 GitHub 响应缓存（LRU + TTL + single-flight）"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = 1024):
+        """
+        初始化响应缓存
+
+        Args:
+            ttl: 缓存有效期（秒），小于等于 0 表示禁用
+            max_entries: 最多保留的条目数
+        """
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # 事件循环 -> {缓存键: 进行中的请求}（事件循环关闭后自动移除）
+        self._inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _Flight]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "prefetch_stored": 0,
+            "prefetch_hits": 0,
+            "prefetch_wasted": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """缓存是否启用"""
+        return self.ttl > 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        读取未过期的缓存条目
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            if entry.prefetched:
+                # 预取的条目第一次被正常请求使用时记为预取命中
+                entry.prefetched = False
+                self._stats["prefetch_hits"] += 1
+            return entry.value
+
+    def set(self, key: str, value: Dict, prefetched: bool = False):
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            value: 响应结果
+            prefetched: 是否由预取写入
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, time.monotonic() + self.ttl, prefetched)
+            if prefetched:
+                self._stats["prefetch_stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        """删除条目，未被使用过的预取条目记为浪费（调用方持有锁）"""
+        entry = self._entries.pop(key)
+        if entry.prefetched:
+            self._stats["prefetch_wasted"] += 1
+
+    async def fetch(self, key: str, loader: Callable[[], Awaitable[Dict]], prefetched: bool = False) -> Dict:
+        """
+        读取缓存，未命中时调用 loader 获取并缓存成功的响应
+
+        同一事件循环上相同键的并发请求只会调用一次 loader，其余请求等待同一个结果；loader 在独立任务中运行，
+        某个等待者被取消（如超过截止时间）时不影响其他等待者，所有等待者都被取消后才取消 loader
+
+        Args:
+            key: 缓存键
+            loader: 发起实际请求的协程函数
+            prefetched: 本次请求是否为预取
+
+        Returns:
+            响应结果
+        """
+        if not self.enabled:
+            return await loader()
+
+        cached = self.get(key) if not prefetched else self.peek(key)
+        if cached is not None:
+            if not prefetched:
+                self._count("hits")
+            return cached
+
+        loop = asyncio.get_running_loop()
+        flights = self._inflight.setdefault(loop, {})
+        flight = flights.get(key)
+        if flight is not None:
+            if not prefetched:
+                self._count("coalesced")
+                # 正常请求合并到进行中的预取请求时，预取同样算作命中
+                if flight.prefetched:
+                    flight.prefetched = False
+                    self._count("prefetch_hits")
+            return await self._wait(flight)
+
+        if not prefetched:
+            self._count("misses")
+        flight = _Flight(prefetched)
+        flight.task = loop.create_task(self._load(flights, key, loader, flight))
+        flights[key] = flight
+        return await self._wait(flight)
+
+    async def _load(self, flights: Dict[str, _Flight], key: str, loader: Callable[[], Awaitable[Dict]], flight: _Flight) -> Dict:
+        """执行 loader 并缓存成功的响应（在进行中的请求自己的任务中运行）"""
+        try:
+            result = await loader()
+            if result.get("success"):
+                self.set(key, result, prefetched=flight.prefetched)
+            return result
+        finally:
+            if flights.get(key) is flight:
+                del flights[key]
+
+    @staticmethod
+    async def _wait(flight: _Flight) -> Dict:
+        """等待进行中的请求；最后一个等待者离开（被取消）时取消 loader"""
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """读取缓存但不更新命中统计和预取标记（用于预取前检查是否已缓存）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                return None
+            return entry.value
+
+    def invalidate(self, match: Optional[str] = None, ignore_case: bool = False) -> int:
+        """
+        使缓存条目失效
+
+        Args:
+            match: 只删除键中包含该子串的条目（如 "/repositories/123/"），不提供时清空全部
+            ignore_case: 匹配时是否忽略大小写（如 /repos/{owner}/{repo} 路径）
+
+        Returns:
+            删除的条目数
+        """
+        with self._lock:
+            keys = self._matching(match, ignore_case)
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def update(self, match: str, func: Callable[[Dict], Optional[Dict]], ignore_case: bool = False) -> int:
+        """
+        原地更新未过期的缓存条目（保留原有的过期时间）
+
+        Args:
+            match: 只更新键中包含该子串的条目
+            func: 接收原响应、返回新响应的函数，返回 None 时删除该条目
+            ignore_case: 匹配时是否忽略大小写
+
+        Returns:
+            更新（或删除）的条目数
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys = [key for key in self._matching(match, ignore_case) if self._entries[key].expires_at >= now]
+            for key in keys:
+                value = func(self._entries[key].value)
+                if value is None:
+                    self._drop(key)
+                else:
+                    self._entries[key].value = value
+            return len(keys)
+
+    def _matching(self, match: Optional[str], ignore_case: bool) -> list:
+        """键中包含 match 的条目（调用方持有锁）"""
+        if match is None:
+            return list(self._entries)
+        if ignore_case:
+            match = match.lower()
+            return [key for key in self._entries if match in key.lower()]
+        return [key for key in self._entries if match in key]
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（命中、未命中、合并请求数，以及预取写入/命中/浪费数）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    获取进程内共享的响应缓存（首次调用时按 GITHUB_CACHE_TTL 创建）
+
+    Returns:
+        ResponseCache 实例
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(ttl=float(get_env("GITHUB_CACHE_TTL", str(DEFAULT_TTL))))
+    return _cache
@@ -0,0 +1,391 @@
+"""
+本地 git 提交查询后端
+查询大量提交历史时，REST API 每页最多 100 个提交，每页都计入速率限制，且列表接口不返回每个提交的增删统计。
+启用后，get_commits_by_repo_id 在本地为每个仓库维护一个裸克隆（首次查询时克隆，超过刷新间隔后 fetch），
+用 git log 完成 path / author / since / until 过滤和分页，并附带每个提交的增删行数和变更文件，
+返回与 REST 查询相同的结构；克隆或查询失败时回退到 REST API
+
+配置（环境变量）:
+    GITHUB_GIT_BACKEND           设为 1 启用
+    GITHUB_GIT_DIR               裸克隆所在目录，默认 .cache/git
+    GITHUB_GIT_FETCH_INTERVAL    两次 fetch 之间的最短间隔（秒），默认 300
+    GITHUB_GIT_TIMEOUT           单次克隆或 fetch 的超时（秒），默认 300
+    GITHUB_GIT_SOURCES           逗号分隔的 "仓库ID或owner/repo=克隆地址或本地路径"，如 "123=/srv/repos/app"，
+                                 未列出的仓库通过 API 查询仓库信息后使用其 clone_url
+    GITHUB_GIT_URL_TEMPLATE      未列出的仓库的克隆地址模板，如 "git@github.com:{full_name}.git"
+私有仓库通过 github.com（或 GITHUB_API_BASE 所在主机）的 HTTPS 地址克隆时，使用 Token 池为该仓库路由的 Token
+（经环境变量传给 git，不写入仓库配置，也不出现在命令行中）；其他主机的地址不附带 Token。
+首次克隆最多等待几秒，未完成时本次查询回退到 REST API，克隆在后台继续；预取和预热不会触发克隆
+"""
+import asyncio
+import base64
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import get_env
+from ..deadline import remaining
+
+# git log 输出中的记录分隔符和字段分隔符
+_RECORD = "\x1e"
+_FIELD = "\x1f"
+_LOG_FORMAT = _FIELD.join(["%x1e%H", "%an", "%ae", "%aI", "%cn", "%ce", "%cI", "%B"]) + "%x1f"
+
+# --raw 输出的状态字母 -> GitHub 的文件状态
+_FILE_STATUS = {
+    "A": "added",
+    "D": "removed",
+    "M": "modified",
+    "R": "renamed",
+    "C": "copied",
+    "T": "changed"
+}
+
+# 每个 git 命令最多读取的输出大小（字节），防止超大提交耗尽内存
+_MAX_OUTPUT = 64 * 1024 * 1024
+
+# 已有克隆时最多等待 fetch 的时间（秒），超过后先用已有数据回答，fetch 在后台继续
+_FETCH_WAIT = 5.0
+# 首次克隆最多等待的时间（秒），超过后本次查询回退到 REST API（留出足够的时间），克隆在后台继续
+_CLONE_WAIT = 10.0
+
+# 正在进行的克隆或 fetch：裸克隆路径 -> 任务（同一事件循环上的并发查询共用）
+_syncing: Dict[str, asyncio.Task] = {}
+# 最近一次尝试 fetch 的时间（失败时也记录，网络不可用时不会每次查询都重试）
+_attempted: Dict[str, float] = {}
+# 收到 push 事件后需要立即 fetch 的裸克隆路径
+_stale: Set[str] = set()
+
+
+class GitBackendError(Exception):
+    """git 命令失败或仓库不可用"""
+
+
+def git_backend_enabled() -> bool:
+    """是否启用了本地 git 后端（需要设置 GITHUB_GIT_BACKEND 且系统中有 git）"""
+    if (get_env("GITHUB_GIT_BACKEND", "0") or "0").strip().lower() not in ("1", "true", "yes", "on"):
+        return False
+    # 延迟导入 shutil，避免增加 src.github 的导入耗时
+    import shutil
+
+    return shutil.which("git") is not None
+
+
+def parse_sources(value: Optional[str]) -> Dict[str, str]:
+    """
+    解析 GITHUB_GIT_SOURCES 配置
+
+    Args:
+        value: 配置值，如 "123=/srv/repos/app,owner/repo=https://example.com/repo.git"
+
+    Returns:
+        {仓库ID或小写的 owner/repo: 克隆地址}
+    """
+    sources = {}
+    for item in (value or "").split(","):
+        key, sep, source = item.partition("=")
+        if sep and key.strip() and source.strip():
+            sources[key.strip().lower()] = source.strip()
+    return sources
+
+
+def _token_hosts() -> Set[str]:
+    """可以附带 GitHub Token 的克隆地址主机：github.com 和 GITHUB_API_BASE 所在的主机（GitHub Enterprise）"""
+    from urllib.parse import urlsplit
+
+    from .server import get_api_base
+
+    hosts = {"github.com"}
+    api_host = (urlsplit(get_api_base()).hostname or "").lower()
+    if api_host:
+        hosts.add(api_host)
+        if api_host.startswith("api."):
+            hosts.add(api_host[len("api."):])
+    return hosts
+
+
+def _git_env(source: str, repo_id: int) -> Dict[str, str]:
+    """
+    git 子进程的环境变量：禁止交互式提示；克隆地址为 GitHub 的 HTTPS 地址时附带 Token
+
+    Token 使用 Token 池为该仓库路由的凭据（与 API 请求相同，私有仓库使用能访问它的 Token），
+    其他主机的地址（如 GITHUB_GIT_SOURCES 中的第三方地址）不附带 Token
+
+    Args:
+        source: 克隆地址或本地路径
+        repo_id: 仓库 ID
+
+    Returns:
+        环境变量字典
+    """
+    from urllib.parse import urlsplit
+
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    parts = urlsplit(source) if source.startswith("https://") else None
+    if parts is None or (parts.hostname or "").lower() not in _token_hosts():
+        return env
+
+    from .tokens import get_token_pool
+
+    # https://github.com/owner/repo.git 按 owner/repo 路由（所有者指定的 Token 优先），其他按仓库 ID
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if len(segments) >= 2:
+        name = segments[-1][:-len(".git")] if segments[-1].endswith(".git") else segments[-1]
+        route = f"/repos/{segments[-2]}/{name}"
+    else:
+        route = f"/repositories/{repo_id}"
+    credential = get_token_pool().route(route)
+    if credential is not None and credential.token:
+        credentials = base64.b64encode(f"x-access-token:{credential.token}".encode("utf-8")).decode("ascii")
+        env.update(
+            GIT_CONFIG_COUNT="1",
+            GIT_CONFIG_KEY_0="http.extraHeader",
+            GIT_CONFIG_VALUE_0=f"Authorization: Basic {credentials}"
+        )
+    return env
+
+
+async def _run_git(args: List[str], timeout: Optional[float], env: Optional[Dict[str, str]] = None) -> str:
+    """
+    执行 git 命令并返回标准输出
+
+    Raises:
+        GitBackendError: 命令失败或输出过大
+        asyncio.TimeoutError: 超时（子进程已结束）
+    """
+    process = await asyncio.create_subprocess_exec(
+        "git", *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        message = stderr.decode("utf-8", errors="replace").strip().splitlines()
+        raise GitBackendError(f"git {args[0]} 失败: {message[-1] if message else process.returncode}")
+    if len(stdout) > _MAX_OUTPUT:
+        raise GitBackendError("git 输出过大")
+    return stdout.decode("utf-8", errors="replace")
+
+
+class GitBackend:
+    """维护裸克隆并用 git log 查询提交"""
+
+    def __init__(self, root: Optional[str] = None, fetch_interval: Optional[float] = None, sync_timeout: Optional[float] = None):
+        """
+        初始化本地 git 后端
+
+        Args:
+            root: 裸克隆所在目录，默认读取 GITHUB_GIT_DIR，未设置时为 .cache/git
+            fetch_interval: 两次 fetch 之间的最短间隔（秒），默认读取 GITHUB_GIT_FETCH_INTERVAL（300）
+            sync_timeout: 单次克隆或 fetch 的超时（秒），默认读取 GITHUB_GIT_TIMEOUT（300）
+        """
+        self.root = root or get_env("GITHUB_GIT_DIR", os.path.join(".cache", "git"))
+        self.fetch_interval = fetch_interval if fetch_interval is not None else float(get_env("GITHUB_GIT_FETCH_INTERVAL", "300"))
+        self.sync_timeout = sync_timeout if sync_timeout is not None else float(get_env("GITHUB_GIT_TIMEOUT", "300"))
+
+    def clone_path(self, repo_id: int) -> str:
+        """仓库裸克隆的路径"""
+        return os.path.join(self.root, f"{repo_id}.git")
+
+    async def sync(self, repo_id: int, source: str) -> str:
+        """
+        确保裸克隆存在且不早于刷新间隔（首次克隆，之后按间隔 fetch）
+
+        克隆和 fetch 在后台任务中执行，不受调用方截止时间的影响：调用方放弃等待后，
+        克隆继续完成，之后的查询可以直接使用；首次克隆最多等待 _CLONE_WAIT 秒，
+        已有克隆时最多等待 fetch _FETCH_WAIT 秒，之后先使用已有数据
+
+        Args:
+            repo_id: 仓库 ID
+            source: 克隆地址或本地路径
+
+        Returns:
+            裸克隆路径
+
+        Raises:
+            GitBackendError: 克隆失败（已有克隆时 fetch 失败不报错，继续使用旧数据）
+            asyncio.TimeoutError: 首次克隆在等待时间内未完成（克隆在后台继续）
+        """
+        path = self.clone_path(repo_id)
+        cloned = os.path.isdir(path)
+        if cloned and path not in _stale and time.time() - max(self._fetched_at(path), _attempted.get(path, 0.0)) < self.fetch_interval:
+            return path
+        _stale.discard(path)
+        task = _syncing.get(path)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            _attempted[path] = time.time()
+            task = asyncio.get_running_loop().create_task(self._sync(path, source, repo_id))
+            _syncing[path] = task
+            task.add_done_callback(lambda done, path=path: _syncing.pop(path, None) if _syncing.get(path) is done else None)
+        wait = remaining()
+        if cloned:
+            wait = min(wait, _FETCH_WAIT) if wait is not None else _FETCH_WAIT
+        else:
+            # 至少留一半的剩余时间给 REST API 回退
+            wait = min(wait / 2, _CLONE_WAIT) if wait is not None else _CLONE_WAIT
+        try:
+            await asyncio.wait_for(asyncio.shield(task), wait)
+        except asyncio.TimeoutError:
+            if not cloned:
+                raise
+        return path
+
+    @staticmethod
+    def _fetched_at(path: str) -> float:
+        """最近一次克隆或 fetch 的时间"""
+        for name in ("FETCH_HEAD", "HEAD"):
+            try:
+                return os.path.getmtime(os.path.join(path, name))
+            except OSError:
+                continue
+        return 0.0
+
+    async def _sync(self, path: str, source: str, repo_id: int):
+        env = _git_env(source, repo_id)
+        if os.path.isdir(path):
+            try:
+                await _run_git(
+                    ["--git-dir", path, "fetch", "--prune", "--quiet", "origin",
+                     "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"],
+                    self.sync_timeout, env
+                )
+            except (GitBackendError, asyncio.TimeoutError):
+                # 网络不可用时继续使用已有的克隆，下次查询再尝试
+                pass
+            return
+        # 克隆到临时目录后改名，中途失败或多个进程同时克隆时不会留下不完整的仓库
+        import shutil
+
+        os.makedirs(self.root, exist_ok=True)
+        temporary = f"{path}.tmp-{os.urandom(4).hex()}"
+        try:
+            await _run_git(["clone", "--bare", "--quiet", source, temporary], self.sync_timeout, env)
+            try:
+                os.rename(temporary, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise GitBackendError(f"无法创建克隆目录 {path}")
+        except asyncio.TimeoutError:
+            raise GitBackendError(f"克隆超时（超过 {self.sync_timeout:.0f} 秒）")
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+    def mark_stale(self, repo_id: int):
+        """标记仓库的克隆已过期（如收到 push 事件），下次查询时立即 fetch"""
+        _stale.add(self.clone_path(repo_id))
+
+    async def list_commits(self, path: str, sha: Optional[str] = None, file_path: Optional[str] = None, author: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None, per_page: int = 30, page: int = 1) -> List[Dict]:
+        """
+        用 git log 查询提交（过滤和分页语义与 GitHub 提交列表接口一致）
+
+        Args:
+            path: 裸克隆路径
+            sha: 分支、标签或提交 SHA，默认为默认分支
+            file_path: 只返回包含指定路径的提交
+            author: 只返回作者名称或邮箱包含该字符串的提交（不区分大小写）
+            since: 只返回此日期之后的提交（ISO 8601 格式）
+            until: 只返回此日期之前的提交（ISO 8601 格式）
+            per_page: 每页返回数量，最大 100
+            page: 页码
+
+        Returns:
+            提交列表，每项的 message、author、committer、stats 和 files 与 REST 查询格式化后的结构相同
+            （url 和 html_url 由调用方填写）
+
+        Raises:
+            GitBackendError: git 命令失败（如分支不存在）
+        """
+        if sha and sha.startswith("-"):
+            raise GitBackendError(f"无效的分支或提交: {sha}")
+        per_page = max(1, min(100, per_page))
+        args = [
+            "--git-dir", path, "-c", "core.quotePath=false", "log", sha or "HEAD",
+            f"--format={_LOG_FORMAT}", "--raw", "--numstat", "-M", "--no-abbrev",
+            f"--skip={(max(1, page) - 1) * per_page}", f"--max-count={per_page}"
+        ]
+        if author:
+            args += ["--regexp-ignore-case", "--fixed-strings", f"--author={author}"]
+        if since:
+            args.append(f"--since={since}")
+        if until:
+            args.append(f"--until={until}")
+        args.append("--")
+        if file_path:
+            args.append(file_path)
+        output = await _run_git(args, remaining())
+        return [_parse_commit(record) for record in output.split(_RECORD) if record.strip()]
+
+
+def _parse_commit(record: str) -> Dict:
+    """解析 git log 输出中的一个提交（格式字段之后是 --raw 和 --numstat 的行）"""
+    fields = record.split(_FIELD)
+    sha, author_name, author_email, author_date, committer_name, committer_email, committer_date, message = fields[:8]
+    raw_entries: List[Tuple[str, str]] = []
+    numstat: List[Tuple[int, int]] = []
+    for line in _FIELD.join(fields[8:]).splitlines():
+        if line.startswith(":"):
+            # :100644 100644 <旧 blob> <新 blob> M\t路径（重命名和复制为 R100\t旧路径\t新路径）
+            meta, _, paths = line.partition("\t")
+            status = meta.split()[-1][:1]
+            raw_entries.append((_FILE_STATUS.get(status, "modified"), paths.split("\t")[-1]))
+        elif line.strip():
+            additions, deletions = line.split("\t", 2)[:2]
+            # 二进制文件显示为 "-"
+            numstat.append((int(additions) if additions.isdigit() else 0, int(deletions) if deletions.isdigit() else 0))
+
+    # --raw 和 --numstat 的行按相同的文件顺序输出
+    files = []
+    for index, (status, filename) in enumerate(raw_entries):
+        additions, deletions = numstat[index] if index < len(numstat) else (0, 0)
+        files.append({
+            "filename": filename,
+            "additions": additions,
+            "deletions": deletions,
+            "changes": additions + deletions,
+            "status": status
+        })
+    total_additions = sum(file["additions"] for file in files)
+    total_deletions = sum(file["deletions"] for file in files)
+    return {
+        "sha": sha.strip(),
+        "message": message.strip(),
+        "author": {"name": author_name, "email": author_email, "date": _to_utc(author_date)},
+        "committer": {"name": committer_name, "email": committer_email, "date": _to_utc(committer_date)},
+        "url": "",
+        "html_url": "",
+        "stats": {"additions": total_additions, "deletions": total_deletions, "total": total_additions + total_deletions},
+        "files": files
+    }
+
+
+def _to_utc(value: str) -> str:
+    """将 git 的 ISO 8601 时间（带时区偏移）转换为 GitHub 使用的 UTC 格式（如 2024-01-01T00:00:00Z）"""
+    from datetime import datetime, timezone
+
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    except ValueError:
+        return value
+
+
+_backend: Optional[GitBackend] = None
+
+
+def get_git_backend() -> GitBackend:
+    """
+    获取进程内共享的本地 git 后端（首次调用时按环境变量创建）
+
+    Returns:
+        GitBackend 实例
+    """
+    global _backend
+    if _backend is None:
+        _backend = GitBackend()
+    return _backend
@@ -0,0 +1,527 @@
+"""
+GitHub 数据本地镜像
+将已获取的 Pull Requests 和提交保存到 SQLite，并使用 FTS5 提供全文检索
+"""
+import re
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config import get_env
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pull_requests (
+    repo_id INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    state TEXT,
+    user_login TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    merged_at TEXT,
+    url TEXT,
+    PRIMARY KEY (repo_id, number)
+);
+CREATE TABLE IF NOT EXISTS commits (
+    repo_id INTEGER NOT NULL,
+    sha TEXT NOT NULL,
+    message TEXT NOT NULL DEFAULT '',
+    author_name TEXT,
+    author_email TEXT,
+    author_date TEXT,
+    committer_date TEXT,
+    url TEXT,
+    additions INTEGER,
+    deletions INTEGER,
+    PRIMARY KEY (repo_id, sha)
+);
+"""
+
+# 外部内容（external content）FTS5 表，通过触发器与基础表保持同步
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS pull_requests_fts USING fts5(
+    title, body, content='pull_requests', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS pull_requests_ai AFTER INSERT ON pull_requests BEGIN
+    INSERT INTO pull_requests_fts(rowid, title, body) VALUES (new.rowid, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS pull_requests_ad AFTER DELETE ON pull_requests BEGIN
+    INSERT INTO pull_requests_fts(pull_requests_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS pull_requests_au AFTER UPDATE ON pull_requests BEGIN
+    INSERT INTO pull_requests_fts(pull_requests_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body);
+    INSERT INTO pull_requests_fts(rowid, title, body) VALUES (new.rowid, new.title, new.body);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS commits_fts USING fts5(
+    message, content='commits', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS commits_ai AFTER INSERT ON commits BEGIN
+    INSERT INTO commits_fts(rowid, message) VALUES (new.rowid, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS commits_ad AFTER DELETE ON commits BEGIN
+    INSERT INTO commits_fts(commits_fts, rowid, message) VALUES ('delete', old.rowid, old.message);
+END;
+CREATE TRIGGER IF NOT EXISTS commits_au AFTER UPDATE ON commits BEGIN
+    INSERT INTO commits_fts(commits_fts, rowid, message) VALUES ('delete', old.rowid, old.message);
+    INSERT INTO commits_fts(rowid, message) VALUES (new.rowid, new.message);
+END;
+"""
+
+# 搜索词切分：保留字母、数字、下划线以及中文等 Unicode 文字
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class GitHubMirror:
+    """保存 Pull Requests 和提交的本地 SQLite 镜像，支持全文检索"""
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        初始化镜像数据库
+
+        Args:
+            path: SQLite 数据库路径，":memory:" 表示内存数据库
+        """
+        self.path = path
+        # 每个仓库的数据版本号，写入时递增，供列式缓存判断是否失效
+        self._versions: Dict[Optional[int], int] = {}
+        # 工具函数可能在不同线程的事件循环中执行，使用锁串行化数据库访问
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            # 当前 SQLite 未编译 FTS5，退化为 LIKE 查询
+            self.fts_enabled = False
+        self._conn.commit()
+
+    def record_pull_requests(self, repo_id: int, pull_requests: List[Dict]) -> int:
+        """
+        写入（或更新）一批已格式化的 Pull Requests
+
+        Args:
+            repo_id: 仓库 ID
+            pull_requests: get_pull_requests_by_repo_id 返回的 pull_requests 列表
+
+        Returns:
+            写入的记录数
+        """
+        rows = [
+            (
+                repo_id,
+                pr["number"],
+                pr.get("title") or "",
+                pr.get("body") or "",
+                pr.get("state"),
+                (pr.get("user") or {}).get("login"),
+                pr.get("created_at"),
+                pr.get("updated_at"),
+                pr.get("merged_at"),
+                pr.get("url"),
+            )
+            for pr in pull_requests
+        ]
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO pull_requests (repo_id, number, title, body, state, user_login, created_at, updated_at, merged_at, url)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repo_id, number) DO UPDATE SET
+                    title = excluded.title, body = excluded.body, state = excluded.state,
+                    user_login = excluded.user_login, created_at = excluded.created_at,
+                    updated_at = excluded.updated_at, merged_at = excluded.merged_at, url = excluded.url
+                """,
+                rows
+            )
+            self._conn.commit()
+            self._bump_version(repo_id)
+        return len(rows)
+
+    def record_commits(self, repo_id: int, commits: List[Dict]) -> int:
+        """
+        写入（或更新）一批已格式化的提交
+
+        Args:
+            repo_id: 仓库 ID
+            commits: get_commits_by_repo_id 返回的 commits 列表
+
+        Returns:
+            写入的记录数
+        """
+        rows = []
+        for commit in commits:
+            author = commit.get("author") or {}
+            committer = commit.get("committer") or {}
+            stats = commit.get("stats") or {}
+            rows.append((
+                repo_id,
+                commit["sha"],
+                commit.get("message") or "",
+                author.get("name"),
+                author.get("email"),
+                author.get("date"),
+                committer.get("date"),
+                commit.get("html_url") or commit.get("url"),
+                stats.get("additions"),
+                stats.get("deletions"),
+            ))
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO commits (repo_id, sha, message, author_name, author_email, author_date, committer_date, url, additions, deletions)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repo_id, sha) DO UPDATE SET
+                    message = excluded.message, author_name = excluded.author_name,
+                    author_email = excluded.author_email, author_date = excluded.author_date,
+                    committer_date = excluded.committer_date, url = excluded.url,
+                    additions = COALESCE(excluded.additions, commits.additions),
+                    deletions = COALESCE(excluded.deletions, commits.deletions)
+                """,
+                rows
+            )
+            self._conn.commit()
+            self._bump_version(repo_id)
+        return len(rows)
+
+    def delete_repository(self, repo_id: int) -> int:
+        """
+        删除仓库的全部 PR 和提交（仓库被删除或转为私有时）
+
+        Args:
+            repo_id: 仓库 ID
+
+        Returns:
+            删除的记录数
+        """
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM pull_requests WHERE repo_id = ?", (repo_id,)).rowcount
+            deleted += self._conn.execute("DELETE FROM commits WHERE repo_id = ?", (repo_id,)).rowcount
+            self._conn.commit()
+            self._bump_version(repo_id)
+        return deleted
+
+    def _bump_version(self, repo_id: int):
+        """递增仓库及全局的数据版本号（调用方需持有锁）"""
+        self._versions[repo_id] = self._versions.get(repo_id, 0) + 1
+        self._versions[None] = self._versions.get(None, 0) + 1
+
+    def version(self, repo_id: Optional[int] = None) -> int:
+        """
+        获取数据版本号
+
+        Args:
+            repo_id: 仓库 ID，不提供时返回全局版本号
+
+        Returns:
+            版本号，数据每次写入后递增
+        """
+        return self._versions.get(repo_id, 0)
+
+    def count(self, repo_id: Optional[int] = None) -> Dict[str, int]:
+        """
+        统计镜像中的记录数
+
+        Args:
+            repo_id: 可选的仓库 ID，不提供时统计全部仓库
+
+        Returns:
+            {"pull_requests": int, "commits": int}
+        """
+        where, params = ("WHERE repo_id = ?", (repo_id,)) if repo_id is not None else ("", ())
+        with self._lock:
+            prs = self._conn.execute(f"SELECT COUNT(*) FROM pull_requests {where}", params).fetchone()[0]
+            commits = self._conn.execute(f"SELECT COUNT(*) FROM commits {where}", params).fetchone()[0]
+        return {"pull_requests": prs, "commits": commits}
+
+    def columns(self, table: str, fields: List[str], repo_id: Optional[int] = None, epoch_fields: Tuple[str, ...] = ()) -> Dict[str, list]:
+        """
+        按列读取镜像数据（供分析模块构建列式数组）
+
+        Args:
+            table: 表名，可选值: pull_requests, commits
+            fields: 列名列表
+            repo_id: 可选的仓库 ID 过滤
+            epoch_fields: 需要在 SQLite 中直接转换为 Unix 时间戳（秒）的时间列
+
+        Returns:
+            列名到值列表的字典
+        """
+        if table not in ("pull_requests", "commits"):
+            raise ValueError(f"未知的镜像表: {table}")
+        # 时间解析交给 SQLite 的 strftime 完成，支持 Z 和 +08:00 等时区后缀
+        selected = [
+            f"CAST(strftime('%s', {field}) AS INTEGER)" if field in epoch_fields else field
+            for field in fields
+        ]
+        where, params = ("WHERE repo_id = ?", (repo_id,)) if repo_id is not None else ("", ())
+        with self._lock:
+            # 使用普通元组行，避免为每行构造 sqlite3.Row
+            cursor = self._conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(f"SELECT {', '.join(selected)} FROM {table} {where}", params).fetchall()
+        # 行转列：zip(*rows) 在 C 层完成转置
+        transposed = list(zip(*rows)) if rows else [()] * len(fields)
+        return {field: list(values) for field, values in zip(fields, transposed)}
+
+    def search(self, query: str, repo_id: Optional[int] = None, kind: str = "all", limit: int = 10) -> List[Dict]:
+        """
+        全文检索提交消息和 PR 标题/正文
+
+        Args:
+            query: 搜索关键词（空格分隔，全部命中优先，无结果时退化为任意命中）
+            repo_id: 可选的仓库 ID 过滤
+            kind: 检索范围，可选值: all, pull_request, commit
+            limit: 返回结果数量上限
+
+        Returns:
+            按相关度排序的结果列表，每项包含 kind、repo_id、ref、title、snippet、score 等字段
+        """
+        tokens = _TOKEN_PATTERN.findall(query)
+        if not tokens:
+            return []
+
+        results = self._search(tokens, " ", repo_id, kind, limit)
+        if not results and len(tokens) > 1:
+            results = self._search(tokens, " OR ", repo_id, kind, limit)
+        return results
+
+    def _search(self, tokens: List[str], joiner: str, repo_id: Optional[int], kind: str, limit: int) -> List[Dict]:
+        """执行一次检索并合并 PR 与提交的结果"""
+        results: List[Dict] = []
+        with self._lock:
+            if kind in ("all", "pull_request"):
+                results.extend(self._search_pull_requests(tokens, joiner, repo_id, limit))
+            if kind in ("all", "commit"):
+                results.extend(self._search_commits(tokens, joiner, repo_id, limit))
+        # bm25 分数越小越相关
+        results.sort(key=lambda item: item["score"])
+        return results[:limit]
+
+    def _search_pull_requests(self, tokens: List[str], joiner: str, repo_id: Optional[int], limit: int) -> List[Dict]:
+        repo_filter = "AND p.repo_id = ?" if repo_id is not None else ""
+        if self.fts_enabled:
+            sql = f"""
+                SELECT p.repo_id, p.number, p.title, p.state, p.user_login, p.created_at, p.url,
+                       snippet(pull_requests_fts, -1, '[', ']', '…', 16) AS snippet,
+                       bm25(pull_requests_fts, 5.0, 1.0) AS score
+                FROM pull_requests_fts JOIN pull_requests p ON p.rowid = pull_requests_fts.rowid
+                WHERE pull_requests_fts MATCH ? {repo_filter}
+                ORDER BY score LIMIT ?
+            """
+            params: list = [_fts_query(tokens, joiner)]
+        else:
+            clause = (" AND " if joiner == " " else " OR ").join(["(p.title || ' ' || p.body) LIKE ?"] * len(tokens))
+            sql = f"""
+                SELECT p.repo_id, p.number, p.title, p.state, p.user_login, p.created_at, p.url,
+                       substr(p.title || ' ' || p.body, 1, 120) AS snippet, 0.0 AS score
+                FROM pull_requests p WHERE ({clause}) {repo_filter}
+                ORDER BY p.created_at DESC LIMIT ?
+            """
+            params = [f"%{token}%" for token in tokens]
+        if repo_id is not None:
+            params.append(repo_id)
+        params.append(limit)
+        return [
+            {
+                "kind": "pull_request",
+                "repo_id": row["repo_id"],
+                "ref": f"#{row['number']}",
+                "number": row["number"],
+                "title": row["title"],
+                "state": row["state"],
+                "author": row["user_login"],
+                "date": row["created_at"],
+                "url": row["url"],
+                "snippet": row["snippet"],
+                "score": row["score"]
+            }
+            for row in self._conn.execute(sql, params)
+        ]
+
+    def _search_commits(self, tokens: List[str], joiner: str, repo_id: Optional[int], limit: int) -> List[Dict]:
+        repo_filter = "AND c.repo_id = ?" if repo_id is not None else ""
+        if self.fts_enabled:
+            sql = f"""
+                SELECT c.repo_id, c.sha, c.message, c.author_name, c.author_date, c.url,
+                       snippet(commits_fts, 0, '[', ']', '…', 16) AS snippet,
+                       bm25(commits_fts) AS score
+                FROM commits_fts JOIN commits c ON c.rowid = commits_fts.rowid
+                WHERE commits_fts MATCH ? {repo_filter}
+                ORDER BY score LIMIT ?
+            """
+            params: list = [_fts_query(tokens, joiner)]
+        else:
+            clause = (" AND " if joiner == " " else " OR ").join(["c.message LIKE ?"] * len(tokens))
+            sql = f"""
+                SELECT c.repo_id, c.sha, c.message, c.author_name, c.author_date, c.url,
+                       substr(c.message, 1, 120) AS snippet, 0.0 AS score
+                FROM commits c WHERE ({clause}) {repo_filter}
+                ORDER BY c.author_date DESC LIMIT ?
+            """
+            params = [f"%{token}%" for token in tokens]
+        if repo_id is not None:
+            params.append(repo_id)
+        params.append(limit)
+        return [
+            {
+                "kind": "commit",
+                "repo_id": row["repo_id"],
+                "ref": row["sha"][:7],
+                "sha": row["sha"],
+                "title": row["message"].split("\n")[0],
+                "author": row["author_name"],
+                "date": row["author_date"],
+                "url": row["url"],
+                "snippet": row["snippet"],
+                "score": row["score"]
+            }
+            for row in self._conn.execute(sql, params)
+        ]
+
+
+def _fts_query(tokens: List[str], joiner: str) -> str:
+    """将关键词转换为 FTS5 查询表达式（每个词加引号，避免被解析为运算符）"""
+    return joiner.join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+_mirror: Optional[GitHubMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> GitHubMirror:
+    """
+    获取全局镜像实例（首次调用时创建）
+
+    Returns:
+        GitHubMirror 实例
+    """
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                # 镜像数据库路径，默认使用内存数据库（进程退出后丢失）
+                _mirror = GitHubMirror(get_env("GITHUB_MIRROR_PATH", ":memory:"))
+    return _mirror
+
+
+async def search_commits_and_pull_requests(query: str, repo_id: Optional[int] = None, kind: str = "all", limit: int = 10, sync_pages: int = 0, on_page: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
+    """
+    在本地镜像中全文检索提交消息和 PR 标题/正文
+
+    镜像数据来自此前 get_pull_requests_by_repo_id / get_commits_by_repo_id 的查询结果；
+    指定 repo_id 和 sync_pages 时会先从 GitHub 拉取若干页数据写入镜像再检索。
+
+    Args:
+        query: 搜索关键词
+        repo_id: 可选的仓库 ID 过滤
+        kind: 检索范围，可选值: all, pull_request, commit，默认 all
+        limit: 返回结果数量上限，默认 10
+        sync_pages: 检索前同步的页数（每页 100 条），默认 0 表示不同步
+        on_page: 可选的异步回调，同步时每个页请求完成时调用（见 sync_repository）
+
+    Returns:
+        包含检索结果和状态的字典:
+        {
+            "success": bool,
+            "data": {
+                "query": str,
+                "repository_id": int,
+                "indexed": dict,    # 镜像中的 PR / 提交数量
+                "total": int,
+                "results": list     # 按相关度排序的结果
+            },
+            "error": str,
+            "status_code": int
+        }
+    """
+    if kind not in ("all", "pull_request", "commit"):
+        return {
+            "success": False,
+            "error": f"不支持的检索范围: {kind}",
+            "status_code": 400,
+            "data": None
+        }
+
+    if sync_pages and repo_id is not None:
+        sync_result = await sync_repository(repo_id, pages=sync_pages, on_page=on_page)
+        if not sync_result["success"]:
+            return sync_result
+
+    mirror = get_mirror()
+    results = mirror.search(query, repo_id=repo_id, kind=kind, limit=limit)
+    return {
+        "success": True,
+        "data": {
+            "query": query,
+            "repository_id": repo_id,
+            "indexed": mirror.count(repo_id),
+            "total": len(results),
+            "results": results
+        },
+        "error": None,
+        "status_code": 200
+    }
+
+
+async def sync_repository(repo_id: int, pages: int = 1, on_page: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
+    """
+    从 GitHub 拉取仓库的 PR（全部状态）和提交写入镜像
+
+    Args:
+        repo_id: 仓库 ID
+        pages: 每类数据拉取的页数（每页 100 条）
+        on_page: 可选的异步回调，每个页请求完成时调用（用于推送进度），参数为
+            {"kind": "pull_requests" 或 "commits", "page": int, "success": bool, "total": int, "error": str}
+
+    Returns:
+        包含同步数量和状态的字典
+    """
+    import asyncio
+    from .server import get_pull_requests_by_repo_id, get_commits_by_repo_id
+
+    async def fetch(kind: str, page: int) -> Tuple[str, int, Dict]:
+        if kind == "pull_requests":
+            result = await get_pull_requests_by_repo_id(repo_id, state="all", per_page=100, page=page, sort="updated")
+        else:
+            result = await get_commits_by_repo_id(repo_id, per_page=100, page=page)
+        return kind, page, result
+
+    # 查询函数成功后会自动写入镜像，这里只需并发拉取，按完成顺序推送进度
+    tasks = [
+        asyncio.ensure_future(fetch(kind, page))
+        for page in range(1, pages + 1)
+        for kind in ("pull_requests", "commits")
+    ]
+    results = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            kind, page, result = await next_done
+            results.append(result)
+            if on_page is not None:
+                await on_page({
+                    "kind": kind,
+                    "page": page,
+                    "success": result["success"],
+                    "total": result["data"]["total"] if result["success"] else 0,
+                    "error": result.get("error")
+                })
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    failed = [result for result in results if not result["success"]]
+    if failed and len(failed) == len(results):
+        return failed[0]
+
+    return {
+        "success": True,
+        "data": {
+            "repository_id": repo_id,
+            "indexed": get_mirror().count(repo_id)
+        },
+        "error": None,
+        "status_code": 200
+    }
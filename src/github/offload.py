@@ -0,0 +1,149 @@
+"""
+CPU 密集型后处理的进程池卸载
+大响应的 JSON 解析和 PR 变更文件整理等纯 CPU 工作如果在事件循环线程上执行，会阻塞同一循环上的其他并发请求。
+负载超过阈值时，原始字节写入共享内存交给进程池处理（不经过 pickle 传递请求数据），只把处理结果传回；
+负载较小、进程池被禁用或不可用时在当前线程直接执行
+
+工作进程数由环境变量 GITHUB_OFFLOAD_WORKERS 配置（0 表示禁用），
+阈值由 GITHUB_OFFLOAD_THRESHOLD 配置（字节），进程池在第一次需要时创建
+"""
+import asyncio
+import json
+import os
+import threading
+from functools import partial
+from typing import Any, Callable
+
+from ..config import get_env
+
+# 超过该大小（字节）的负载才交给进程池，更小的负载传递开销大于解析本身
+DEFAULT_THRESHOLD = 128 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _default_workers() -> int:
+    """默认工作进程数：最多 2 个，并为事件循环所在进程保留一个 CPU"""
+    return max(0, min(2, (os.cpu_count() or 1) - 1))
+
+
+def get_offload_pool():
+    """
+    获取进程内共享的进程池（首次调用时按 GITHUB_OFFLOAD_WORKERS 创建）
+
+    Returns:
+        ProcessPoolExecutor 实例，工作进程数为 0 时返回 None
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = int(get_env("GITHUB_OFFLOAD_WORKERS", str(_default_workers())))
+                if workers <= 0:
+                    return None
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # 父进程中有后台事件循环线程，使用 spawn 避免 fork 复制锁状态
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_offload_pool():
+    """关闭进程池（下次需要时按当前环境变量重新创建）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _attach(name: str):
+    """在工作进程中打开共享内存块（Python 3.13+ 不向资源跟踪器登记，由父进程负责释放）"""
+    from multiprocessing import shared_memory
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _run_shared(func: Callable[..., Any], name: str, size: int, args: tuple) -> Any:
+    """工作进程入口：从共享内存读取负载后调用 func"""
+    block = _attach(name)
+    try:
+        payload = bytes(block.buf[:size])
+    finally:
+        block.close()
+    return func(payload, *args)
+
+
+async def run_offloaded(func: Callable[..., Any], payload: bytes, *args) -> Any:
+    """
+    在进程池中执行 func(payload, *args)，负载较小或进程池不可用时在当前线程执行
+
+    Args:
+        func: 模块级函数（需要可被工作进程导入），第一个参数为负载字节
+        payload: 原始字节（如 HTTP 响应体）
+        *args: 其余参数（需要可 pickle）
+
+    Returns:
+        func 的返回值
+    """
+    threshold = int(get_env("GITHUB_OFFLOAD_THRESHOLD", str(DEFAULT_THRESHOLD)))
+    pool = get_offload_pool() if len(payload) >= threshold else None
+    if pool is None:
+        return func(payload, *args)
+
+    from concurrent.futures.process import BrokenProcessPool
+    from multiprocessing import shared_memory
+
+    try:
+        block = shared_memory.SharedMemory(create=True, size=len(payload))
+    except OSError:
+        return func(payload, *args)
+    try:
+        block.buf[:len(payload)] = payload
+        future = pool.submit(_run_shared, func, block.name, len(payload), args)
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        # 工作进程异常退出：丢弃进程池（下次重新创建），本次在当前线程执行
+        shutdown_offload_pool()
+        return func(payload, *args)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def decode_json(payload: bytes) -> Any:
+    """解析 JSON 响应体（空响应体返回 None）"""
+    return json.loads(payload) if payload else None
+
+
+def decode_pr_files(payload: bytes, include_patch: bool = True) -> list:
+    """解析 PR 变更文件列表的响应体并转换为统一格式（不保留补丁时补丁不会传回父进程）"""
+    from .server import _format_pr_file
+
+    return [_format_pr_file(file, include_patch) for file in json.loads(payload)]
+
+
+def pr_files_decoder(include_patch: bool = True) -> Callable[[bytes], list]:
+    """
+    生成 PR 变更文件页的解码函数（供 github_api_request 的 decoder 参数使用）
+
+    Args:
+        include_patch: 是否保留补丁内容
+
+    Returns:
+        可 pickle 的解码函数
+    """
+    return partial(decode_pr_files, include_patch=include_patch)
+
+
+def decoder_tag(decoder: Callable[..., Any]) -> str:
+    """解码函数的标识（不同解码函数的结果分别缓存）"""
+    if isinstance(decoder, partial):
+        options = ",".join(f"{key}={value}" for key, value in sorted(decoder.keywords.items()))
+        return f"{decoder.func.__name__}({options})"
+    return decoder.__name__
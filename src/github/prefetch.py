@@ -0,0 +1,187 @@
+"""
+GitHub 请求预取
+工具调用返回仓库 ID 或 PR 列表后，在后台以低并发提前发起最可能的下一步请求
+（搜索仓库 -> PR 列表 / 提交历史，PR 列表 -> PR 变更文件的第 1 页），结果写入响应缓存，
+模型的下一次工具调用通常可以直接命中缓存；请求预算不足时自动停止预取
+"""
+import asyncio
+import contextvars
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config import get_env
+from .cache import get_response_cache, prefetching
+from .offload import pr_files_decoder
+from .server import (
+    PR_FILES_PER_PAGE,
+    github_api_request,
+    get_rate_limit,
+    get_pull_requests_by_repo_id,
+    get_commits_by_repo_id
+)
+
+
+def rate_limit_allows(min_remaining: int = 50, min_remaining_ratio: float = 0.2) -> bool:
+    """
+    速率限制剩余请求数是否足够发起后台请求（尚未观察到速率限制时允许）
+
+    Args:
+        min_remaining: 剩余请求数低于该值时不允许
+        min_remaining_ratio: 剩余请求数低于限额的该比例时不允许
+
+    Returns:
+        是否允许
+    """
+    rate_limit = get_rate_limit()
+    remaining, limit = rate_limit["remaining"], rate_limit["limit"]
+    if remaining is None:
+        return True
+    return remaining > max(min_remaining, (limit or 0) * min_remaining_ratio)
+
+
+async def _pull_request_files_first_page(repo_id: int, pr_number: int) -> Dict:
+    """
+    预取 PR 变更文件的第 1 页（与 iter_pull_request_files 默认参数下的第一个请求相同，缓存键一致）
+
+    大部分 PR 只有一页，大 PR 的其余页不预取，避免每个 PR 列表触发数十个请求
+    """
+    return await github_api_request(
+        f"/repositories/{repo_id}/pulls/{pr_number}/files",
+        params={"per_page": PR_FILES_PER_PAGE, "page": 1},
+        decoder=pr_files_decoder(True)
+    )
+
+
+class Prefetcher:
+    """根据工具调用结果预取后续请求"""
+
+    def __init__(self, max_concurrency: int = 2, max_pr_files: int = 3, min_remaining: int = 50, min_remaining_ratio: float = 0.2):
+        """
+        初始化预取器
+
+        Args:
+            max_concurrency: 同时进行的预取请求数上限（保持低优先级，不挤占正常请求）
+            max_pr_files: 返回 PR 列表后预取前几个 PR 的变更文件（只预取第 1 页）
+            min_remaining: 速率限制剩余请求数低于该值时停止预取
+            min_remaining_ratio: 剩余请求数低于限额的该比例时停止预取
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pr_files = max_pr_files
+        self.min_remaining = min_remaining
+        self.min_remaining_ratio = min_remaining_ratio
+        # 事件循环 -> 该循环上的并发信号量（循环被回收后条目自动删除，id 不会被新循环复用）
+        self._semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "completed": 0, "failed": 0, "skipped_budget": 0}
+
+    def _plan(self, tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any]) -> List[Tuple[Callable[..., Awaitable[Dict]], Dict[str, Any]]]:
+        """根据工具名称和结果生成预取请求列表 [(函数, 参数)]"""
+        data = result.get("data") or {}
+        if tool_name == "search_repository_by_url":
+            repositories = data.get("repositories") or []
+            if not repositories:
+                return []
+            repo_id = repositories[0]["id"]
+            return [
+                (get_pull_requests_by_repo_id, {"repo_id": repo_id}),
+                (get_commits_by_repo_id, {"repo_id": repo_id})
+            ]
+        if tool_name == "get_pull_requests_by_repo_id":
+            repo_id = data.get("repository_id")
+            return [
+                (_pull_request_files_first_page, {"repo_id": repo_id, "pr_number": pr["number"]})
+                for pr in (data.get("pull_requests") or [])[:self.max_pr_files]
+            ]
+        return []
+
+    def _within_budget(self) -> bool:
+        """速率限制剩余请求数是否足够预取"""
+        return rate_limit_allows(self.min_remaining, self.min_remaining_ratio)
+
+    def schedule(self, tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any]) -> int:
+        """
+        根据一次成功的工具调用结果安排预取（需要在事件循环中调用，不等待预取完成）
+
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            result: 工具返回结果
+
+        Returns:
+            安排的预取请求数
+        """
+        if not result.get("success") or not get_response_cache().enabled:
+            return 0
+        plan = self._plan(tool_name, arguments, result)
+        if not plan:
+            return 0
+        if not self._within_budget():
+            self._count("skipped_budget", len(plan))
+            return 0
+
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        for func, kwargs in plan:
+            # 使用全新的上下文，预取不继承本轮对话的截止时间
+            task = loop.create_task(self._run(semaphore, func, kwargs), context=contextvars.Context())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._count("scheduled", len(plan))
+        return len(plan)
+
+    async def _run(self, semaphore: asyncio.Semaphore, func: Callable[..., Awaitable[Dict]], kwargs: Dict[str, Any]):
+        """执行单个预取请求（标记为预取，失败不影响正常请求）"""
+        prefetching.set(True)
+        # 让出一次事件循环，优先处理正在等待的正常请求
+        await asyncio.sleep(0)
+        async with semaphore:
+            if not self._within_budget():
+                self._count("skipped_budget")
+                return
+            try:
+                result = await func(**kwargs)
+            except Exception:
+                self._count("failed")
+                return
+        self._count("completed" if result.get("success") else "failed")
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        预取统计
+
+        Returns:
+            {"scheduled", "completed", "failed", "skipped_budget",
+             "hits": 被正常请求使用的预取结果数, "wasted": 过期或淘汰前未被使用的预取结果数}
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        cache_stats = get_response_cache().stats()
+        stats["hits"] = cache_stats["prefetch_hits"]
+        stats["wasted"] = cache_stats["prefetch_wasted"]
+        return stats
+
+
+_prefetcher: Optional[Prefetcher] = None
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """
+    获取进程内共享的预取器（环境变量 GITHUB_PREFETCH=0 时禁用，返回 None）
+
+    Returns:
+        Prefetcher 实例或 None
+    """
+    global _prefetcher
+    if get_env("GITHUB_PREFETCH", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    if _prefetcher is None:
+        _prefetcher = Prefetcher()
+    return _prefetcher
@@ -0,0 +1,178 @@
+"""
+后台事件循环与同步调用封装
+在独立线程中运行一个长生命周期的事件循环，同步代码通过线程安全的方式提交协程，
+事件循环上的连接池 session 在多次调用之间保持复用
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Coroutine, Dict, Optional
+
+from . import server
+
+
+class BackgroundLoop:
+    """在后台守护线程中运行的事件循环"""
+
+    def __init__(self, name: str = "github-loop"):
+        """
+        初始化后台事件循环（调用 start 后才会启动线程）
+
+        Args:
+            name: 后台线程名称
+        """
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """后台事件循环（未启动时为 None）"""
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        """后台事件循环是否正在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "BackgroundLoop":
+        """
+        启动后台线程和事件循环（重复调用无副作用）
+
+        Returns:
+            自身，便于链式调用
+        """
+        if self.running:
+            return self
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        """后台线程入口：运行事件循环直到 close 被调用，然后清理连接池"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        server.enable_session_pool(loop)
+        loop.call_soon(self._ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            try:
+                # 取消残留任务（如后台预取），再关闭复用的 session
+                pending = [task for task in asyncio.all_tasks(loop) if not task.done()]
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.run_until_complete(server.close_session_pool())
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                loop.close()
+                self._loop = None
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        线程安全地提交协程到后台事件循环
+
+        Args:
+            coro: 要执行的协程
+
+        Returns:
+            concurrent.futures.Future，可在任意线程等待结果
+        """
+        if not self.running:
+            self.start()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("不能在后台事件循环线程内同步等待协程，请直接 await")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        提交协程并阻塞等待结果
+
+        Args:
+            coro: 要执行的协程
+            timeout: 最长等待秒数，超时会取消协程并抛出 TimeoutError
+
+        Returns:
+            协程的返回值
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"协程执行超过 {timeout} 秒，已取消")
+
+    def close(self, timeout: float = 5.0):
+        """
+        停止事件循环并等待后台线程退出
+
+        Args:
+            timeout: 等待线程退出的最长秒数
+        """
+        if not self.running:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+
+class SyncGitHubClient:
+    """GitHub 异步查询函数的同步封装，所有调用在同一个后台事件循环上执行"""
+
+    def __init__(self, loop: Optional[BackgroundLoop] = None):
+        """
+        初始化同步客户端
+
+        Args:
+            loop: 可选的共享后台事件循环，不提供时创建并独占一个
+        """
+        self._owns_loop = loop is None
+        self.loop = loop or BackgroundLoop()
+        self.loop.start()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        在后台事件循环上执行任意协程（如 github_tools.call_tool）
+
+        Args:
+            coro: 要执行的协程
+            timeout: 最长等待秒数
+
+        Returns:
+            协程的返回值
+        """
+        return self.loop.run(coro, timeout=timeout)
+
+    def search_repository_by_url(self, *args, **kwargs) -> Dict:
+        """同步版 search_repository_by_url"""
+        return self.run(server.search_repository_by_url(*args, **kwargs))
+
+    def get_pull_requests_by_repo_id(self, *args, **kwargs) -> Dict:
+        """同步版 get_pull_requests_by_repo_id"""
+        return self.run(server.get_pull_requests_by_repo_id(*args, **kwargs))
+
+    def get_pull_request_files_by_repo_id(self, *args, **kwargs) -> Dict:
+        """同步版 get_pull_request_files_by_repo_id"""
+        return self.run(server.get_pull_request_files_by_repo_id(*args, **kwargs))
+
+    def get_commits_by_repo_id(self, *args, **kwargs) -> Dict:
+        """同步版 get_commits_by_repo_id"""
+        return self.run(server.get_commits_by_repo_id(*args, **kwargs))
+
+    def close(self):
+        """关闭客户端（只关闭自己创建的后台事件循环）"""
+        if self._owns_loop:
+            self.loop.close()
+
+    def __enter__(self) -> "SyncGitHubClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
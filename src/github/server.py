@@ -1,62 +1,156 @@
 """
 GitHub API 客户端（异步版本）
 提供 GitHub API 请求功能
-使用 aiohttp 进行异步 HTTP 请求
+通过可替换的 HTTP 传输层发送请求（默认 aiohttp，可选 HTTP/2，见 transport.py；首次请求时才导入 HTTP 客户端，缩短冷启动时间）
 """
-import os
-from typing import Dict, Optional
-from dotenv import load_dotenv
-import aiohttp
+import asyncio
+import re
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from ..config import get_env
+from ..deadline import remaining
+from .mirror import get_mirror
+from .cache import get_response_cache, make_identity, make_key, prefetching
+from .git_backend import git_backend_enabled
+from .offload import decode_json, decoder_tag, pr_files_decoder, run_offloaded
+from .tokens import Credential, get_token_pool, parse_tokens
+from .transport import TransportError, accept_encoding, create_transport
 
-# 加载环境变量
-load_dotenv()
-
-# GitHub API 基础 URL
+# GitHub API 基础 URL（默认值，可通过环境变量 GITHUB_API_BASE 指向 GitHub Enterprise 或本地桩服务）
 GITHUB_API_BASE = "https://api.github.com"
 
-# 从环境变量获取 GitHub Token（可选，但可以提高 API 限制）
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# PR 变更文件接口每页最多 100 个文件，GitHub 最多列出 3000 个文件
+PR_FILES_PER_PAGE = 100
+PR_FILES_LIMIT = 3000
+# 默认最多返回的变更文件数（统计数据仍包含全部文件），避免超大 PR 的全部补丁同时留在内存中
+PR_FILES_DEFAULT_MAX = 300
+
+# 单个请求的默认超时（秒），可通过环境变量 GITHUB_TIMEOUT 配置；存在更早的截止时间时以截止时间为准
+DEFAULT_TIMEOUT = 30
+
+
+def get_github_token() -> Optional[str]:
+    """从环境变量获取 GitHub Token（可选，但可以提高 API 限制；只配置了 GITHUB_TOKENS 时返回其中第一个）"""
+    token = get_env("GITHUB_TOKEN")
+    if token:
+        return token
+    tokens = parse_tokens(get_env("GITHUB_TOKENS"))
+    return tokens[0][0] if tokens else None
+
+
+def get_github_username() -> Optional[str]:
+    """从环境变量获取 GitHub Username（可选，会添加到请求头中）"""
+    return get_env("GITHUB_USERNAME")
+
 
-# 从环境变量获取 GitHub Username（可选，会添加到请求头中）
-GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")
+def get_api_base() -> str:
+    """从环境变量获取 GitHub API 基础 URL，未设置时使用 https://api.github.com"""
+    return get_env("GITHUB_API_BASE", GITHUB_API_BASE).rstrip("/")
 
 
-def get_headers(username: Optional[str] = None) -> Dict[str, str]:
+def __getattr__(name: str):
+    # 兼容旧代码中的 server.GITHUB_TOKEN / server.GITHUB_USERNAME 模块属性
+    if name == "GITHUB_TOKEN":
+        return get_github_token()
+    if name == "GITHUB_USERNAME":
+        return get_github_username()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_headers(username: Optional[str] = None, token: Optional[str] = None) -> Dict[str, str]:
     """
     获取请求头，包含认证信息和用户名
     
     Args:
         username: 可选的 GitHub 用户名，如果不提供则从环境变量 GITHUB_USERNAME 读取
+        token: 可选的 GitHub Token（由 Token 池选择），如果不提供则从环境变量读取
     
     Returns:
         包含请求头的字典
     """
     headers = {
         "Accept": "application/vnd.github.v3+json",
+        "Accept-Encoding": accept_encoding(),
         "User-Agent": "GitHub-API-Client"
     }
     
     # 添加认证 Token
-    if GITHUB_TOKEN:
-        headers["Authorization"] = f"token {GITHUB_TOKEN}"
+    token = token or get_github_token()
+    if token:
+        headers["Authorization"] = f"token {token}"
     
     # 添加用户名到请求头（优先使用传入的 username，其次使用环境变量）
-    final_username = username or GITHUB_USERNAME
+    final_username = username or get_github_username()
     if final_username:
         headers["X-GitHub-Username"] = final_username
     
     return headers
 
 
-async def github_api_request(url: str, params: Optional[Dict] = None, method: str = "GET", username: Optional[str] = None) -> Dict:
+def get_rate_limit() -> Dict[str, Optional[int]]:
+    """
+    获取 Token 池合计的 GitHub API 速率限制（core 类别），供预取等后台任务控制请求预算
+    
+    Returns:
+        {"limit": int, "remaining": int, "reset": int}，尚未发出请求时各项为 None
+    """
+    return get_token_pool().rate_limit("core")
+
+
+# 启用了连接池的事件循环 -> 复用的传输（尚未创建时为 None）
+_session_pool: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def enable_session_pool(loop: Optional[asyncio.AbstractEventLoop] = None):
     """
-    通用的 GitHub API 异步请求函数（使用 aiohttp）
+    为长生命周期的事件循环启用传输复用（保持连接和 TLS 会话，HTTP/2 传输在同一个连接上多路复用）
+    
+    调用方负责在事件循环结束前调用 close_session_pool 关闭传输
+    
+    Args:
+        loop: 事件循环，不提供时使用当前正在运行的事件循环
+    """
+    loop = loop or asyncio.get_running_loop()
+    _session_pool.setdefault(loop, None)
+
+
+async def close_session_pool():
+    """关闭当前事件循环上复用的传输，并取消该循环的连接池登记"""
+    transport = _session_pool.pop(asyncio.get_running_loop(), None)
+    if transport is not None and not transport.closed:
+        await transport.close()
+
+
+def _acquire_transport():
+    """
+    获取用于本次请求的传输（按 GITHUB_HTTP_TRANSPORT 创建）
+    
+    Returns:
+        (transport, owned)：owned 为 True 表示传输为本次请求临时创建，用完需关闭
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _session_pool:
+        return create_transport(get_api_base()), True
+    transport = _session_pool[loop]
+    if transport is None or transport.closed:
+        transport = create_transport(get_api_base())
+        _session_pool[loop] = transport
+    return transport, False
+
+
+async def github_api_request(url: str, params: Optional[Dict] = None, method: str = "GET", username: Optional[str] = None, use_cache: bool = True, decoder: Optional[Callable[[bytes], Any]] = None) -> Dict:
+    """
+    通用的 GitHub API 异步请求函数（通过 HTTP 传输层发送）
     
     Args:
         url: 请求的 URL（可以是完整 URL 或相对路径）
         params: 请求参数字典
         method: HTTP 方法，默认为 GET
         username: 可选的 GitHub 用户名，会添加到请求头中
+        use_cache: GET 请求是否使用响应缓存（TTL 由 GITHUB_CACHE_TTL 配置），默认 True
+        decoder: 成功响应体的解码函数（模块级函数，大响应体在进程池中执行），默认解析为 JSON
     
     Returns:
         包含响应数据和状态的字典:
@@ -67,67 +161,166 @@ async def github_api_request(url: str, params: Optional[Dict] = None, method: st
             "status_code": int  # HTTP 状态码
         }
     
-    Raises:
-        aiohttp.ClientError: 网络请求异常
     """
     # 如果 URL 不是完整 URL，则拼接 GitHub API 基础 URL
     if not url.startswith("http"):
-        url = f"{GITHUB_API_BASE}{url}" if url.startswith("/") else f"{GITHUB_API_BASE}/{url}"
-    
-    # 每次请求都创建新的 session，避免事件循环问题
-    # 使用 context manager 确保正确清理
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.request(
-                method=method,
-                url=url,
-                headers=get_headers(username=username),
-                params=params or {}
-            ) as response:
-                # 尝试解析 JSON 响应
-                try:
-                    response_data = await response.json()
-                except aiohttp.ContentTypeError:
-                    response_text = await response.text()
-                    response_data = {"raw": response_text}
-                
-                # 检查 HTTP 状态码
-                if response.status >= 400:
-                    error_msg = response_data.get("message", f"HTTP {response.status} 错误")
-                    return {
-                        "success": False,
-                        "error": error_msg,
-                        "status_code": response.status,
-                        "data": None
-                    }
-                
-                return {
-                    "success": True,
-                    "data": response_data,
-                    "status_code": response.status,
-                    "error": None
-                }
+        api_base = get_api_base()
+        url = f"{api_base}{url}" if url.startswith("/") else f"{api_base}/{url}"
+    
+    # GET 请求走响应缓存：命中时直接返回，相同请求进行中时等待同一个结果
+    cache = get_response_cache()
+    if method.upper() == "GET" and use_cache and cache.enabled:
+        # 仓库请求以整个 Token 池为身份；搜索等结果取决于 Token 权限的请求以响应它的 Token 为身份
+        token_identity, pinned = get_token_pool().cache_identity(url, params)
+        identity = make_identity(token_identity, username or get_github_username())
+        key = make_key(method, url, params, identity)
+        if decoder is not None:
+            # 不同解码函数得到的数据不同，分别缓存
+            key = f"{key}|{decoder_tag(decoder)}"
+        served: List[Credential] = []
+        result = await cache.fetch(
+            key,
+            lambda: _send_request(url, params, method, username, decoder, pinned, served),
+            prefetched=prefetching.get()
+        )
+        if pinned is not None and served and served[-1] is not pinned:
+            # 固定的 Token 不可用（如被限流），由其他 Token 响应的结果不能以该 Token 的身份缓存
+            cache.invalidate(key)
+        return result
+    return await _send_request(url, params, method, username, decoder)
+
+
+async def _send_request(url: str, params: Optional[Dict], method: str, username: Optional[str], decoder: Optional[Callable[[bytes], Any]] = None, pinned: Optional[Credential] = None, served: Optional[List[Credential]] = None) -> Dict:
+    """
+    发送 HTTP 请求并转换为统一的结果字典（github_api_request 的实际请求部分）
+    
+    从 Token 池选择 Token（pinned 可用时优先使用，served 记录实际使用的凭据）；仓库相关的请求返回 404 时
+    （私有仓库对无权访问的 Token 表现为不存在）或 Token 被限流时，依次换用其他 Token 重试
+    """
+    # 在选择凭据之前读取超时配置，配置无效时不占用凭据
+    try:
+        request_timeout = float(get_env("GITHUB_TIMEOUT", str(DEFAULT_TIMEOUT)))
+    except ValueError:
+        return {
+            "success": False,
+            "error": f"HTTP 传输配置错误: GITHUB_TIMEOUT 不是有效的秒数: {get_env('GITHUB_TIMEOUT')!r}",
+            "status_code": 500,
+            "data": None
+        }
+    pool = get_token_pool()
+    tried = []
+    while True:
+        credential = pool.acquire(url, exclude=tried, params=params, prefer=pinned)
+        tried.append(credential)
+        if served is not None:
+            served.append(credential)
+        result = await _send_once(url, params, method, username, decoder, credential, request_timeout, retried=len(tried) > 1)
+        if result["success"] or not pool.should_retry(url, result["status_code"], tried):
+            return result
+
+
+async def _send_once(url: str, params: Optional[Dict], method: str, username: Optional[str], decoder: Optional[Callable[[bytes], Any]], credential: Credential, timeout: float, retried: bool = False) -> Dict:
+    """使用指定凭据发送一次请求（timeout 为 GITHUB_TIMEOUT 配置的超时），结束后向 Token 池登记额度和结果"""
+    pool = get_token_pool()
+    status = None
+    headers = None
+    response_data = None
+    
+    # 超时取默认超时和当前截止时间剩余时间中较短的一个
+    timeout = min(timeout, remaining(default=timeout))
+    if timeout <= 0:
+        pool.release(credential, url, None)
+        return _timeout_result(url)
+    
+    # 在登记过的长生命周期事件循环上复用传输；
+    # 其他事件循环（如 asyncio.run 创建的临时循环）每次请求创建新的传输，避免事件循环问题
+    try:
+        transport, owned = _acquire_transport()
+    except (ValueError, RuntimeError) as e:
+        pool.release(credential, url, None)
+        return {
+            "success": False,
+            "error": f"HTTP 传输配置错误: {str(e)}",
+            "status_code": 500,
+            "data": None
+        }
+    try:
+        response = await transport.request(
+            method,
+            url,
+            headers=get_headers(username=username, token=credential.token),
+            params=params,
+            timeout=timeout
+        )
+        headers = response.headers
         
-        except aiohttp.ClientError as e:
-            return {
-                "success": False,
-                "error": f"请求异常: {str(e)}",
-                "status_code": 500,
-                "data": None
-            }
-        except Exception as e:
+        # 非 JSON 响应按文本返回
+        if "json" not in response.content_type:
+            response_data = {"raw": response.text()}
+        elif response.status >= 400:
+            response_data = decode_json(response.body) or {}
+        else:
+            # 解析成功响应体，大响应体交给进程池，避免阻塞事件循环
+            response_data = await run_offloaded(decoder or decode_json, response.body)
+        status = response.status
+        
+        # 检查 HTTP 状态码
+        if response.status >= 400:
+            error_msg = response_data.get("message", f"HTTP {response.status} 错误")
             return {
                 "success": False,
-                "error": f"未知错误: {str(e)}",
-                "status_code": 500,
+                "error": error_msg,
+                "status_code": response.status,
                 "data": None
             }
+        
+        return {
+            "success": True,
+            "data": response_data,
+            "status_code": response.status,
+            "error": None
+        }
+
+    except asyncio.TimeoutError:
+        return _timeout_result(url)
+    except TransportError as e:
+        return {
+            "success": False,
+            "error": f"请求异常: {str(e)}",
+            "status_code": 500,
+            "data": None
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"未知错误: {str(e)}",
+            "status_code": 500,
+            "data": None
+        }
+    finally:
+        pool.release(credential, url, status, headers, response_data, retried)
+        if owned:
+            await transport.close()
+
+
+def _timeout_result(url: str) -> Dict:
+    """请求超时（或截止时间已过）时的结果字典，timed_out 标记供上层区分超时和其他错误"""
+    return {
+        "success": False,
+        "error": f"请求超时: {url}",
+        "status_code": 504,
+        "data": None,
+        "timed_out": True
+    }
 
 
 async def search_repository_by_url(repo_url: str, per_page: int = 30, page: int = 1, sort: str = "stars", order: str = "desc") -> Dict:
     """
     通过仓库地址模糊查找仓库信息
     
+    owner/repo 格式先精确查询，未命中再模糊搜索；输入可能有误时（见 classify_repo_query）两个请求并发进行，
+    精确查询命中时取消模糊搜索，并发的胜出情况可通过 get_lookup_stats() 查看
+    
     Args:
         repo_url: 仓库地址，支持以下格式：
             - 完整 URL: https://github.com/owner/repo
@@ -155,9 +348,11 @@ async def search_repository_by_url(repo_url: str, per_page: int = 30, page: int
     """
     # 解析仓库地址
     search_keyword = repo_url.strip()
+    from_url = False
     
     # 如果是完整 URL，提取 owner/repo
     if "github.com" in search_keyword:
+        from_url = True
         # 处理 https://github.com/owner/repo 或 github.com/owner/repo
         parts = search_keyword.replace("https://", "").replace("http://", "").split("/")
         if len(parts) >= 3:
@@ -169,59 +364,143 @@ async def search_repository_by_url(repo_url: str, per_page: int = 30, page: int
             # 只有 owner/repo
             search_keyword = "/".join(parts[1:])
     
-    # 判断是精确查询还是模糊搜索
-    if "/" in search_keyword:
-        # 有斜杠，可能是 owner/repo 格式，先尝试精确查询
-        parts = search_keyword.split("/")
-        if len(parts) == 2:
-            owner, repo_name = parts
-            # 先尝试精确查询
-            exact_result = await github_api_request(f"/repos/{owner}/{repo_name}", username=owner)
-            if exact_result["success"]:
-                # 精确匹配成功，返回单个仓库
-                repo_data = exact_result["data"]
-                formatted_repo = {
-                    "id": repo_data["id"],
-                    "name": repo_data["name"],
-                    "full_name": repo_data["full_name"],
-                    "description": repo_data.get("description"),
-                    "url": repo_data["html_url"],
-                    "language": repo_data.get("language"),
-                    "stars": repo_data["stargazers_count"],
-                    "forks": repo_data["forks_count"],
-                    "watchers": repo_data["watchers_count"],
-                    "open_issues": repo_data["open_issues_count"],
-                    "default_branch": repo_data["default_branch"],
-                    "created_at": repo_data["created_at"],
-                    "updated_at": repo_data["updated_at"],
-                    "pushed_at": repo_data.get("pushed_at"),
-                    "is_private": repo_data["private"],
-                    "is_fork": repo_data["fork"],
-                    "topics": repo_data.get("topics", []),
-                    "license": repo_data.get("license"),
-                    "owner": {
-                        "login": repo_data["owner"]["login"],
-                        "avatar_url": repo_data["owner"]["avatar_url"],
-                        "type": repo_data["owner"]["type"]
-                    }
-                }
-                return {
-                    "success": True,
-                    "data": {
-                        "search_keyword": search_keyword,
-                        "total_count": 1,
-                        "returned_count": 1,
-                        "repositories": [formatted_repo]
-                    },
-                    "error": None,
-                    "status_code": 200
-                }
-    
-    # 模糊搜索模式：使用 GitHub Search API
+    # 判断是精确查询还是模糊搜索：精确查询未命中时才需要模糊搜索，
+    # 输入可能有误时两个请求并发进行，省去一次串行往返
+    mode = classify_repo_query(search_keyword, from_url=from_url)
+    if mode == "exact":
+        owner, repo_name = search_keyword.split("/")
+        exact_result = await _exact_repository_lookup(owner, repo_name, search_keyword)
+        _record_lookup(exact_result is not None)
+        if exact_result is not None:
+            return exact_result
+    elif mode == "race":
+        owner, repo_name = search_keyword.split("/")
+        return await _race_repository_lookup(owner, repo_name, search_keyword, per_page, page, sort, order)
+    else:
+        _lookup_stats["fuzzy"] += 1
+    
+    return await _search_repositories(search_keyword, per_page, page, sort, order)
+
+
+# GitHub 用户名最长 39 个字符，只能包含字母、数字和短横线；仓库名只能包含字母、数字、短横线、下划线和点
+_OWNER_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9-]{0,38})$")
+_REPO_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+
+# 最近精确查询是否命中（用于判断输入的 owner/repo 是否经常有误）
+_exact_history: deque = deque(maxlen=50)
+_EXACT_MISS_RATE_TO_RACE = 0.3
+_MIN_EXACT_SAMPLES = 10
+
+_lookup_stats = {
+    "exact": 0,              # 只发起精确查询的次数
+    "exact_hits": 0,         # 精确查询命中次数
+    "fuzzy": 0,              # 直接模糊搜索的次数
+    "races": 0,              # 精确查询与模糊搜索并发的次数
+    "race_exact_wins": 0,    # 并发时精确查询命中（模糊搜索被取消）
+    "race_fuzzy_wins": 0,    # 并发时精确查询未命中，直接使用已在进行的模糊搜索（省去一次串行往返）
+    "race_saved_ms": 0.0     # 并发为模糊搜索节省的等待时间（毫秒，按精确查询耗时估算）
+}
+
+
+def classify_repo_query(keyword: str, from_url: bool = False) -> str:
+    """
+    判断仓库查询应使用的方式
+    
+    Args:
+        keyword: 解析后的搜索关键词
+        from_url: 关键词是否从完整的 GitHub URL 中解析得到（复制的 URL 通常准确）
+    
+    Returns:
+        "exact": 先精确查询，未命中再模糊搜索；
+        "race": 精确查询和模糊搜索并发进行（输入可能有误，精确查询很可能未命中）；
+        "fuzzy": 直接模糊搜索（不是 owner/repo 格式，或包含 GitHub 名称中不允许的字符，精确查询不可能命中）
+    """
+    parts = keyword.split("/")
+    if len(parts) != 2 or not all(parts):
+        return "fuzzy"
+    owner, repo_name = parts
+    if not _OWNER_PATTERN.match(owner) or not _REPO_PATTERN.match(repo_name):
+        return "fuzzy"
+    if from_url:
+        return "exact"
+    # 像是没输完或输错的名称：过短、以分隔符结尾、包含连续分隔符
+    if len(repo_name) < 3 or repo_name[-1] in "-_." or owner.endswith("-") or re.search(r"[-_.]{2,}", repo_name):
+        return "race"
+    # 最近的精确查询经常未命中时（例如模型经常猜测仓库名），并发更划算
+    if len(_exact_history) >= _MIN_EXACT_SAMPLES:
+        miss_rate = _exact_history.count(False) / len(_exact_history)
+        if miss_rate >= _EXACT_MISS_RATE_TO_RACE:
+            return "race"
+    return "exact"
+
+
+def _record_lookup(hit: bool):
+    """记录一次精确查询的结果"""
+    _exact_history.append(hit)
+    _lookup_stats["exact"] += 1
+    if hit:
+        _lookup_stats["exact_hits"] += 1
+
+
+def get_lookup_stats() -> Dict:
+    """
+    获取仓库查询方式的统计（精确查询命中率、并发次数及胜出情况）
+    
+    Returns:
+        统计字典，race_win_rate 为并发时模糊搜索派上用场（精确查询未命中）的比例
+    """
+    stats = dict(_lookup_stats)
+    stats["race_saved_ms"] = round(stats["race_saved_ms"], 1)
+    stats["race_win_rate"] = round(stats["race_fuzzy_wins"] / stats["races"], 4) if stats["races"] else 0.0
+    return stats
+
+
+async def _race_repository_lookup(owner: str, repo_name: str, search_keyword: str, per_page: int, page: int, sort: str, order: str) -> Dict:
+    """并发发起精确查询和模糊搜索：精确查询命中时取消模糊搜索，未命中时使用模糊搜索结果"""
+    _lookup_stats["races"] += 1
+    started = time.perf_counter()
+    exact_task = asyncio.ensure_future(_exact_repository_lookup(owner, repo_name, search_keyword))
+    fuzzy_task = asyncio.ensure_future(_search_repositories(search_keyword, per_page, page, sort, order))
+    try:
+        exact_result = await exact_task
+        _exact_history.append(exact_result is not None)
+        if exact_result is not None:
+            _lookup_stats["race_exact_wins"] += 1
+            return exact_result
+        _lookup_stats["race_fuzzy_wins"] += 1
+        _lookup_stats["race_saved_ms"] += (time.perf_counter() - started) * 1000
+        return await fuzzy_task
+    finally:
+        for task in (exact_task, fuzzy_task):
+            if not task.done():
+                task.cancel()
+
+
+async def _exact_repository_lookup(owner: str, repo_name: str, search_keyword: str) -> Optional[Dict]:
+    """精确查询 owner/repo，命中时返回搜索结果格式的字典，未命中时返回 None"""
+    exact_result = await github_api_request(f"/repos/{owner}/{repo_name}", username=owner)
+    if not exact_result["success"]:
+        return None
+    return {
+        "success": True,
+        "data": {
+            "search_keyword": search_keyword,
+            "total_count": 1,
+            "returned_count": 1,
+            "repositories": [_format_repository(exact_result["data"])]
+        },
+        "error": None,
+        "status_code": 200
+    }
+
+
+async def _search_repositories(search_keyword: str, per_page: int, page: int, sort: str, order: str) -> Dict:
+    """模糊搜索模式：使用 GitHub Search API"""
     # 构建搜索查询：在仓库名称中搜索关键词，并限制为指定用户的仓库
-    if GITHUB_USERNAME:
+    github_username = get_github_username()
+    if github_username:
         # 如果设置了 GITHUB_USERNAME，只搜索该用户的仓库
-        search_query = f"{search_keyword} in:name user:{GITHUB_USERNAME}"
+        search_query = f"{search_keyword} in:name user:{github_username}"
     else:
         # 如果没有设置 GITHUB_USERNAME，进行全局搜索
         search_query = f"{search_keyword} in:name"
@@ -241,35 +520,7 @@ async def search_repository_by_url(repo_url: str, per_page: int = 30, page: int
     
     search_data = result["data"]
     repos = search_data.get("items", [])
-    
-    formatted_repos = [
-        {
-            "id": repo["id"],
-            "name": repo["name"],
-            "full_name": repo["full_name"],
-            "description": repo.get("description"),
-            "url": repo["html_url"],
-            "language": repo.get("language"),
-            "stars": repo["stargazers_count"],
-            "forks": repo["forks_count"],
-            "watchers": repo["watchers_count"],
-            "open_issues": repo["open_issues_count"],
-            "default_branch": repo.get("default_branch"),
-            "created_at": repo["created_at"],
-            "updated_at": repo["updated_at"],
-            "pushed_at": repo.get("pushed_at"),
-            "is_private": repo["private"],
-            "is_fork": repo["fork"],
-            "topics": repo.get("topics", []),
-            "license": repo.get("license"),
-            "owner": {
-                "login": repo["owner"]["login"],
-                "avatar_url": repo["owner"]["avatar_url"],
-                "type": repo["owner"]["type"]
-            }
-        }
-        for repo in repos
-    ]
+    formatted_repos = [_format_repository(repo) for repo in repos]
     
     return {
         "success": True,
@@ -284,6 +535,71 @@ async def search_repository_by_url(repo_url: str, per_page: int = 30, page: int
     }
 
 
+def _format_repository(repo: Dict) -> Dict:
+    """将 GitHub 返回的仓库数据转换为统一格式"""
+    return {
+        "id": repo["id"],
+        "name": repo["name"],
+        "full_name": repo["full_name"],
+        "description": repo.get("description"),
+        "url": repo["html_url"],
+        "language": repo.get("language"),
+        "stars": repo["stargazers_count"],
+        "forks": repo["forks_count"],
+        "watchers": repo["watchers_count"],
+        "open_issues": repo["open_issues_count"],
+        "default_branch": repo.get("default_branch"),
+        "created_at": repo["created_at"],
+        "updated_at": repo["updated_at"],
+        "pushed_at": repo.get("pushed_at"),
+        "is_private": repo["private"],
+        "is_fork": repo["fork"],
+        "topics": repo.get("topics", []),
+        "license": repo.get("license"),
+        "owner": {
+            "login": repo["owner"]["login"],
+            "avatar_url": repo["owner"]["avatar_url"],
+            "type": repo["owner"]["type"]
+        }
+    }
+
+
+def _format_pull_request(pr: Dict) -> Dict:
+    """将 GitHub 返回的 Pull Request（REST 接口或 Webhook 事件中的对象）转换为统一格式"""
+    return {
+        "number": pr["number"],
+        "title": pr["title"],
+        "body": pr.get("body", ""),
+        "state": pr["state"],
+        "url": pr["html_url"],
+        "user": {
+            "login": pr["user"]["login"],
+            "avatar_url": pr["user"]["avatar_url"],
+            "type": pr["user"].get("type", "User")
+        },
+        "created_at": pr["created_at"],
+        "updated_at": pr["updated_at"],
+        "merged_at": pr.get("merged_at"),
+        "mergeable": pr.get("mergeable"),
+        "merged": pr.get("merged", False),
+        "draft": pr.get("draft", False),
+        "additions": pr.get("additions"),
+        "deletions": pr.get("deletions"),
+        "changed_files": pr.get("changed_files"),
+        "commits": pr.get("commits", 0),
+        "head": {
+            "ref": pr["head"]["ref"],
+            "sha": pr["head"]["sha"],
+            "repo": pr["head"]["repo"]["full_name"] if pr["head"].get("repo") else None
+        },
+        "base": {
+            "ref": pr["base"]["ref"],
+            "sha": pr["base"]["sha"],
+            "repo": pr["base"]["repo"]["full_name"] if pr["base"].get("repo") else None
+        }
+    }
+
+
 async def get_pull_requests_by_repo_id(repo_id: int, state: str = "open", per_page: int = 30, page: int = 1, sort: str = "created", direction: str = "desc") -> Dict:
     """
     根据仓库 ID 获取该仓库的所有 Pull Requests
@@ -349,41 +665,10 @@ async def get_pull_requests_by_repo_id(repo_id: int, state: str = "open", per_pa
     
     pulls = result["data"]
     
-    formatted_pulls = [
-        {
-            "number": pr["number"],
-            "title": pr["title"],
-            "body": pr.get("body", ""),
-            "state": pr["state"],
-            "url": pr["html_url"],
-            "user": {
-                "login": pr["user"]["login"],
-                "avatar_url": pr["user"]["avatar_url"],
-                "type": pr["user"].get("type", "User")
-            },
-            "created_at": pr["created_at"],
-            "updated_at": pr["updated_at"],
-            "merged_at": pr.get("merged_at"),
-            "mergeable": pr.get("mergeable"),
-            "merged": pr.get("merged", False),
-            "draft": pr.get("draft", False),
-            "additions": pr.get("additions"),
-            "deletions": pr.get("deletions"),
-            "changed_files": pr.get("changed_files"),
-            "commits": pr.get("commits", 0),
-            "head": {
-                "ref": pr["head"]["ref"],
-                "sha": pr["head"]["sha"],
-                "repo": pr["head"]["repo"]["full_name"] if pr["head"].get("repo") else None
-            },
-            "base": {
-                "ref": pr["base"]["ref"],
-                "sha": pr["base"]["sha"],
-                "repo": pr["base"]["repo"]["full_name"] if pr["base"].get("repo") else None
-            }
-        }
-        for pr in pulls
-    ]
+    formatted_pulls = [_format_pull_request(pr) for pr in pulls]
+    
+    # 写入本地镜像，供全文检索使用
+    get_mirror().record_pull_requests(repo_id, formatted_pulls)
     
     return {
         "success": True,
@@ -398,13 +683,145 @@ async def get_pull_requests_by_repo_id(repo_id: int, state: str = "open", per_pa
     }
 
 
-async def get_pull_request_files_by_repo_id(repo_id: int, pr_number: int) -> Dict:
+def _format_pr_file(file: Dict, include_patch: bool = True) -> Dict:
+    """将 GitHub 返回的 PR 变更文件转换为统一格式"""
+    return {
+        "filename": file["filename"],
+        "status": file["status"],  # added, removed, modified, renamed, copied, changed, unchanged
+        "additions": file.get("additions", 0),
+        "deletions": file.get("deletions", 0),
+        "changes": file.get("changes", 0),
+        "patch": file.get("patch", "") if include_patch else None,  # 变更内容的补丁（diff格式）
+        "previous_filename": file.get("previous_filename"),  # 重命名前的文件名
+        "blob_url": file.get("blob_url", ""),
+        "raw_url": file.get("raw_url", ""),
+        "contents_url": file.get("contents_url", "")
+    }
+
+
+async def iter_pull_request_files(repo_id: int, pr_number: int, concurrency: int = 4, include_patch: bool = True) -> AsyncIterator[Dict]:
+    """
+    分页流式获取 Pull Request 的全部变更文件（最多 GitHub 上限 3000 个）
+    
+    先读取第 1 页，不足一页时直接结束（小 PR 只需一次请求）；第 1 页是满页时同时请求第 2 页和 PR 详情，
+    由详情中的变更文件数确定页数，再以滑动窗口并发请求其余各页（最多提前 concurrency 页），按页码顺序逐页产出，
+    内存中最多同时保留 concurrency 页；只有第 1 页进入响应缓存
+    
+    Args:
+        repo_id: 仓库 ID（整数）
+        pr_number: Pull Request 编号（整数）
+        concurrency: 同时请求的页数
+        include_patch: 是否保留每个文件的补丁内容
+    
+    Yields:
+        每页的结果字典:
+        {
+            "success": bool,
+            "data": {
+                "page": int,             # 页码
+                "pages": int,            # 预计总页数
+                "changed_files": int,    # PR 实际变更的文件数（可能超过 GitHub 可列出的上限）
+                "files": list            # 本页的变更文件（格式同 get_pull_request_files_by_repo_id）
+            },
+            "error": str,
+            "status_code": int
+        }
+        请求失败时产出失败的结果字典后停止
+    """
+    url = f"/repositories/{repo_id}/pulls/{pr_number}/files"
+    # 每页的解析和格式转换在解码函数中完成（大页面在进程池中执行）
+    decoder = pr_files_decoder(include_patch)
+    max_pages = PR_FILES_LIMIT // PR_FILES_PER_PAGE
+    
+    def request_page(number: int) -> asyncio.Future:
+        # 只缓存第 1 页（预取预热的也是第 1 页），其余页面不进入响应缓存，避免大 PR 的全部补丁常驻内存
+        return asyncio.ensure_future(
+            github_api_request(url, params={"per_page": PR_FILES_PER_PAGE, "page": number}, decoder=decoder, use_cache=False)
+        )
+    
+    first = await github_api_request(url, params={"per_page": PR_FILES_PER_PAGE, "page": 1}, decoder=decoder)
+    if not first["success"]:
+        if first["status_code"] == 404:
+            first = {
+                "success": False,
+                "error": f"仓库 ID {repo_id} 的 Pull Request #{pr_number} 不存在或无权访问",
+                "status_code": 404,
+                "data": None
+            }
+        yield first
+        return
+    files = first["data"]
+    if len(files) < PR_FILES_PER_PAGE:
+        yield {
+            "success": True,
+            "data": {"page": 1, "pages": 1, "changed_files": len(files), "files": files},
+            "error": None,
+            "status_code": first["status_code"]
+        }
+        return
+    
+    window = max(1, concurrency)
+    tasks: Dict[int, asyncio.Future] = {2: request_page(2)}
+    next_page = 3
+    try:
+        # 第 1 页是满页：请求第 2 页的同时读取 PR 详情确定总页数（详情读取失败时逐页读到不满一页为止）
+        detail = await github_api_request(f"/repositories/{repo_id}/pulls/{pr_number}")
+        changed_files = (detail["data"].get("changed_files") or 0) if detail["success"] else 0
+        pages = min(max_pages, max(2, -(-changed_files // PR_FILES_PER_PAGE)))
+        yield {
+            "success": True,
+            "data": {"page": 1, "pages": pages, "changed_files": changed_files, "files": files},
+            "error": None,
+            "status_code": first["status_code"]
+        }
+        page = 1
+        while page < pages:
+            page += 1
+            # 滑动窗口：保持最多 window 页在请求中
+            while next_page <= pages and next_page < page + window:
+                tasks[next_page] = request_page(next_page)
+                next_page += 1
+            result = await tasks.pop(page)
+            if not result["success"]:
+                yield result
+                return
+            files = result["data"]
+            yield {
+                "success": True,
+                "data": {
+                    "page": page,
+                    "pages": pages,
+                    "changed_files": changed_files,
+                    "files": files
+                },
+                "error": None,
+                "status_code": result["status_code"]
+            }
+            if len(files) < PR_FILES_PER_PAGE:
+                break
+            if page == pages and pages < max_pages:
+                # PR 的变更文件数可能已过时或未知，最后一页是满页时继续读取下一页
+                pages += 1
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+
+async def get_pull_request_files_by_repo_id(repo_id: int, pr_number: int, include_patch: bool = True, max_files: Optional[int] = PR_FILES_DEFAULT_MAX, concurrency: int = 4, on_page: Optional[Callable[[Dict], Awaitable[None]]] = None) -> Dict:
     """
     根据仓库 ID 和 Pull Request 编号获取变更文件和变更内容
     
+    分页读取全部变更文件（最多 GitHub 上限 3000 个），统计数据在读取过程中累加，
+    只保留前 max_files 个文件（默认 300），不会在内存中保留超大 PR 的全部补丁
+    
     Args:
         repo_id: 仓库 ID（整数）
         pr_number: Pull Request 编号（整数）
+        include_patch: 是否返回每个文件的补丁内容，默认 True
+        max_files: 最多返回的文件数（统计数据仍包含全部文件），默认 300，None 表示全部返回
+        concurrency: 同时请求的页数，默认 4
+        on_page: 可选的异步回调，每读取一页时调用（用于流式推送部分结果），参数为
+            {"page": int, "pages": int, "changed_files": int, "files": list}，files 只包含本页中计入返回结果的文件
     
     Returns:
         包含变更文件数据和状态的字典:
@@ -413,10 +830,14 @@ async def get_pull_request_files_by_repo_id(repo_id: int, pr_number: int) -> Dic
             "data": {
                 "repository_id": int,        # 仓库 ID
                 "pull_request_number": int,  # PR 编号
-                "total_files": int,          # 变更文件总数
+                "total_files": int,          # 已列出的变更文件总数
                 "total_additions": int,       # 总添加行数
                 "total_deletions": int,       # 总删除行数
                 "total_changes": int,         # 总变更行数
+                "changed_files": int,         # PR 实际变更的文件数
+                "truncated": bool,            # 是否超过 GitHub 最多列出 3000 个文件的上限
+                "complete": bool,             # 是否读取了全部页（某页请求失败时为 False，返回已读取的部分）
+                "timed_out": bool,            # 是否因超时只读取了部分页
                 "files": [                   # 变更文件列表
                     {
                         "filename": str,
@@ -424,7 +845,7 @@ async def get_pull_request_files_by_repo_id(repo_id: int, pr_number: int) -> Dic
                         "additions": int,
                         "deletions": int,
                         "changes": int,
-                        "patch": str,         # 变更内容的补丁（diff）
+                        "patch": str,         # 变更内容的补丁（diff），include_patch 为 False 时为 None
                         "previous_filename": str,  # 重命名前的文件名
                         "blob_url": str,
                         "raw_url": str,
@@ -436,58 +857,156 @@ async def get_pull_request_files_by_repo_id(repo_id: int, pr_number: int) -> Dic
             "status_code": int
         }
     """
-    # 使用仓库 ID 和 PR 编号查询文件变更
-    result = await github_api_request(f"/repositories/{repo_id}/pulls/{pr_number}/files")
+    files = []
+    total_files = total_additions = total_deletions = total_changes = 0
+    changed_files = 0
+    pages_read = 0
+    complete = True
+    error = None
+    timed_out = False
     
-    if not result["success"]:
-        if result["status_code"] == 404:
-            return {
-                "success": False,
-                "error": f"仓库 ID {repo_id} 的 Pull Request #{pr_number} 不存在或无权访问",
-                "status_code": 404,
-                "data": None
-            }
-        return result
-    
-    files = result["data"]
-    
-    # 计算总计
-    total_additions = sum(file.get("additions", 0) for file in files)
-    total_deletions = sum(file.get("deletions", 0) for file in files)
-    total_changes = sum(file.get("changes", 0) for file in files)
-    
-    formatted_files = [
-        {
-            "filename": file["filename"],
-            "status": file["status"],  # added, removed, modified, renamed, copied, changed, unchanged
-            "additions": file.get("additions", 0),
-            "deletions": file.get("deletions", 0),
-            "changes": file.get("changes", 0),
-            "patch": file.get("patch", ""),  # 变更内容的补丁（diff格式）
-            "previous_filename": file.get("previous_filename"),  # 重命名前的文件名
-            "blob_url": file.get("blob_url", ""),
-            "raw_url": file.get("raw_url", ""),
-            "contents_url": file.get("contents_url", "")
-        }
-        for file in files
-    ]
+    async for page in iter_pull_request_files(repo_id, pr_number, concurrency=concurrency, include_patch=include_patch):
+        if not page["success"]:
+            if pages_read == 0:
+                return page
+            # 后续页失败时返回已读取的部分
+            complete = False
+            error = page["error"]
+            timed_out = bool(page.get("timed_out"))
+            break
+        pages_read += 1
+        changed_files = page["data"]["changed_files"]
+        kept = len(files)
+        for file in page["data"]["files"]:
+            total_files += 1
+            total_additions += file["additions"]
+            total_deletions += file["deletions"]
+            total_changes += file["changes"]
+            if max_files is None or len(files) < max_files:
+                files.append(file)
+        if on_page is not None:
+            await on_page({
+                "page": page["data"]["page"],
+                "pages": page["data"]["pages"],
+                "changed_files": changed_files,
+                "files": files[kept:]
+            })
     
     return {
         "success": True,
         "data": {
             "repository_id": repo_id,
             "pull_request_number": pr_number,
-            "total_files": len(formatted_files),
+            "total_files": total_files,
             "total_additions": total_additions,
             "total_deletions": total_deletions,
             "total_changes": total_changes,
-            "files": formatted_files
+            "changed_files": max(changed_files, total_files),
+            # 变更文件数未知（PR 详情读取失败）时，列出的文件达到上限即视为被截断
+            "truncated": changed_files > PR_FILES_LIMIT if changed_files else total_files >= PR_FILES_LIMIT,
+            "complete": complete,
+            "timed_out": timed_out,
+            "files": files
+        },
+        "error": error,
+        "status_code": 200
+    }
+
+
+async def _get_commits_from_git(repo_id: int, sha: Optional[str], path: Optional[str], author: Optional[str], since: Optional[str], until: Optional[str], per_page: int, page: int) -> Optional[Dict]:
+    """
+    使用本地 git 后端查询提交（参数和返回值与 get_commits_by_repo_id 相同）
+    
+    Returns:
+        结果字典，仓库无法克隆或 git 命令失败时返回 None（调用方回退到 REST API）
+    """
+    from .git_backend import GitBackendError, get_git_backend, parse_sources
+    
+    sources = parse_sources(get_env("GITHUB_GIT_SOURCES"))
+    source = sources.get(str(repo_id))
+    html_base = None
+    full_name = None
+    if source is None:
+        # 通过 API 查询仓库名称和克隆地址（仓库信息有响应缓存，不会每次都请求）
+        repository = await github_api_request(f"/repositories/{repo_id}")
+        if not repository["success"]:
+            return None
+        full_name = repository["data"].get("full_name")
+        html_base = repository["data"].get("html_url")
+        template = get_env("GITHUB_GIT_URL_TEMPLATE")
+        source = sources.get((full_name or "").lower()) or (template.format(full_name=full_name) if template else repository["data"].get("clone_url"))
+        if not source:
+            return None
+    
+    backend = get_git_backend()
+    try:
+        clone = await backend.sync(repo_id, source)
+        commits = await backend.list_commits(clone, sha=sha, file_path=path, author=author, since=since, until=until, per_page=per_page, page=page)
+    except (GitBackendError, asyncio.TimeoutError, OSError):
+        return None
+    
+    if full_name:
+        api_base = get_api_base()
+        for commit in commits:
+            commit["url"] = f"{api_base}/repos/{full_name}/commits/{commit['sha']}"
+            commit["html_url"] = f"{html_base}/commit/{commit['sha']}" if html_base else ""
+    
+    # 写入本地镜像，供全文检索使用
+    get_mirror().record_commits(repo_id, commits)
+    
+    return {
+        "success": True,
+        "data": {
+            "repository_id": repo_id,
+            "total": len(commits),
+            "commits": commits
         },
         "error": None,
         "status_code": 200
     }
 
 
+def _format_commit(commit: Dict) -> Dict:
+    """将 GitHub 返回的提交转换为统一格式"""
+    commit_data = commit.get("commit", {})
+    author_info = commit_data.get("author", {})
+    committer_info = commit_data.get("committer", {})
+    
+    formatted_commit = {
+        "sha": commit["sha"],
+        "message": commit_data.get("message", ""),
+        "author": {
+            "name": author_info.get("name", ""),
+            "email": author_info.get("email", ""),
+            "date": author_info.get("date", "")
+        },
+        "committer": {
+            "name": committer_info.get("name", ""),
+            "email": committer_info.get("email", ""),
+            "date": committer_info.get("date", "")
+        },
+        "url": commit.get("url", ""),
+        "html_url": commit.get("html_url", ""),
+        "stats": commit.get("stats", {}),
+        "files": []
+    }
+    
+    # 如果有文件信息，添加到提交中
+    if commit.get("files"):
+        formatted_commit["files"] = [
+            {
+                "filename": f.get("filename", ""),
+                "additions": f.get("additions", 0),
+                "deletions": f.get("deletions", 0),
+                "changes": f.get("changes", 0),
+                "status": f.get("status", "")
+            }
+            for f in commit["files"]
+        ]
+    
+    return formatted_commit
+
+
 async def get_commits_by_repo_id(repo_id: int, sha: Optional[str] = None, path: Optional[str] = None, author: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None, per_page: int = 30, page: int = 1) -> Dict:
     """
     根据仓库 ID 获取该仓库的所有提交（commits）
@@ -562,6 +1081,13 @@ async def get_commits_by_repo_id(repo_id: int, sha: Optional[str] = None, path:
     if until:
         params["until"] = until
     
+    # 启用了本地 git 后端时优先从本地克隆查询（不消耗速率限制，附带每个提交的增删统计）；
+    # 预取和预热不使用本地后端，避免为搜索结果中的仓库启动完整克隆
+    if git_backend_enabled() and not prefetching.get():
+        local_result = await _get_commits_from_git(repo_id, sha, path, author, since, until, per_page, page)
+        if local_result is not None:
+            return local_result
+    
     # 使用仓库 ID 查询提交
     result = await github_api_request(f"/repositories/{repo_id}/commits", params=params)
     
@@ -577,45 +1103,10 @@ async def get_commits_by_repo_id(repo_id: int, sha: Optional[str] = None, path:
     
     commits = result["data"]
     
-    formatted_commits = []
-    for commit in commits:
-        commit_data = commit.get("commit", {})
-        author_info = commit_data.get("author", {})
-        committer_info = commit_data.get("committer", {})
-        
-        formatted_commit = {
-            "sha": commit["sha"],
-            "message": commit_data.get("message", ""),
-            "author": {
-                "name": author_info.get("name", ""),
-                "email": author_info.get("email", ""),
-                "date": author_info.get("date", "")
-            },
-            "committer": {
-                "name": committer_info.get("name", ""),
-                "email": committer_info.get("email", ""),
-                "date": committer_info.get("date", "")
-            },
-            "url": commit.get("url", ""),
-            "html_url": commit.get("html_url", ""),
-            "stats": commit.get("stats", {}),
-            "files": []
-        }
-        
-        # 如果有文件信息，添加到提交中
-        if commit.get("files"):
-            formatted_commit["files"] = [
-                {
-                    "filename": f.get("filename", ""),
-                    "additions": f.get("additions", 0),
-                    "deletions": f.get("deletions", 0),
-                    "changes": f.get("changes", 0),
-                    "status": f.get("status", "")
-                }
-                for f in commit["files"]
-            ]
-        
-        formatted_commits.append(formatted_commit)
+    formatted_commits = [_format_commit(commit) for commit in commits]
+    
+    # 写入本地镜像，供全文检索使用
+    get_mirror().record_commits(repo_id, formatted_commits)
     
     return {
         "success": True,
@@ -0,0 +1,406 @@
+"""
+GitHub Token 池
+多个 Token 各自维护速率限制额度（core / search 分开统计），每个请求选择剩余额度最多（扣除进行中请求）的 Token，
+额度耗尽或触发限流的 Token 在该类别上自动冷却到重置时间。私有仓库只有部分 Token 能访问：
+可以为 Token 指定所有者（组织或用户），访问这些所有者的仓库时优先使用；
+请求返回 404 时，仅当所有者指定给了其他 Token 或该仓库此前被识别为私有仓库时换用其他 Token 重试，
+成功后记住该仓库应使用的 Token（其余 404 视为仓库确实不存在）；Token 被限流时同样换用其他 Token 重试
+
+配置（环境变量）:
+    GITHUB_TOKENS  逗号分隔的多个 Token，Token 后可用 ":" 指定其优先服务的所有者（多个用 "|" 分隔），
+                   如 "ghp_aaa,ghp_bbb:my-org|alice"
+    GITHUB_TOKEN   未设置 GITHUB_TOKENS 时使用的单个 Token（都未设置时匿名请求）
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from ..config import get_env
+
+# 未观察到响应头时假定的每小时额度
+_DEFAULT_LIMITS = {
+    "core": 5000,
+    "search": 30
+}
+_ANONYMOUS_LIMITS = {
+    "core": 60,
+    "search": 10
+}
+
+# 无法确定重置时间时的冷却秒数；凭据无效（401）时的冷却秒数
+_DEFAULT_COOLDOWN = 60
+_INVALID_TOKEN_COOLDOWN = 3600
+
+# 仓库 -> Token 的路由记录上限
+_MAX_AFFINITY = 10000
+
+_REPOS_PATTERN = re.compile(r"/repos/([^/?#]+)/([^/?#]+)")
+_REPOSITORIES_PATTERN = re.compile(r"/repositories/(\d+)")
+_OWNER_PATTERN = re.compile(r"/(?:users|orgs)/([^/?#]+)")
+# 搜索语句中限定所有者的限定词，如 "user:alice"、"org:my-org"、"repo:my-org/app"
+_QUALIFIER_PATTERN = re.compile(r"(?:^|\s)(?:user|org|repo):\"?([^\s/\"]+)", re.IGNORECASE)
+
+
+def parse_tokens(value: Optional[str]) -> List[Tuple[str, FrozenSet[str]]]:
+    """
+    解析 GITHUB_TOKENS 配置
+
+    Args:
+        value: 配置值，如 "ghp_aaa,ghp_bbb:my-org|alice"
+
+    Returns:
+        [(Token, 所有者集合（小写）)]
+    """
+    tokens = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        token, _, owners = item.partition(":")
+        tokens.append((token.strip(), frozenset(owner.strip().lower() for owner in owners.split("|") if owner.strip())))
+    return tokens
+
+
+def _resource_type(url: str) -> str:
+    """请求计入的速率限制类别（搜索接口单独计算）"""
+    return "search" if "/search/" in url else "core"
+
+
+def _repository_of(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    解析请求针对的仓库
+
+    Returns:
+        (仓库标识如 "repos/owner/repo" 或 "repositories/123", 所有者（小写）)，不针对仓库时为 None
+    """
+    match = _REPOS_PATTERN.search(url)
+    if match:
+        owner = match.group(1).lower()
+        return f"repos/{owner}/{match.group(2).lower()}", owner
+    match = _REPOSITORIES_PATTERN.search(url)
+    if match:
+        return f"repositories/{match.group(1)}", None
+    match = _OWNER_PATTERN.search(url)
+    return None, match.group(1).lower() if match else None
+
+
+def _target_of(url: str, params: Optional[Dict] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    解析请求针对的仓库和所有者（搜索请求的所有者取自 q 参数中的 user: / org: / repo: 限定词）
+
+    Returns:
+        (仓库标识, 所有者（小写）)，同 _repository_of
+    """
+    repository, owner = _repository_of(url)
+    if owner is None and "/search/" in url and params and isinstance(params.get("q"), str):
+        match = _QUALIFIER_PATTERN.search(params["q"])
+        if match:
+            owner = match.group(1).lower()
+    return repository, owner
+
+
+class _Bucket:
+    """单个 Token 在一个速率限制类别上的额度和冷却状态"""
+
+    __slots__ = ("limit", "remaining", "reset", "inflight", "cooldown_until")
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset: Optional[int] = None
+        self.inflight = 0
+        self.cooldown_until = 0.0
+
+
+class Credential:
+    """池中的一个 Token 及其额度和冷却状态"""
+
+    def __init__(self, token: Optional[str], owners: FrozenSet[str] = frozenset(), index: int = 0):
+        self.token = token
+        self.owners = owners
+        self.index = index
+        self.buckets = {name: _Bucket() for name in _DEFAULT_LIMITS}
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def label(self) -> str:
+        """用于统计和日志的名称（不暴露 Token）"""
+        if self.token is None:
+            return "anonymous"
+        return f"token{self.index + 1}(...{self.token[-4:]})"
+
+    def estimated_remaining(self, resource: str) -> int:
+        """估计的剩余额度（扣除进行中的请求，未观察到响应头时按默认额度）"""
+        bucket = self.buckets[resource]
+        defaults = _DEFAULT_LIMITS if self.token else _ANONYMOUS_LIMITS
+        remaining = bucket.remaining if bucket.remaining is not None else defaults[resource]
+        return remaining - bucket.inflight
+
+
+class TokenPool:
+    """线程安全的 Token 池"""
+
+    def __init__(self, tokens: Sequence[Tuple[Optional[str], FrozenSet[str]]] = ()):
+        """
+        初始化 Token 池
+
+        Args:
+            tokens: [(Token, 所有者集合)]，为空时只有一个匿名凭据
+        """
+        tokens = list(tokens) or [(None, frozenset())]
+        self.credentials = [Credential(token, owners, index) for index, (token, owners) in enumerate(tokens)]
+        # 仓库标识 -> 能访问该仓库的凭据（通过 404 重试或私有仓库响应学习得到）
+        self._affinity: "OrderedDict[str, Credential]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TokenPool":
+        """按 GITHUB_TOKENS（或 GITHUB_TOKEN）创建 Token 池"""
+        tokens = parse_tokens(get_env("GITHUB_TOKENS"))
+        if not tokens and get_env("GITHUB_TOKEN"):
+            tokens = [(get_env("GITHUB_TOKEN"), frozenset())]
+        return cls(tokens)
+
+    @property
+    def identity(self) -> Optional[str]:
+        """
+        池的身份（用于仓库请求的缓存键）：私有仓库会路由到能访问它的 Token，同一个池看到的仓库数据相同；
+        Token 集合不同时缓存互不共享。其他请求的身份见 cache_identity
+        """
+        tokens = sorted(credential.token for credential in self.credentials if credential.token)
+        return "\n".join(tokens) if tokens else None
+
+    def acquire(self, url: str, exclude: Sequence[Credential] = (), params: Optional[Dict] = None, prefer: Optional[Credential] = None) -> Optional[Credential]:
+        """
+        为请求选择凭据并登记为进行中（请求结束后必须调用 release）
+
+        优先使用 prefer、记住的仓库路由和指定了该所有者的 Token，其余按剩余额度最多选择；全部在冷却时选择最早恢复的
+
+        Args:
+            url: 请求 URL
+            exclude: 本次请求已经尝试过的凭据
+            params: 请求参数（搜索请求按 q 中的所有者限定词路由）
+            prefer: 未冷却时优先使用的凭据（见 cache_identity）
+
+        Returns:
+            凭据，所有凭据都已尝试过时返回 None
+        """
+        resource = _resource_type(url)
+        with self._lock:
+            chosen = self._choose(url, resource, exclude, params, prefer)
+            if chosen is None:
+                return None
+            chosen.buckets[resource].inflight += 1
+            chosen.requests += 1
+            return chosen
+
+    def route(self, url: str, params: Optional[Dict] = None) -> Optional[Credential]:
+        """
+        请求会被路由到的凭据（与 acquire 的选择规则相同，但不登记为进行中），
+        用于不经过 github_api_request 的访问（如 git 克隆）和确定缓存身份
+
+        Args:
+            url: 请求 URL 或路径，如 "/repos/owner/repo"
+            params: 请求参数
+
+        Returns:
+            凭据
+        """
+        with self._lock:
+            return self._choose(url, _resource_type(url), (), params)
+
+    def cache_identity(self, url: str, params: Optional[Dict] = None) -> Tuple[Optional[str], Optional[Credential]]:
+        """
+        请求的缓存身份（不同 Token 可能看到不同数据的请求按响应它的 Token 区分缓存）
+
+        仓库请求会路由到能访问该仓库的 Token，整个池看到的数据相同，以池的 Token 集合为身份；
+        搜索、用户仓库列表等请求的结果取决于 Token 的权限（是否包含私有仓库）：所有者指定给了某些 Token 时
+        路由到这些 Token 并以它们为身份，否则固定使用路由选择的 Token 发送请求，并以该 Token 为身份
+
+        Args:
+            url: 请求 URL
+            params: 请求参数
+
+        Returns:
+            (身份, 需要固定使用的凭据（不需要时为 None）)
+        """
+        repository, owner = _target_of(url, params)
+        if repository is not None or len(self.credentials) == 1:
+            return self.identity, None
+        scoped = sorted(credential.token for credential in self.credentials if owner and owner in credential.owners and credential.token)
+        if scoped:
+            return "\n".join(scoped), None
+        credential = self.route(url, params)
+        return credential.token, credential
+
+    def _choose(self, url: str, resource: str, exclude: Sequence[Credential], params: Optional[Dict] = None, prefer: Optional[Credential] = None) -> Optional[Credential]:
+        """选择凭据（调用方持有锁）"""
+        repository, owner = _target_of(url, params)
+        now = time.time()
+        candidates = [credential for credential in self.credentials if credential not in exclude]
+        if not candidates:
+            return None
+        available = [credential for credential in candidates if credential.buckets[resource].cooldown_until <= now]
+        if not available:
+            return min(candidates, key=lambda credential: credential.buckets[resource].cooldown_until)
+        preferred = prefer if prefer is not None else self._affinity.get(repository) if repository else None
+        if preferred in available:
+            return preferred
+        scoped = [credential for credential in available if owner and owner in credential.owners]
+        return max(
+            scoped or available,
+            key=lambda credential: (credential.estimated_remaining(resource), -credential.requests)
+        )
+
+    def release(self, credential: Credential, url: str, status: Optional[int], headers: Optional[Any] = None, data: Any = None, retried: bool = False):
+        """
+        请求结束后更新凭据的额度、冷却状态和仓库路由
+
+        Args:
+            credential: acquire 返回的凭据
+            url: 请求 URL
+            status: HTTP 状态码，请求未得到响应时为 None
+            headers: 响应头
+            data: 响应数据（用于识别私有仓库）
+            retried: 本次请求是否在其他凭据返回 404 后重试
+        """
+        resource = _resource_type(url)
+        headers = headers or {}
+        now = time.time()
+        with self._lock:
+            credential.buckets[resource].inflight -= 1
+            header_resource = headers.get("X-RateLimit-Resource")
+            bucket = credential.buckets.get(header_resource, credential.buckets[resource])
+            for key in ("limit", "remaining", "reset"):
+                value = headers.get(f"X-RateLimit-{key.capitalize()}")
+                if value is not None and value.isdigit():
+                    setattr(bucket, key, int(value))
+
+            if status is None or status >= 400:
+                credential.failures += 1
+            if status == 401:
+                # 凭据无效或已过期，所有类别都停用
+                for item in credential.buckets.values():
+                    item.cooldown_until = now + _INVALID_TOKEN_COOLDOWN
+            elif status in (403, 429) and (bucket.remaining == 0 or headers.get("Retry-After")):
+                # 额度耗尽或触发二级限流
+                retry_after = headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    bucket.cooldown_until = now + int(retry_after)
+                else:
+                    bucket.cooldown_until = bucket.reset or now + _DEFAULT_COOLDOWN
+            elif bucket.remaining == 0:
+                bucket.cooldown_until = bucket.reset or now + _DEFAULT_COOLDOWN
+
+            if status is not None and status < 400 and len(self.credentials) > 1:
+                repository, _ = _repository_of(url)
+                private = isinstance(data, dict) and data.get("private") and data.get("id")
+                if repository and (retried or private):
+                    self._remember(repository, credential)
+                if private:
+                    self._remember(f"repositories/{data['id']}", credential)
+
+    def _remember(self, repository: str, credential: Credential):
+        """记住仓库应使用的凭据（调用方持有锁）"""
+        self._affinity[repository] = credential
+        self._affinity.move_to_end(repository)
+        while len(self._affinity) > _MAX_AFFINITY:
+            self._affinity.popitem(last=False)
+
+    def should_retry(self, url: str, status: int, tried: Sequence[Credential]) -> bool:
+        """
+        请求失败后是否换用其他 Token 重试（还有未尝试的 Token 时）
+
+        Args:
+            url: 请求 URL
+            status: HTTP 状态码
+            tried: 本次请求已经尝试过的凭据
+
+        Returns:
+            404 且可能是当前 Token 无权访问的私有仓库（所有者指定给了未尝试的 Token，或仓库此前被识别为私有仓库），
+            或当前 Token 因限流进入冷却时为 True
+        """
+        if len(tried) >= len(self.credentials):
+            return False
+        if status == 404:
+            repository, owner = _repository_of(url)
+            with self._lock:
+                if repository is not None and repository in self._affinity:
+                    return True
+                return owner is not None and any(
+                    owner in credential.owners for credential in self.credentials if credential not in tried
+                )
+        if status in (401, 403, 429):
+            with self._lock:
+                return tried[-1].buckets[_resource_type(url)].cooldown_until > time.time()
+        return False
+
+    def rate_limit(self, resource: str = "core") -> Dict[str, Optional[int]]:
+        """
+        池的合计速率限制（冷却中的 Token 剩余额度记为 0，尚未观察到响应头的 Token 按默认额度计算）
+
+        Args:
+            resource: 速率限制类别，core 或 search
+
+        Returns:
+            {"limit": int, "remaining": int, "reset": int}，尚未观察到任何响应头时各项为 None
+        """
+        now = time.time()
+        with self._lock:
+            buckets = [(credential, credential.buckets[resource]) for credential in self.credentials]
+            if all(bucket.remaining is None for _, bucket in buckets):
+                return {"limit": None, "remaining": None, "reset": None}
+            limit = remaining = 0
+            resets = []
+            for credential, bucket in buckets:
+                defaults = _DEFAULT_LIMITS if credential.token else _ANONYMOUS_LIMITS
+                limit += bucket.limit if bucket.limit is not None else defaults[resource]
+                if bucket.cooldown_until <= now:
+                    remaining += bucket.remaining if bucket.remaining is not None else defaults[resource]
+                if bucket.reset is not None:
+                    resets.append(bucket.reset)
+            return {"limit": limit, "remaining": remaining, "reset": min(resets) if resets else None}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各 Token 的额度、冷却状态和请求统计"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "token": credential.label,
+                    "owners": sorted(credential.owners),
+                    "requests": credential.requests,
+                    "failures": credential.failures,
+                    "core_remaining": credential.buckets["core"].remaining,
+                    "search_remaining": credential.buckets["search"].remaining,
+                    "core_cooldown_s": max(0, round(credential.buckets["core"].cooldown_until - now)),
+                    "search_cooldown_s": max(0, round(credential.buckets["search"].cooldown_until - now)),
+                    "inflight": sum(bucket.inflight for bucket in credential.buckets.values())
+                }
+                for credential in self.credentials
+            ]
+
+
+_pool: Optional[TokenPool] = None
+_pool_config: Optional[Tuple[Optional[str], Optional[str]]] = None
+_pool_lock = threading.Lock()
+
+
+def get_token_pool() -> TokenPool:
+    """
+    获取进程内共享的 Token 池（首次调用时按环境变量创建，GITHUB_TOKENS / GITHUB_TOKEN 变化时重新创建）
+
+    Returns:
+        TokenPool 实例
+    """
+    global _pool, _pool_config
+    config = (get_env("GITHUB_TOKENS"), get_env("GITHUB_TOKEN"))
+    if _pool is None or config != _pool_config:
+        with _pool_lock:
+            if _pool is None or config != _pool_config:
+                _pool = TokenPool.from_env()
+                _pool_config = config
+    return _pool
@@ -0,0 +1,217 @@
+"""
+HTTP 传输层
+github_api_request 通过 Transport 接口发送请求，不直接依赖具体的 HTTP 客户端：
+    aiohttp  默认实现，HTTP/1.1，高并发时每个并发请求占用一个 TCP 连接
+    http2    基于 httpx + h2 的 HTTP/2 实现，所有并发请求在同一个连接上多路复用（需要安装 httpx[http2]）
+两种实现都声明 Accept-Encoding 并自动解压 gzip / deflate 响应，安装了 brotli 时同时支持 br
+
+配置（环境变量）:
+    GITHUB_HTTP_TRANSPORT  使用的传输实现，aiohttp（默认）或 http2
+明文 http:// 地址（如本地桩服务）没有 ALPN 协商，http2 实现直接以 HTTP/2 连接（prior knowledge）
+"""
+import asyncio
+from typing import Callable, Dict, Mapping, Optional
+
+from ..config import get_env
+
+DEFAULT_TRANSPORT = "aiohttp"
+
+
+class TransportError(Exception):
+    """网络层错误（连接失败、连接被重置、协议错误等），超时另外抛出 asyncio.TimeoutError"""
+
+
+def accept_encoding() -> str:
+    """请求头 Accept-Encoding 的值（只声明能解压的编码）"""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return "gzip, deflate"
+    return "gzip, deflate, br"
+
+
+class TransportResponse:
+    """已完整读取并解压的响应"""
+
+    __slots__ = ("status", "headers", "body", "http_version")
+
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes, http_version: str = "HTTP/1.1"):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.http_version = http_version
+
+    @property
+    def content_type(self) -> str:
+        """不含参数的 MIME 类型（小写）"""
+        return (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+
+    def text(self) -> str:
+        """按 Content-Type 中的字符集（默认 UTF-8）解码响应体"""
+        charset = "utf-8"
+        for param in (self.headers.get("Content-Type") or "").split(";")[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "charset" and value.strip():
+                charset = value.strip().strip('"')
+        try:
+            return self.body.decode(charset, errors="replace")
+        except LookupError:
+            return self.body.decode("utf-8", errors="replace")
+
+
+class Transport:
+    """HTTP 传输接口：一个实例绑定一个事件循环，内部复用连接"""
+
+    name = ""
+
+    @property
+    def closed(self) -> bool:
+        """是否已关闭"""
+        raise NotImplementedError
+
+    async def request(self, method: str, url: str, headers: Dict[str, str], params: Optional[Dict] = None, timeout: float = 30) -> TransportResponse:
+        """
+        发送请求并读取完整的响应体
+
+        Args:
+            method: HTTP 方法
+            url: 完整 URL
+            headers: 请求头
+            params: 查询参数
+            timeout: 总超时（秒）
+
+        Returns:
+            TransportResponse
+
+        Raises:
+            asyncio.TimeoutError: 超时
+            TransportError: 网络层错误
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """关闭传输并释放连接"""
+        raise NotImplementedError
+
+
+class AiohttpTransport(Transport):
+    """基于 aiohttp.ClientSession 的 HTTP/1.1 传输"""
+
+    name = "aiohttp"
+
+    def __init__(self):
+        import aiohttp
+
+        self._aiohttp = aiohttp
+        self._session = aiohttp.ClientSession()
+
+    @property
+    def closed(self) -> bool:
+        return self._session.closed
+
+    async def request(self, method: str, url: str, headers: Dict[str, str], params: Optional[Dict] = None, timeout: float = 30) -> TransportResponse:
+        aiohttp = self._aiohttp
+        try:
+            async with self._session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                params=params or {},
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                body = await response.read()
+                version = f"HTTP/{response.version.major}.{response.version.minor}" if response.version else "HTTP/1.1"
+                return TransportResponse(response.status, response.headers, body, version)
+        except asyncio.TimeoutError:
+            # aiohttp 的超时异常同时继承 ClientError，先按超时处理
+            raise
+        except aiohttp.ClientError as e:
+            raise TransportError(str(e) or type(e).__name__) from e
+
+    async def close(self):
+        await self._session.close()
+
+
+class HttpxTransport(Transport):
+    """基于 httpx 的 HTTP/2 传输（并发请求在同一个连接上多路复用）"""
+
+    name = "http2"
+
+    def __init__(self, prior_knowledge: bool = False):
+        """
+        初始化 HTTP/2 传输
+
+        Args:
+            prior_knowledge: 是否不经协商直接使用 HTTP/2（明文 http:// 地址需要）
+        """
+        try:
+            import httpx
+            import h2  # noqa: F401
+        except ImportError:
+            raise RuntimeError("HTTP/2 传输需要安装 httpx 和 h2：pip install 'httpx[http2]'") from None
+        self._httpx = httpx
+        self._client = httpx.AsyncClient(http1=not prior_knowledge, http2=True, follow_redirects=True, timeout=None)
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    async def request(self, method: str, url: str, headers: Dict[str, str], params: Optional[Dict] = None, timeout: float = 30) -> TransportResponse:
+        httpx = self._httpx
+        try:
+            # httpx 的超时按连接、读取等阶段分别计算，总超时由 asyncio.timeout 控制
+            async with asyncio.timeout(timeout):
+                response = await self._client.request(method, url, headers=headers, params=params or None)
+        except httpx.TimeoutException as e:
+            raise asyncio.TimeoutError(str(e)) from e
+        except httpx.HTTPError as e:
+            raise TransportError(str(e) or type(e).__name__) from e
+        return TransportResponse(response.status_code, response.headers, response.content, response.http_version)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+# 传输名称 -> 工厂函数（参数为 API 基础 URL）
+_TRANSPORTS: Dict[str, Callable[[str], Transport]] = {
+    "aiohttp": lambda base_url: AiohttpTransport(),
+    "http2": lambda base_url: HttpxTransport(prior_knowledge=base_url.startswith("http://"))
+}
+
+
+def register_transport(name: str, factory: Callable[[str], Transport]):
+    """
+    注册自定义传输实现
+
+    Args:
+        name: 传输名称（GITHUB_HTTP_TRANSPORT 的取值）
+        factory: 工厂函数，参数为 API 基础 URL，返回 Transport 实例
+    """
+    _TRANSPORTS[name.lower()] = factory
+
+
+def get_transport_name() -> str:
+    """从环境变量获取使用的传输名称"""
+    return (get_env("GITHUB_HTTP_TRANSPORT", DEFAULT_TRANSPORT) or DEFAULT_TRANSPORT).strip().lower()
+
+
+def create_transport(base_url: str, name: Optional[str] = None) -> Transport:
+    """
+    创建传输实例（需要在使用它的事件循环中调用）
+
+    Args:
+        base_url: API 基础 URL
+        name: 传输名称，不提供时按 GITHUB_HTTP_TRANSPORT 选择
+
+    Returns:
+        Transport 实例
+
+    Raises:
+        ValueError: 未知的传输名称
+    """
+    name = name or get_transport_name()
+    factory = _TRANSPORTS.get(name)
+    if factory is None:
+        raise ValueError(f"未知的 HTTP 传输: {name}（可选: {', '.join(sorted(_TRANSPORTS))}）")
+    return factory(base_url)
+
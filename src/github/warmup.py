@@ -0,0 +1,199 @@
+"""
+启动时的缓存预热
+聊天机器人和 MCP 服务器启动时在后台为配置的仓库（或 GITHUB_USERNAME 最近活跃的仓库）
+预先请求仓库信息、打开的 PR 和最近的提交，写入响应缓存（及本地镜像），当天的第一个问题不必等待冷请求。
+预热以低并发、低优先级执行（标记为预取，速率限制预算不足时停止），不影响正常请求
+
+配置（环境变量）:
+    GITHUB_WARMUP_REPOS        逗号分隔的仓库列表，如 "owner/repo1,owner/repo2"
+    GITHUB_WARMUP_TOP          未配置仓库列表时，预热 GITHUB_USERNAME 最近推送过的前 N 个仓库，默认 0（不预热）
+    GITHUB_WARMUP_CONCURRENCY  同时进行的预热请求数，默认 2
+预热结果在缓存有效期（GITHUB_CACHE_TTL）内有效，配合 Webhook 更新缓存时可设置较长的有效期
+"""
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..config import get_env
+from .cache import get_response_cache, prefetching
+from .prefetch import rate_limit_allows
+from .server import (
+    get_github_username,
+    github_api_request,
+    search_repository_by_url,
+    get_pull_requests_by_repo_id,
+    get_commits_by_repo_id
+)
+
+
+def warmup_settings() -> Optional[Dict[str, Any]]:
+    """
+    读取预热配置
+
+    Returns:
+        {"repos": list, "top": int, "concurrency": int}，未配置预热或缓存被禁用时返回 None
+    """
+    repos = [repo.strip() for repo in (get_env("GITHUB_WARMUP_REPOS") or "").split(",") if repo.strip()]
+    top = int(get_env("GITHUB_WARMUP_TOP", "0") or 0)
+    if not repos and not (top > 0 and get_github_username()):
+        return None
+    if not get_response_cache().enabled:
+        return None
+    return {
+        "repos": repos,
+        "top": top,
+        "concurrency": max(1, int(get_env("GITHUB_WARMUP_CONCURRENCY", "2")))
+    }
+
+
+async def _top_repositories(username: str, top: int) -> List[str]:
+    """用户最近推送过的前 top 个仓库（owner/repo）"""
+    result = await github_api_request(f"/users/{username}/repos", params={"sort": "pushed", "per_page": min(100, top), "type": "owner"})
+    if not result["success"]:
+        return []
+    return [repo["full_name"] for repo in result["data"][:top]]
+
+
+async def warm_up(repos: Optional[List[str]] = None, top: int = 0, concurrency: int = 2) -> Dict:
+    """
+    预热仓库信息、打开的 PR 和最近的提交（请求参数与工具的默认参数相同，工具调用可以直接命中缓存）
+
+    Args:
+        repos: 仓库列表（owner/repo），不提供时使用 GITHUB_USERNAME 最近推送过的前 top 个仓库
+        top: 未提供仓库列表时预热的仓库数
+        concurrency: 同时进行的请求数
+
+    Returns:
+        包含预热结果和状态的字典:
+        {
+            "success": bool,
+            "data": {
+                "repositories": [
+                    {"repo": str, "repository_id": int, "success": bool, "error": str}
+                ],
+                "requests": int,         # 发起的预热请求数
+                "failed": int,           # 失败的请求数
+                "skipped_budget": int,   # 因速率限制预算不足跳过的请求数
+                "elapsed_ms": float      # 预热总耗时
+            },
+            "error": str,
+            "status_code": int
+        }
+    """
+    started = time.perf_counter()
+    # 预热请求标记为预取：缓存统计中单独计算命中和浪费
+    prefetching.set(True)
+    username = get_github_username()
+    if not repos and username and top > 0:
+        repos = await _top_repositories(username, top)
+    repos = repos or []
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    stats = {"requests": 0, "failed": 0, "skipped_budget": 0}
+
+    async def request(func: Callable[..., Awaitable[Dict]], *args) -> Optional[Dict]:
+        # 让出一次事件循环，优先处理正在等待的正常请求
+        await asyncio.sleep(0)
+        async with semaphore:
+            if not rate_limit_allows():
+                stats["skipped_budget"] += 1
+                return None
+            stats["requests"] += 1
+            result = await func(*args)
+        if not result["success"]:
+            stats["failed"] += 1
+        return result
+
+    async def warm_repository(full_name: str) -> Dict:
+        entry = {"repo": full_name, "repository_id": None, "success": False, "error": None}
+        lookup = await request(search_repository_by_url, full_name)
+        if lookup is None or not lookup["success"]:
+            entry["error"] = lookup["error"] if lookup else "速率限制预算不足"
+            return entry
+        # 精确查询未命中时会退化为模糊搜索，只接受名称完全一致的仓库
+        matches = [repo for repo in lookup["data"]["repositories"] if repo["full_name"].lower() == full_name.lower()]
+        if not matches:
+            entry["error"] = "仓库不存在或无权访问"
+            return entry
+        repo_id = matches[0]["id"]
+        entry["repository_id"] = repo_id
+        follow_ups = [request(get_pull_requests_by_repo_id, repo_id), request(get_commits_by_repo_id, repo_id)]
+        owner, name = full_name.split("/", 1)
+        if username and owner.lower() == username.lower():
+            # 设置了 GITHUB_USERNAME 时用户通常只输入仓库名，预热按名称的搜索
+            follow_ups.append(request(search_repository_by_url, name))
+        results = await asyncio.gather(*follow_ups)
+        errors = [result["error"] for result in results if result is not None and not result["success"]]
+        entry["success"] = not errors
+        entry["error"] = errors[0] if errors else None
+        return entry
+
+    repositories = await asyncio.gather(*[warm_repository(repo) for repo in repos])
+    return {
+        "success": True,
+        "data": {
+            "repositories": list(repositories),
+            **stats,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        },
+        "error": None,
+        "status_code": 200
+    }
+
+
+def format_report(result: Dict) -> str:
+    """
+    将预热结果格式化为一行文本
+
+    Args:
+        result: warm_up 的返回值
+
+    Returns:
+        文本
+    """
+    data = result["data"]
+    repositories = data["repositories"]
+    succeeded = sum(1 for repo in repositories if repo["success"])
+    line = (
+        f"[预热] {succeeded}/{len(repositories)} 个仓库，{data['requests']} 个请求（失败 {data['failed']}），"
+        f"耗时 {data['elapsed_ms']} ms"
+    )
+    if data["skipped_budget"]:
+        line += f"，{data['skipped_budget']} 个请求因速率限制预算不足跳过"
+    failed = [f"{repo['repo']}（{repo['error']}）" for repo in repositories if not repo["success"]]
+    if failed:
+        line += "；失败: " + "，".join(failed)
+    return line
+
+
+_started = False
+
+
+def start_warm_up(report: Optional[Callable[[str], Any]] = print) -> Optional[asyncio.Task]:
+    """
+    按环境变量配置在当前事件循环上启动后台预热（不等待完成，进程内只执行一次，
+    批量对话中多个 ChatBot 共享同一个缓存时不会重复预热）
+
+    Args:
+        report: 预热完成后接收结果文本的函数（如 print），None 表示不输出
+
+    Returns:
+        预热任务，未配置预热或已经预热过时返回 None
+    """
+    global _started
+    settings = warmup_settings()
+    if settings is None or _started:
+        return None
+    _started = True
+    # 使用全新的上下文：不继承调用方的截止时间，预取标记也不影响调用方
+    task = asyncio.get_running_loop().create_task(
+        warm_up(settings["repos"], settings["top"], settings["concurrency"]),
+        context=contextvars.Context()
+    )
+    if report is not None:
+        def done(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is None:
+                report(format_report(task.result()))
+        task.add_done_callback(done)
+    return task
@@ -0,0 +1,423 @@
+"""
+GitHub Webhook 接收端
+校验签名后处理 push、pull_request 和 repository 事件，原地更新或失效受影响的响应缓存条目和本地镜像记录，
+配置 Webhook 后可以为响应缓存设置较长的有效期（GITHUB_CACHE_TTL）而不会长时间读到过期数据。
+缓存和镜像在进程内，接收端需要与使用它们的 MCP 服务器运行在同一进程（设置 GITHUB_WEBHOOK_PORT 即随服务器启动）
+
+用法:
+    GITHUB_WEBHOOK_SECRET=secret GITHUB_WEBHOOK_PORT=8780 python -m src.mcp.gitcode_mcp
+    python -m src.github.webhook replay scripts/webhook_recordings/push.json scripts/webhook_recordings/pull_request.json
+    python -m src.github.webhook replay scripts/webhook_recordings/*.json --url http://127.0.0.1:8780/webhook
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import get_env
+from .cache import get_response_cache
+from .git_backend import get_git_backend, git_backend_enabled
+from .mirror import get_mirror
+
+# 接收端路径
+WEBHOOK_PATH = "/webhook"
+
+# 处理的事件类型
+EVENTS = ("push", "pull_request", "repository")
+
+# 变更文件可能发生变化的 pull_request 事件动作
+_FILES_CHANGING_ACTIONS = ("opened", "reopened", "synchronize", "edited")
+
+# 各事件处理时直接读取的字段（点分路径），缺少时拒绝该事件
+_REPOSITORY_FIELDS = ("repository.id", "repository.full_name")
+_REQUIRED_FIELDS = {
+    "push": _REPOSITORY_FIELDS,
+    "pull_request": ("repository.id",) + tuple(
+        f"pull_request.{field}" for field in (
+            "number", "title", "state", "html_url", "user.login", "user.avatar_url",
+            "created_at", "updated_at", "head.ref", "head.sha", "base.ref", "base.sha"
+        )
+    ),
+    "repository": _REPOSITORY_FIELDS
+}
+
+
+def sign(secret: str, body: bytes) -> str:
+    """
+    计算请求体的签名（X-Hub-Signature-256 请求头的值）
+
+    Args:
+        secret: Webhook 密钥
+        body: 原始请求体
+
+    Returns:
+        "sha256=<hex>" 格式的签名
+    """
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    校验请求签名（常数时间比较）
+
+    Args:
+        secret: Webhook 密钥
+        body: 原始请求体
+        signature: X-Hub-Signature-256 请求头的值
+
+    Returns:
+        签名是否有效
+    """
+    if not signature:
+        return False
+    return hmac.compare_digest(sign(secret, body), signature)
+
+
+def validate_payload(event: str, payload: Any) -> List[str]:
+    """
+    检查事件内容是否包含处理所需的字段
+
+    Args:
+        event: 事件类型
+        payload: 事件内容
+
+    Returns:
+        错误信息列表，为空表示有效（不支持的事件类型不检查字段）
+    """
+    if not isinstance(payload, dict):
+        return ["事件内容必须是 JSON 对象"]
+    errors = []
+    for path in _REQUIRED_FIELDS.get(event, ()):
+        value: Any = payload
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is None:
+            errors.append(f"缺少字段 {path}")
+    repository = payload.get("repository")
+    full_name = repository.get("full_name") if isinstance(repository, dict) else None
+    if event in _REQUIRED_FIELDS and full_name is not None and (not isinstance(full_name, str) or "/" not in full_name):
+        errors.append(f"repository.full_name 格式无效: {full_name!r}")
+    if event == "push":
+        commits = payload.get("commits") or []
+        if not isinstance(commits, list) or not all(isinstance(commit, dict) and commit.get("id") for commit in commits):
+            errors.append("commits 必须是包含 id 字段的提交列表")
+    return errors
+
+
+def _repository_keys(repo_id: int, full_name: Optional[str]) -> List[str]:
+    """仓库的全部缓存键片段（按 ID 的 /repositories/{id} 和按名称的 /repos/{owner}/{repo} 路径）"""
+    keys = [f"/repositories/{repo_id}/", f"/repositories/{repo_id}?"]
+    if full_name:
+        keys += [f"/repos/{full_name}/", f"/repos/{full_name}?"]
+    return keys
+
+
+def _replace_data(data: Any) -> Callable[[Dict], Dict]:
+    """生成将缓存响应中的 data 替换为事件中对象的更新函数"""
+    return lambda value: dict(value, data=data)
+
+
+def _format_push_commit(commit: Dict) -> Dict:
+    """将 push 事件中的提交转换为 get_commits_by_repo_id 的统一格式"""
+    author = commit.get("author") or {}
+    committer = commit.get("committer") or {}
+    return {
+        "sha": commit["id"],
+        "message": commit.get("message", ""),
+        "author": {"name": author.get("name", ""), "email": author.get("email", ""), "date": commit.get("timestamp", "")},
+        "committer": {"name": committer.get("name", ""), "email": committer.get("email", ""), "date": commit.get("timestamp", "")},
+        "url": commit.get("url", ""),
+        "html_url": commit.get("url", ""),
+        "stats": {},
+        "files": []
+    }
+
+
+def _handle_push(payload: Dict, summary: Dict):
+    """push：新提交写入镜像，提交列表和仓库详情（pushed_at）失效，本地 git 克隆标记为过期"""
+    repository = payload["repository"]
+    repo_id = repository["id"]
+    cache = get_response_cache()
+    commits = [_format_push_commit(commit) for commit in payload.get("commits") or []]
+    if commits:
+        summary["mirrored"] += get_mirror().record_commits(repo_id, commits)
+    summary["invalidated"] += cache.invalidate(f"/repositories/{repo_id}/commits")
+    summary["invalidated"] += cache.invalidate(f"/repos/{repository['full_name']}?", ignore_case=True)
+    if git_backend_enabled():
+        # 本地 git 后端的克隆在下次查询时立即 fetch
+        get_git_backend().mark_stale(repo_id)
+
+
+def _handle_pull_request(payload: Dict, summary: Dict):
+    """pull_request：PR 详情原地更新并写入镜像，PR 列表失效，代码变化时变更文件失效"""
+    from .server import _format_pull_request
+
+    repo_id = payload["repository"]["id"]
+    pr = payload["pull_request"]
+    number = pr["number"]
+    cache = get_response_cache()
+    summary["mirrored"] += get_mirror().record_pull_requests(repo_id, [_format_pull_request(pr)])
+    summary["updated"] += cache.update(f"/repositories/{repo_id}/pulls/{number}?", _replace_data(pr))
+    summary["invalidated"] += cache.invalidate(f"/repositories/{repo_id}/pulls?")
+    if payload.get("action") in _FILES_CHANGING_ACTIONS:
+        summary["invalidated"] += cache.invalidate(f"/repositories/{repo_id}/pulls/{number}/files?")
+
+
+def _handle_repository(payload: Dict, summary: Dict):
+    """repository：仓库详情原地更新；删除、改名或转移时失效相关条目，删除时同时清除镜像数据"""
+    repository = payload["repository"]
+    repo_id = repository["id"]
+    full_name = repository["full_name"]
+    action = payload.get("action")
+    cache = get_response_cache()
+
+    if action == "deleted":
+        for key in _repository_keys(repo_id, full_name):
+            summary["invalidated"] += cache.invalidate(key, ignore_case=True)
+        summary["mirrored"] += get_mirror().delete_repository(repo_id)
+    elif action in ("renamed", "transferred"):
+        changes = payload.get("changes") or {}
+        owner, name = full_name.split("/", 1)
+        old_name = ((changes.get("repository") or {}).get("name") or {}).get("from", name)
+        old_owner_info = (changes.get("owner") or {}).get("from") or {}
+        old_owner = (old_owner_info.get("user") or old_owner_info.get("organization") or {}).get("login", owner)
+        for old_full_name in {f"{old_owner}/{old_name}", full_name}:
+            summary["invalidated"] += cache.invalidate(f"/repos/{old_full_name}/", ignore_case=True)
+            summary["invalidated"] += cache.invalidate(f"/repos/{old_full_name}?", ignore_case=True)
+    else:
+        summary["updated"] += cache.update(f"/repos/{full_name}?", _replace_data(repository), ignore_case=True)
+    # 搜索结果中包含仓库元数据（名称、描述、Star 数等）
+    summary["invalidated"] += cache.invalidate("/search/repositories?")
+
+
+_HANDLERS = {
+    "push": _handle_push,
+    "pull_request": _handle_pull_request,
+    "repository": _handle_repository
+}
+
+
+def handle_event(event: str, payload: Dict) -> Dict:
+    """
+    处理一个 Webhook 事件
+
+    Args:
+        event: 事件类型（X-GitHub-Event 请求头）
+        payload: 事件内容
+
+    Returns:
+        处理结果:
+        {
+            "event": str,
+            "action": str,
+            "repository_id": int,
+            "handled": bool,      # 是否为支持的事件类型
+            "updated": int,       # 原地更新的缓存条目数
+            "invalidated": int,   # 失效的缓存条目数
+            "mirrored": int       # 写入（或删除）的镜像记录数
+        }
+
+    Raises:
+        ValueError: 支持的事件类型缺少处理所需的字段
+    """
+    errors = validate_payload(event, payload)
+    if errors:
+        raise ValueError("; ".join(errors))
+    summary = {
+        "event": event,
+        "action": payload.get("action"),
+        "repository_id": (payload.get("repository") or {}).get("id"),
+        "handled": event in _HANDLERS,
+        "updated": 0,
+        "invalidated": 0,
+        "mirrored": 0
+    }
+    if event in _HANDLERS:
+        _HANDLERS[event](payload, summary)
+    return summary
+
+
+def create_app(secret: Optional[str] = None):
+    """
+    创建 Webhook 接收端的 Flask 应用
+
+    Args:
+        secret: Webhook 密钥，默认读取环境变量 GITHUB_WEBHOOK_SECRET
+
+    Returns:
+        Flask 应用（POST /webhook 接收事件）
+
+    Raises:
+        ValueError: 未配置密钥
+    """
+    from flask import Flask, jsonify, request
+
+    secret = secret or get_env("GITHUB_WEBHOOK_SECRET")
+    if not secret:
+        raise ValueError("未配置 Webhook 密钥，请设置环境变量 GITHUB_WEBHOOK_SECRET")
+
+    app = Flask(__name__)
+    # 最近处理过的投递 ID，GitHub 重新投递同一事件时直接返回
+    deliveries: "OrderedDict[str, Dict]" = OrderedDict()
+    lock = threading.Lock()
+
+    @app.post(WEBHOOK_PATH)
+    def receive():
+        body = request.get_data()
+        if not verify_signature(secret, body, request.headers.get("X-Hub-Signature-256")):
+            return jsonify({"error": "签名无效"}), 401
+        event = request.headers.get("X-GitHub-Event")
+        if not event:
+            return jsonify({"error": "缺少 X-GitHub-Event 请求头"}), 400
+        if event == "ping":
+            return jsonify({"event": "ping", "handled": True})
+
+        delivery = request.headers.get("X-GitHub-Delivery")
+        with lock:
+            if delivery and delivery in deliveries:
+                return jsonify(dict(deliveries[delivery], duplicate=True))
+
+        try:
+            if request.mimetype == "application/x-www-form-urlencoded":
+                payload = json.loads(request.form["payload"])
+            else:
+                payload = json.loads(body)
+        except (KeyError, ValueError):
+            return jsonify({"error": "请求体不是有效的事件 JSON"}), 400
+        errors = validate_payload(event, payload)
+        if errors:
+            return jsonify({"error": "事件内容无效: " + "; ".join(errors)}), 400
+
+        summary = handle_event(event, payload)
+        if delivery:
+            with lock:
+                deliveries[delivery] = summary
+                while len(deliveries) > 256:
+                    deliveries.popitem(last=False)
+        return jsonify(summary), 200 if summary["handled"] else 202
+
+    return app
+
+
+def start_webhook_server(host: str = "127.0.0.1", port: int = 8780, secret: Optional[str] = None):
+    """
+    在后台线程中启动 Webhook 接收端（与缓存和镜像在同一进程）
+
+    Args:
+        host: 监听地址
+        port: 监听端口
+        secret: Webhook 密钥，默认读取环境变量 GITHUB_WEBHOOK_SECRET
+
+    Returns:
+        werkzeug 服务器实例（调用 shutdown() 停止）
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, create_app(secret), threaded=True)
+    threading.Thread(target=server.serve_forever, name="github-webhook", daemon=True).start()
+    return server
+
+
+def load_recording(path: str, event: Optional[str] = None) -> Dict:
+    """
+    读取录制的事件
+
+    Args:
+        path: JSON 文件，格式为 {"event": str, "payload": dict}（可带 "headers"），
+              或仅包含事件内容（此时需要提供 event）
+        event: 事件类型，覆盖文件中的类型
+
+    Returns:
+        {"event": str, "delivery": str, "payload": dict}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        record = json.load(f)
+    headers = record.get("headers") or {}
+    if "payload" in record:
+        payload = record["payload"]
+        event = event or record.get("event") or headers.get("X-GitHub-Event")
+    else:
+        payload = record
+    if not event:
+        raise ValueError(f"{path}: 未指定事件类型（文件中没有 event 字段时使用 --event 指定）")
+    return {"event": event, "delivery": headers.get("X-GitHub-Delivery"), "payload": payload}
+
+
+def replay(paths: List[str], url: Optional[str] = None, secret: Optional[str] = None, event: Optional[str] = None) -> List[Dict]:
+    """
+    回放录制的事件（请求带签名，经过与真实投递相同的校验和处理流程）
+
+    Args:
+        paths: 录制文件路径
+        url: 接收端地址，不提供时在本进程内处理（使用 Flask 测试客户端）
+        secret: Webhook 密钥，默认读取环境变量 GITHUB_WEBHOOK_SECRET；本进程内处理且未配置时使用随机密钥
+        event: 事件类型，覆盖录制文件中的类型
+
+    Returns:
+        每个事件的 {"path", "status", "response"}
+    """
+    secret = secret or get_env("GITHUB_WEBHOOK_SECRET")
+    if url is None:
+        secret = secret or secrets.token_hex(16)
+        client = create_app(secret).test_client()
+    elif not secret:
+        raise ValueError("回放到远程接收端需要 Webhook 密钥，请设置环境变量 GITHUB_WEBHOOK_SECRET")
+
+    results = []
+    for path in paths:
+        recording = load_recording(path, event)
+        body = json.dumps(recording["payload"]).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "X-GitHub-Event": recording["event"],
+            "X-Hub-Signature-256": sign(secret, body)
+        }
+        if recording["delivery"]:
+            headers["X-GitHub-Delivery"] = recording["delivery"]
+        if url is None:
+            response = client.post(WEBHOOK_PATH, data=body, headers=headers)
+            status, content = response.status_code, response.get_json()
+        else:
+            status, content = _post(url, body, headers)
+        results.append({"path": path, "status": status, "response": content})
+    return results
+
+
+def _post(url: str, body: bytes, headers: Dict[str, str]):
+    """向远程接收端发送事件，返回 (状态码, 响应 JSON)"""
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    try:
+        with urlopen(Request(url, data=body, headers=headers, method="POST"), timeout=30) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口：启动接收端或回放录制的事件"""
+    parser = argparse.ArgumentParser(description="GitHub Webhook 接收端")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="启动接收端（缓存和镜像只在本进程内有效，通常随 MCP 服务器启动）")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认 127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8780, help="监听端口，默认 8780")
+    replay_parser = subparsers.add_parser("replay", help="回放录制的事件")
+    replay_parser.add_argument("paths", nargs="+", help="录制的事件 JSON 文件")
+    replay_parser.add_argument("--url", help=f"接收端地址（如 http://127.0.0.1:8780{WEBHOOK_PATH}），默认在本进程内处理")
+    replay_parser.add_argument("--event", choices=EVENTS + ("ping",), help="事件类型，文件中没有 event 字段时必须指定")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        create_app().run(host=args.host, port=args.port)
+        return
+    for result in replay(args.paths, url=args.url, event=args.event):
+        print(f"{result['path']}: HTTP {result['status']} {json.dumps(result['response'], ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 """
 MCP 服务模块
 """
-from .gitcode_mcp import mcp
 
 __all__ = ['mcp']
 
+
+def __getattr__(name):
+    # 延迟导入，避免只使用 github_tools 时也加载 fastmcp 和 MCP 服务器
+    if name == 'mcp':
+        from .gitcode_mcp import mcp
+        return mcp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
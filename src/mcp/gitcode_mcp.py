@@ -1,17 +1,82 @@
 """
 GitCode MCP 服务器
 使用 FastMCP 将 GitHub API 客户端封装为 MCP 服务
+所有工具通过 github_tools 的工具注册表调用，与 Function Calling 共用同一套参数校验和规范化
 """
-from fastmcp import FastMCP
-from ..github.server import (
-    search_repository_by_url,
-    get_pull_requests_by_repo_id,
-    get_pull_request_files_by_repo_id,
-    get_commits_by_repo_id
-)
+import sys
+from contextlib import asynccontextmanager
+from fastmcp import FastMCP, Context
+from typing import Awaitable, Callable, Optional
+from ..config import load_config, get_env
+from ..github.server import enable_session_pool, close_session_pool
+from ..github.warmup import start_warm_up
+from .github_tools import registry
+
+
+@asynccontextmanager
+async def _lifespan(server: FastMCP):
+    """
+    服务器运行期间在其事件循环上复用 GitHub 连接池（否则每个请求都会新建连接）；
+    设置了 GITHUB_WEBHOOK_PORT 时同时在后台线程启动 Webhook 接收端，用于更新和失效缓存；
+    配置了预热（GITHUB_WARMUP_REPOS / GITHUB_WARMUP_TOP）时在后台预热缓存
+    """
+    enable_session_pool()
+    # stdio 传输占用标准输出，预热结果输出到标准错误
+    warmup_task = start_warm_up(report=lambda line: print(line, file=sys.stderr))
+    webhook_server = None
+    webhook_port = get_env("GITHUB_WEBHOOK_PORT")
+    if webhook_port:
+        from ..github.webhook import start_webhook_server
+        webhook_server = start_webhook_server(get_env("GITHUB_WEBHOOK_HOST", "127.0.0.1"), int(webhook_port))
+    try:
+        yield {}
+    finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+        if webhook_server is not None:
+            webhook_server.shutdown()
+        await close_session_pool()
+
 
 # 创建 FastMCP 实例
-mcp = FastMCP(name="gitcode")
+mcp = FastMCP(name="gitcode", lifespan=_lifespan)
+
+
+def _tool_timeout() -> Optional[float]:
+    """
+    单次工具调用的超时（秒），由环境变量 MCP_TOOL_TIMEOUT 配置，默认 60，设为 0 表示不限时
+    
+    Returns:
+        超时秒数或 None
+    """
+    timeout = float(get_env("MCP_TOOL_TIMEOUT", "60"))
+    return timeout if timeout > 0 else None
+
+
+def _sync_progress(ctx: Context, sync_pages: int) -> Callable[[dict], Awaitable[None]]:
+    """
+    创建同步镜像数据时的进度回调：PR 和提交各 sync_pages 页，每个页请求完成时推送进度
+    
+    Args:
+        ctx: 工具调用的上下文
+        sync_pages: 每类数据同步的页数
+    
+    Returns:
+        传给 sync_repository 的 on_page 回调
+    """
+    total = sync_pages * 2
+    completed = 0
+    kinds = {"pull_requests": "PR", "commits": "提交"}
+    
+    async def on_page(entry: dict):
+        nonlocal completed
+        completed += 1
+        status = f"{entry['total']} 条" if entry["success"] else f"失败: {entry['error']}"
+        message = f"同步{kinds[entry['kind']]}第 {entry['page']} 页: {status}"
+        await ctx.report_progress(completed, total, message)
+        await ctx.info(f"[{completed}/{total}] {message}")
+    
+    return on_page
 
 
 @mcp.tool()
@@ -39,13 +104,13 @@ async def search_repository(
     Returns:
         包含搜索结果和状态的字典
     """
-    return await search_repository_by_url(
-        repo_url=repo_url,
-        per_page=per_page,
-        page=page,
-        sort=sort,
-        order=order
-    )
+    return await registry.call("search_repository_by_url", {
+        "repo_url": repo_url,
+        "per_page": per_page,
+        "page": page,
+        "sort": sort,
+        "order": order
+    }, timeout=_tool_timeout())
 
 
 @mcp.tool()
@@ -71,35 +136,64 @@ async def get_pull_requests(
     Returns:
         包含 Pull Requests 数据和状态的字典
     """
-    return await get_pull_requests_by_repo_id(
-        repo_id=repo_id,
-        state=state,
-        per_page=per_page,
-        page=page,
-        sort=sort,
-        direction=direction
-    )
+    return await registry.call("get_pull_requests_by_repo_id", {
+        "repo_id": repo_id,
+        "state": state,
+        "per_page": per_page,
+        "page": page,
+        "sort": sort,
+        "direction": direction
+    }, timeout=_tool_timeout())
 
 
 @mcp.tool()
 async def get_pull_request_files(
     repo_id: int,
-    pr_number: int
+    pr_number: int,
+    ctx: Context,
+    include_patch: bool = True,
+    max_files: Optional[int] = None,
+    stream_pages: bool = False
 ) -> dict:
     """
-    根据仓库 ID 和 Pull Request 编号获取变更文件和变更内容
+    根据仓库 ID 和 Pull Request 编号获取变更文件和变更内容（分页读取全部文件，GitHub 最多列出 3000 个），
+    每读取一页推送进度；stream_pages 为 True 时同时以日志通知推送该页的摘要（extra.filenames、extra.additions、extra.deletions）
     
     Args:
         repo_id: 仓库 ID（整数）
         pr_number: Pull Request 编号（整数）
+        include_patch: 是否返回每个文件的补丁内容，默认 True
+        max_files: 最多返回的文件数（统计数据仍包含全部文件），默认 300，最大 3000
+        stream_pages: 是否每读取一页推送该页的摘要（文件名和行数统计，不含补丁），默认 False
     
     Returns:
         包含变更文件数据和状态的字典
     """
-    return await get_pull_request_files_by_repo_id(
-        repo_id=repo_id,
-        pr_number=pr_number
-    )
+    received = 0
+    
+    async def on_page(page: dict):
+        nonlocal received
+        files = page["files"]
+        received += len(files)
+        message = f"第 {page['page']}/{page['pages']} 页: {len(files)} 个文件"
+        await ctx.report_progress(page["page"], page["pages"], message)
+        if not stream_pages or not files:
+            # 未开启或超过 max_files 后只推送进度
+            return
+        # 只推送本页摘要（文件名和行数统计），完整文件和补丁只在最终结果中返回一次
+        await ctx.info(f"[{received}/{page['changed_files']}] {message}", extra={
+            "page": page["page"],
+            "filenames": [file["filename"] for file in files],
+            "additions": sum(file["additions"] for file in files),
+            "deletions": sum(file["deletions"] for file in files)
+        })
+    
+    return await registry.call("get_pull_request_files_by_repo_id", {
+        "repo_id": repo_id,
+        "pr_number": pr_number,
+        "include_patch": include_patch,
+        "max_files": max_files
+    }, timeout=_tool_timeout(), on_page=on_page)
 
 
 @mcp.tool()
@@ -129,19 +223,177 @@ async def get_commits(
     Returns:
         包含提交数据和状态的字典
     """
-    return await get_commits_by_repo_id(
-        repo_id=repo_id,
-        sha=sha,
-        path=path,
-        author=author,
-        since=since,
-        until=until,
-        per_page=per_page,
-        page=page
-    )
+    return await registry.call("get_commits_by_repo_id", {
+        "repo_id": repo_id,
+        "sha": sha,
+        "path": path,
+        "author": author,
+        "since": since,
+        "until": until,
+        "per_page": per_page,
+        "page": page
+    }, timeout=_tool_timeout())
+
+
+@mcp.tool()
+async def search_history(
+    query: str,
+    ctx: Context,
+    repo_id: int | None = None,
+    kind: str = "all",
+    limit: int = 10,
+    sync_pages: int = 0
+) -> dict:
+    """
+    全文检索提交消息和 Pull Request 标题/正文（同步数据时每个页请求完成时推送进度）
+    
+    Args:
+        query: 搜索关键词，多个关键词用空格分隔
+        repo_id: 可选的仓库 ID 过滤
+        kind: 检索范围，可选值: all, pull_request, commit，默认 all
+        limit: 返回结果数量上限，默认 10
+        sync_pages: 检索前从 GitHub 同步的页数（每页 100 条），需要提供 repo_id，默认 0
+    
+    Returns:
+        包含按相关度排序的检索结果和状态的字典
+    """
+    return await registry.call("search_commits_and_pull_requests", {
+        "query": query,
+        "repo_id": repo_id,
+        "kind": kind,
+        "limit": limit,
+        "sync_pages": sync_pages
+    }, timeout=_tool_timeout(), on_page=_sync_progress(ctx, sync_pages))
+
+
+@mcp.tool()
+async def get_analytics(
+    repo_id: int,
+    ctx: Context,
+    metric: str = "merge_time",
+    since: str | None = None,
+    until: str | None = None,
+    top_n: int = 10,
+    sync_pages: int = 0
+) -> dict:
+    """
+    计算仓库的聚合分析指标（PR 合并耗时、贡献者排行、提交时间分布），同步数据时每个页请求完成时推送进度
+    
+    Args:
+        repo_id: 仓库 ID（整数）
+        metric: 分析指标，可选值: merge_time, top_contributors, commits_by_weekday, commits_by_hour，默认 merge_time
+        since: 只统计此日期之后的数据（ISO 8601 格式）
+        until: 只统计此日期之前的数据（ISO 8601 格式）
+        top_n: 贡献者排行返回数量，默认 10
+        sync_pages: 计算前从 GitHub 同步的页数（每页 100 条），默认 0
+    
+    Returns:
+        包含分析结果和状态的字典
+    """
+    return await registry.call("get_repository_analytics", {
+        "repo_id": repo_id,
+        "metric": metric,
+        "since": since,
+        "until": until,
+        "top_n": top_n,
+        "sync_pages": sync_pages
+    }, timeout=_tool_timeout(), on_page=_sync_progress(ctx, sync_pages))
+
+
+@mcp.tool()
+async def batch_query_repositories(
+    repos: list[str],
+    ctx: Context,
+    operation: str = "pull_requests",
+    state: str = "open",
+    author: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    per_page: int = 30,
+    concurrency: int = 8,
+    max_items: int = 100
+) -> dict:
+    """
+    在多个仓库上并发查询 Pull Requests 或提交，每个仓库完成时推送进度
+    
+    Args:
+        repos: 仓库 ID 或名称（owner/repo、URL）列表
+        operation: 查询类型，可选值: pull_requests, commits，默认 pull_requests
+        state: PR 状态（仅 pull_requests），可选值: open, closed, all，默认 open
+        author: 只返回指定作者的提交（仅 commits）
+        since: 只返回此日期之后的提交（仅 commits，ISO 8601 格式）
+        until: 只返回此日期之前的提交（仅 commits，ISO 8601 格式）
+        per_page: 每个仓库返回的数量，默认 30
+        concurrency: 最大并发仓库数，默认 8
+        max_items: 合并结果中保留的最大条目数，默认 100
+    
+    Returns:
+        包含每个仓库结果摘要和合并排序后条目的字典
+    """
+    completed = 0
+    
+    async def on_result(entry: dict):
+        nonlocal completed
+        completed += 1
+        name = entry["full_name"] or entry["repo"]
+        status = f"{entry['total']} 条" if entry["success"] else f"失败: {entry['error']}"
+        await ctx.report_progress(completed, len(repos))
+        await ctx.info(f"[{completed}/{len(repos)}] {name}: {status}")
+    
+    return await registry.call("query_repositories", {
+        "repos": repos,
+        "operation": operation,
+        "concurrency": concurrency,
+        "max_items": max_items,
+        "state": state,
+        "author": author,
+        "since": since,
+        "until": until,
+        "per_page": per_page
+    }, timeout=_tool_timeout(), on_result=on_result)
+
+
+@mcp.tool()
+async def batch_get_pull_request_files(
+    prs: list[dict],
+    ctx: Context,
+    include_patch: bool = False,
+    max_files_per_pr: int = 20,
+    max_rows: int = 100,
+    concurrency: int = 8
+) -> dict:
+    """
+    并发读取多个 Pull Request 的变更文件，返回每个 PR 的结果和按文件去重合并的变更统计，每个 PR 完成时推送进度
+    
+    Args:
+        prs: PR 列表，每项为 {"repo_id": 仓库 ID, "pr_number": PR 编号}，重复项只读取一次
+        include_patch: 每个 PR 的文件列表是否包含补丁内容，默认 False
+        max_files_per_pr: 每个 PR 结果中最多返回的文件数（统计仍包含全部文件），默认 20
+        max_rows: 变更统计表最多保留的行数（按变更行数倒序），默认 100
+        concurrency: 最大并发 PR 数，默认 8
+    
+    Returns:
+        包含每个 PR 的结果和合并后的文件变更统计（churn）的字典
+    """
+    async def on_result(entry: dict):
+        # 进度按去重后的 PR 数计算（重复的 PR 只读取一次）
+        completed, total = entry["completed"], entry["total_pull_requests"]
+        name = f"{entry['repository_id']}#{entry['pull_request_number']}"
+        status = f"{entry['total_files']} 个文件" if entry["success"] else f"失败: {entry['error']}"
+        await ctx.report_progress(completed, total)
+        await ctx.info(f"[{completed}/{total}] {name}: {status}")
+    
+    return await registry.call("query_pull_request_files", {
+        "prs": prs,
+        "include_patch": include_patch,
+        "max_files_per_pr": max_files_per_pr,
+        "max_rows": max_rows,
+        "concurrency": concurrency
+    }, timeout=_tool_timeout(), on_result=on_result)
 
 
 if __name__ == "__main__":
-    # 运行 MCP 服务器
+    # 加载 .env 配置后运行 MCP 服务器
+    load_config()
     mcp.run()
 
@@ -1,9 +1,10 @@
 """
 GitHub API 工具定义（遵循 OpenAI Function Calling 规范）
-提供 search_repository_by_url, get_pull_requests_by_repo_id, get_pull_request_files_by_repo_id 三个工具
+提供 search_repository_by_url, get_pull_requests_by_repo_id, get_pull_request_files_by_repo_id,
+get_commits_by_repo_id, search_commits_and_pull_requests, get_repository_analytics,
+query_repositories, query_pull_request_files 等工具
 """
-from typing import Dict, List, Any
-import asyncio
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 from ..github.server import (
     search_repository_by_url,
@@ -11,15 +12,15 @@ from ..github.server import (
     get_pull_request_files_by_repo_id,
     get_commits_by_repo_id
 )
+from ..github.mirror import search_commits_and_pull_requests
+from ..github.analytics import get_repository_analytics
+from ..github.batch import query_pull_request_files, query_repositories
+from ..github.prefetch import get_prefetcher
+from .tool_registry import ToolRegistry
 
 
-def get_github_tools() -> List[Dict[str, Any]]:
-    """
-    获取 GitHub API 工具定义（符合 OpenAI Function Calling 规范）
-    
-    Returns:
-        工具定义列表，可以直接传递给 OpenAI API 的 tools 参数
-    """
+def _tool_definitions() -> List[Dict[str, Any]]:
+    """GitHub API 工具定义原文（只在构建注册表时使用一次）"""
     return [
         {
             "type": "function",
@@ -115,7 +116,7 @@ def get_github_tools() -> List[Dict[str, Any]]:
             "type": "function",
             "function": {
                 "name": "get_pull_request_files_by_repo_id",
-                "description": "获取GitHub Pull Request的变更文件。当用户询问PR的变更内容、修改的文件、diff时使用此工具。需要仓库ID和PR编号。返回文件列表、变更统计和每个文件的diff补丁。",
+                "description": "获取GitHub Pull Request的变更文件。当用户询问PR的变更内容、修改的文件、diff时使用此工具。需要仓库ID和PR编号。分页读取全部变更文件（GitHub最多列出3000个），返回文件列表、变更统计和每个文件的diff补丁。",
                 "parameters": {
                     "type": "object",
                     "properties": {
@@ -126,6 +127,16 @@ def get_github_tools() -> List[Dict[str, Any]]:
                         "pr_number": {
                             "type": "integer",
                             "description": "Pull Request编号（整数）"
+                        },
+                        "include_patch": {
+                            "type": "boolean",
+                            "description": "是否返回每个文件的diff补丁，只需要文件列表和统计时设为false，默认true"
+                        },
+                        "max_files": {
+                            "type": "integer",
+                            "description": "最多返回的文件数（统计数据仍包含全部文件），默认300",
+                            "minimum": 1,
+                            "maximum": 3000
                         }
                     },
                     "required": ["repo_id", "pr_number"]
@@ -181,6 +192,216 @@ def get_github_tools() -> List[Dict[str, Any]]:
                     "required": ["repo_id"]
                 }
             }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "search_commits_and_pull_requests",
+                "description": "全文检索提交消息和PR标题/正文。当用户询问“哪个PR修改了X”“哪些提交提到了Y”时使用此工具，比逐页查看提交或PR列表更快。检索范围是此前查询过的提交和PR；可通过sync_pages先从GitHub同步指定仓库的数据。返回按相关度排序的片段。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "搜索关键词，多个关键词用空格分隔"
+                        },
+                        "repo_id": {
+                            "type": "integer",
+                            "description": "仓库ID（整数），不提供时检索所有已同步的仓库"
+                        },
+                        "kind": {
+                            "type": "string",
+                            "description": "检索范围：all（全部）、pull_request（仅PR）、commit（仅提交）",
+                            "enum": ["all", "pull_request", "commit"],
+                            "default": "all"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "返回结果数量上限，默认10",
+                            "default": 10,
+                            "minimum": 1,
+                            "maximum": 50
+                        },
+                        "sync_pages": {
+                            "type": "integer",
+                            "description": "检索前从GitHub同步的页数（每页100条PR和提交），需要提供repo_id，默认0表示不同步",
+                            "default": 0,
+                            "minimum": 0,
+                            "maximum": 10
+                        }
+                    },
+                    "required": ["query"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_repository_analytics",
+                "description": "计算仓库的统计指标。当用户询问PR合并耗时（中位数等）、贡献者排行、提交在星期/小时上的分布等需要汇总大量PR或提交的问题时使用此工具，不要自己逐条计算。基于已同步的数据计算，可通过sync_pages先从GitHub同步。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "repo_id": {
+                            "type": "integer",
+                            "description": "仓库ID（整数），可通过search_repository_by_url获取"
+                        },
+                        "metric": {
+                            "type": "string",
+                            "description": "分析指标：merge_time（PR合并耗时）、top_contributors（贡献者排行）、commits_by_weekday（按星期统计提交）、commits_by_hour（按小时统计提交，UTC）",
+                            "enum": ["merge_time", "top_contributors", "commits_by_weekday", "commits_by_hour"],
+                            "default": "merge_time"
+                        },
+                        "since": {
+                            "type": "string",
+                            "description": "只统计此日期之后的数据（ISO 8601格式，如2024-01-01T00:00:00Z）"
+                        },
+                        "until": {
+                            "type": "string",
+                            "description": "只统计此日期之前的数据（ISO 8601格式）"
+                        },
+                        "top_n": {
+                            "type": "integer",
+                            "description": "贡献者排行返回数量，默认10",
+                            "default": 10,
+                            "minimum": 1,
+                            "maximum": 100
+                        },
+                        "sync_pages": {
+                            "type": "integer",
+                            "description": "计算前从GitHub同步的页数（每页100条PR和提交），默认0表示只使用已同步的数据",
+                            "default": 0,
+                            "minimum": 0,
+                            "maximum": 10
+                        }
+                    },
+                    "required": ["repo_id"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "query_repositories",
+                "description": "在多个GitHub仓库上批量查询Pull Requests或提交。当用户询问一个组织或多个仓库的整体情况（如“这些仓库里所有打开的PR”）时使用此工具，一次调用并发查询所有仓库，不要逐个仓库调用。返回每个仓库的结果摘要和按时间倒序合并后的条目。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "repos": {
+                            "type": "array",
+                            "description": "仓库列表，每项可以是仓库ID或owner/repo、URL等search_repository_by_url支持的格式",
+                            "items": {"type": "string"},
+                            "minItems": 1,
+                            "maxItems": 100
+                        },
+                        "operation": {
+                            "type": "string",
+                            "description": "查询类型：pull_requests（PR）或commits（提交）",
+                            "enum": ["pull_requests", "commits"],
+                            "default": "pull_requests"
+                        },
+                        "state": {
+                            "type": "string",
+                            "description": "PR状态筛选（仅pull_requests）",
+                            "enum": ["open", "closed", "all"],
+                            "default": "open"
+                        },
+                        "author": {
+                            "type": "string",
+                            "description": "只返回指定作者的提交（仅commits）"
+                        },
+                        "since": {
+                            "type": "string",
+                            "description": "只返回此日期之后的提交（仅commits，ISO 8601格式）"
+                        },
+                        "until": {
+                            "type": "string",
+                            "description": "只返回此日期之前的提交（仅commits，ISO 8601格式）"
+                        },
+                        "per_page": {
+                            "type": "integer",
+                            "description": "每个仓库返回的数量，默认30",
+                            "default": 30,
+                            "minimum": 1,
+                            "maximum": 100
+                        },
+                        "max_items": {
+                            "type": "integer",
+                            "description": "合并结果中保留的最大条目数，默认100",
+                            "default": 100,
+                            "minimum": 1,
+                            "maximum": 500
+                        },
+                        "concurrency": {
+                            "type": "integer",
+                            "description": "最大并发仓库数，默认8",
+                            "default": 8,
+                            "minimum": 1,
+                            "maximum": 32
+                        }
+                    },
+                    "required": ["repos"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "query_pull_request_files",
+                "description": "批量获取多个Pull Request的变更文件。当用户需要查看一批PR（如一次发布包含的所有PR）改动了哪些文件时使用此工具，一次调用并发读取所有PR，不要逐个调用get_pull_request_files_by_repo_id。返回每个PR的文件统计，以及按文件去重合并的变更统计表（同一文件被多个PR修改时合并为一行，列出相关PR编号）。",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "prs": {
+                            "type": "array",
+                            "description": "PR列表，每项包含仓库ID和PR编号",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "repo_id": {
+                                        "type": "integer",
+                                        "description": "仓库ID"
+                                    },
+                                    "pr_number": {
+                                        "type": "integer",
+                                        "description": "Pull Request编号"
+                                    }
+                                },
+                                "required": ["repo_id", "pr_number"]
+                            },
+                            "minItems": 1,
+                            "maxItems": 100
+                        },
+                        "include_patch": {
+                            "type": "boolean",
+                            "description": "每个PR的文件列表是否包含补丁内容，默认false",
+                            "default": False
+                        },
+                        "max_files_per_pr": {
+                            "type": "integer",
+                            "description": "每个PR结果中最多返回的文件数（统计仍包含全部文件），默认20",
+                            "default": 20,
+                            "minimum": 0,
+                            "maximum": 3000
+                        },
+                        "max_rows": {
+                            "type": "integer",
+                            "description": "变更统计表最多保留的行数（按变更行数倒序），默认100",
+                            "default": 100,
+                            "minimum": 1,
+                            "maximum": 1000
+                        },
+                        "concurrency": {
+                            "type": "integer",
+                            "description": "最大并发PR数，默认8",
+                            "default": 8,
+                            "minimum": 1,
+                            "maximum": 32
+                        }
+                    },
+                    "required": ["prs"]
+                }
+            }
         }
     ]
 
@@ -190,38 +411,71 @@ TOOL_FUNCTIONS = {
     "search_repository_by_url": search_repository_by_url,
     "get_pull_requests_by_repo_id": get_pull_requests_by_repo_id,
     "get_pull_request_files_by_repo_id": get_pull_request_files_by_repo_id,
-    "get_commits_by_repo_id": get_commits_by_repo_id
+    "get_commits_by_repo_id": get_commits_by_repo_id,
+    "search_commits_and_pull_requests": search_commits_and_pull_requests,
+    "get_repository_analytics": get_repository_analytics,
+    "query_repositories": query_repositories,
+    "query_pull_request_files": query_pull_request_files
 }
 
+# 工具注册表：Schema 只构建一次并编译参数校验器，github_tools 和 MCP 服务器共用
+registry = ToolRegistry()
+for _definition in _tool_definitions():
+    _function = _definition["function"]
+    registry.register(
+        name=_function["name"],
+        func=TOOL_FUNCTIONS[_function["name"]],
+        description=_function["description"],
+        parameters=_function["parameters"]
+    )
+
+
+def _prefetch_follow_ups(tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any]):
+    """工具返回仓库 ID 或 PR 列表后，在后台预取模型最可能的下一步请求"""
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        prefetcher.schedule(tool_name, arguments, result)
+
+
+registry.add_listener(_prefetch_follow_ups)
+
+
+def get_github_tools() -> List[Dict[str, Any]]:
+    """
+    获取 GitHub API 工具定义（符合 OpenAI Function Calling 规范）
+    
+    Returns:
+        工具定义列表，可以直接传递给 OpenAI API 的 tools 参数（注册表缓存的同一个列表，不要修改）
+    """
+    return registry.schemas()
+
 
 async def call_tool(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     """
-    调用指定的工具函数
+    调用指定的工具函数（调用前按工具 Schema 校验并规范化参数）
     
     Args:
         tool_name: 工具函数名称
-        arguments: 函数参数（字典格式）
+        arguments: 函数参数（字典格式），如 {"repo_id": "123", "state": "Open"} 会规范化为 {"repo_id": 123, "state": "open"}
     
     Returns:
-        函数执行结果
+        函数执行结果；参数无效时返回包含具体错误信息的失败结果，不会调用工具函数
     """
-    if tool_name not in TOOL_FUNCTIONS:
-        return {
-            "success": False,
-            "error": f"未知的工具函数: {tool_name}",
-            "data": None
-        }
+    return await registry.call(tool_name, arguments)
+
+
+def canonical_arguments(tool_name: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    工具参数的规范形式（规范化后补全默认值），用于判断两次调用是否等价
     
-    try:
-        func = TOOL_FUNCTIONS[tool_name]
-        result = await func(**arguments)
-        return result
-    except Exception as e:
-        return {
-            "success": False,
-            "error": f"调用工具函数时发生错误: {str(e)}",
-            "data": None
-        }
+    Args:
+        tool_name: 工具函数名称
+        arguments: 函数参数（字典格式）
+    
+    Returns:
+        规范形式的参数字典，工具不存在或参数无效时返回 None
+    """
+    return registry.canonical(tool_name, arguments)
 
 
 def format_datetime(iso_string: str) -> str:
@@ -276,6 +530,8 @@ def format_tool_result(tool_name: str, result: Dict[str, Any]) -> str:
         格式化后的字符串
     """
     if not result.get("success"):
+        if result.get("timed_out"):
+            return f"工具调用超时: {result.get('error', '已超过截止时间')}（没有取得结果，请根据已有信息回答或缩小查询范围）"
         return f"工具调用失败: {result.get('error', '未知错误')}"
     
     data = result.get("data", {})
@@ -340,8 +596,14 @@ def format_tool_result(tool_name: str, result: Dict[str, Any]) -> str:
         if not files:
             return f"PR #{pr_number} 没有变更文件"
         
-        summary = f"PR #{pr_number} (仓库 ID: {repo_id}) 的变更文件：\n"
-        summary += f"总文件数: {total_files}, 总添加: +{total_additions}, 总删除: -{total_deletions}\n\n"
+        summary = "[已超时，以下为部分结果]\n" if data.get("timed_out") else ""
+        summary += f"PR #{pr_number} (仓库 ID: {repo_id}) 的变更文件：\n"
+        summary += f"总文件数: {total_files}, 总添加: +{total_additions}, 总删除: -{total_deletions}\n"
+        if data.get("truncated"):
+            summary += f"注意: 该 PR 共变更 {data.get('changed_files')} 个文件，GitHub 最多列出 3000 个，以上统计只包含已列出的文件\n"
+        if data.get("complete") is False:
+            summary += f"注意: 部分文件读取失败（{result.get('error')}），以上统计只包含已读取的文件\n"
+        summary += "\n"
         
         for file in files[:15]:  # 只显示前15个文件
             summary += f"文件: {file['filename']} ({file['status']})\n"
@@ -390,6 +652,125 @@ def format_tool_result(tool_name: str, result: Dict[str, Any]) -> str:
         
         return summary
     
+    elif tool_name == "search_commits_and_pull_requests":
+        results = data.get("results", [])
+        query = data.get("query", "")
+        indexed = data.get("indexed", {})
+        
+        if not results:
+            return (
+                f"未找到与 \"{query}\" 相关的提交或 PR"
+                f"（已索引 {indexed.get('pull_requests', 0)} 个 PR、{indexed.get('commits', 0)} 个提交，"
+                f"可指定 repo_id 和 sync_pages 同步更多数据）"
+            )
+        
+        summary = f"与 \"{query}\" 相关的结果（共 {len(results)} 条）：\n\n"
+        for item in results:
+            label = "PR" if item["kind"] == "pull_request" else "提交"
+            summary += f"[{label}] 仓库 ID {item['repo_id']} {item['ref']}: {item['title']}\n"
+            summary += f"   作者: {item.get('author') or '未知'}"
+            if item.get('date'):
+                summary += f", 时间: {format_datetime(item['date'])}"
+            summary += "\n"
+            summary += f"   片段: {item['snippet'].replace(chr(10), ' ')}\n"
+            if item.get('url'):
+                summary += f"   URL: {item['url']}\n"
+            summary += "\n"
+        
+        return summary
+    
+    elif tool_name == "get_repository_analytics":
+        metric = data.get("metric", "")
+        result_data = data.get("result")
+        repo_id = data.get("repository_id", "")
+        indexed = data.get("indexed", {})
+        
+        window = ""
+        if data.get("since") or data.get("until"):
+            window = f"（时间范围: {data.get('since') or '不限'} ~ {data.get('until') or '不限'}）"
+        summary = f"仓库 ID {repo_id} 的统计结果{window}，基于 {indexed.get('pull_requests', 0)} 个 PR、{indexed.get('commits', 0)} 个提交：\n\n"
+        
+        if metric == "merge_time":
+            if not result_data.get("merged_count"):
+                return summary + "没有已合并的 PR 数据，可指定 sync_pages 同步更多数据"
+            summary += f"已合并 PR 数: {result_data['merged_count']}\n"
+            summary += f"合并耗时中位数: {result_data['median_hours']} 小时\n"
+            summary += f"合并耗时平均值: {result_data['mean_hours']} 小时\n"
+            summary += f"合并耗时 P90: {result_data['p90_hours']} 小时\n"
+        elif metric == "top_contributors":
+            if not result_data:
+                return summary + "没有提交数据，可指定 sync_pages 同步更多数据"
+            for i, item in enumerate(result_data, 1):
+                summary += f"{i}. {item['author']}: {item['commits']} 个提交\n"
+        else:
+            for bucket, count in result_data.items():
+                summary += f"{bucket}: {count}\n"
+        
+        return summary
+    
+    elif tool_name == "query_repositories":
+        operation = data.get("operation", "")
+        repositories = data.get("repositories", [])
+        items = data.get("items", [])
+        label = "Pull Requests" if operation == "pull_requests" else "提交"
+        
+        summary = "[已超时，以下为部分结果]\n" if data.get("timed_out") else ""
+        summary += f"批量查询 {data.get('total_repositories', 0)} 个仓库的{label}："
+        summary += f"成功 {data.get('succeeded', 0)} 个，失败 {data.get('failed', 0)} 个，共 {data.get('total_items', 0)} 条\n\n"
+        for repo in repositories:
+            name = repo.get("full_name") or repo.get("repo")
+            if repo["success"]:
+                summary += f"- {name} (ID: {repo['repository_id']}): {repo['total']} 条\n"
+            else:
+                summary += f"- {name}: 查询失败（{repo['error']}）\n"
+        summary += "\n"
+        
+        for item in items[:30]:  # 只显示前30条
+            name = item.get("full_name") or item.get("repository_id")
+            if operation == "pull_requests":
+                summary += f"[{name}] PR #{item['number']}: {item['title']}\n"
+                summary += f"   作者: {item['user']['login']}, 创建时间: {format_datetime(item['created_at'])}\n"
+                summary += f"   URL: {item['url']}\n"
+            else:
+                summary += f"[{name}] {item['sha'][:7]} - {item['message'].split(chr(10))[0]}\n"
+                summary += f"   作者: {item['author']['name']}, 时间: {format_datetime(item['author']['date'])}\n"
+        
+        if len(items) > 30:
+            summary += f"... 还有 {len(items) - 30} 条未显示\n"
+        
+        return summary
+    
+    elif tool_name == "query_pull_request_files":
+        pull_requests = data.get("pull_requests", [])
+        churn = data.get("churn", [])
+        
+        summary = "[已超时，以下为部分结果]\n" if data.get("timed_out") else ""
+        summary += f"批量查询 {data.get('total_pull_requests', 0)} 个 PR 的变更文件："
+        summary += f"成功 {data.get('succeeded', 0)} 个，失败 {data.get('failed', 0)} 个，"
+        summary += f"共 {data.get('total_files', 0)} 个文件，总添加: +{data.get('total_additions', 0)}, 总删除: -{data.get('total_deletions', 0)}\n\n"
+        for pr in pull_requests:
+            name = f"仓库 {pr['repository_id']} PR #{pr['pull_request_number']}"
+            if pr["success"]:
+                summary += f"- {name}: {pr['total_files']} 个文件, +{pr['total_additions']} -{pr['total_deletions']}"
+                if pr.get("timed_out"):
+                    summary += "（已超时，只读取了部分文件）"
+                elif pr.get("complete") is False:
+                    summary += "（部分文件读取失败）"
+                summary += "\n"
+            else:
+                summary += f"- {name}: 查询失败（{pr['error']}）\n"
+        summary += "\n文件变更统计（按变更行数倒序）：\n"
+        
+        for row in churn[:30]:  # 只显示前30个文件
+            numbers = ", ".join(f"#{number}" for number in row["pull_requests"])
+            summary += f"[{row['repository_id']}] {row['filename']}: +{row['additions']} -{row['deletions']}（{numbers}）\n"
+        
+        shown = min(len(churn), 30)
+        if data.get("total_files", 0) > shown:
+            summary += f"... 还有 {data.get('total_files', 0) - shown} 个文件未显示\n"
+        
+        return summary
+    
     else:
         # 默认格式化为 JSON
         import json
@@ -0,0 +1,453 @@
+"""
+工具注册表
+集中保存工具的 JSON Schema 定义和对应的异步函数：Schema 只构建一次，
+并在注册时编译为参数校验/转换函数，调用前规范化参数（如 "123" -> 123、"Open" -> "open"），
+参数有误时直接返回精确的错误信息，不再把异常抛到工具函数内部
+"""
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..deadline import DeadlineExceeded, deadline_scope, expired, run_with_deadline
+
+_INTEGER_PATTERN = re.compile(r"[+-]?\d+")
+
+
+class _InvalidArgument(Exception):
+    """单个参数校验失败（仅在注册表内部使用，最终转换为错误信息）"""
+
+
+def _describe(value: Any) -> str:
+    """生成错误信息中的参数值描述（截断过长的值）"""
+    text = json.dumps(value, ensure_ascii=False) if not isinstance(value, str) else repr(value)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def _compile_integer(spec: Dict) -> Callable[[Any], Any]:
+    """编译整数参数：接受整数、整数值的浮点数和数字字符串（PR 编号允许 # 前缀）"""
+    def coerce(value: Any) -> int:
+        if isinstance(value, bool):
+            raise _InvalidArgument(f"需要整数，实际为 {_describe(value)}")
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            text = value.strip().lstrip("#").replace(",", "")
+            if _INTEGER_PATTERN.fullmatch(text):
+                return int(text)
+        raise _InvalidArgument(f"需要整数，实际为 {_describe(value)}")
+    return coerce
+
+
+def _compile_number(spec: Dict) -> Callable[[Any], Any]:
+    """编译数值参数：接受整数、浮点数和数字字符串"""
+    def coerce(value: Any) -> float:
+        if isinstance(value, bool):
+            raise _InvalidArgument(f"需要数值，实际为 {_describe(value)}")
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, str):
+            try:
+                return float(value.strip())
+            except ValueError:
+                pass
+        raise _InvalidArgument(f"需要数值，实际为 {_describe(value)}")
+    return coerce
+
+
+def _compile_boolean(spec: Dict) -> Callable[[Any], Any]:
+    """编译布尔参数：接受布尔值和 true/false/1/0/yes/no 字符串"""
+    truthy = {"true", "1", "yes", "y"}
+    falsy = {"false", "0", "no", "n"}
+
+    def coerce(value: Any) -> bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, str)):
+            text = str(value).strip().lower()
+            if text in truthy:
+                return True
+            if text in falsy:
+                return False
+        raise _InvalidArgument(f"需要布尔值，实际为 {_describe(value)}")
+    return coerce
+
+
+def _compile_string(spec: Dict) -> Callable[[Any], Any]:
+    """编译字符串参数：去除首尾空白，数字会转换为字符串"""
+    def coerce(value: Any) -> str:
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        raise _InvalidArgument(f"需要字符串，实际为 {_describe(value)}")
+    return coerce
+
+
+def _compile_array(spec: Dict) -> Callable[[Any], Any]:
+    """编译数组参数：接受列表、JSON 数组字符串和逗号/空白分隔的字符串，逐项校验"""
+    item_coerce = _compile(spec.get("items", {}))
+
+    def coerce(value: Any) -> list:
+        if isinstance(value, str):
+            text = value.strip()
+            if text.startswith("["):
+                try:
+                    value = json.loads(text)
+                except json.JSONDecodeError:
+                    raise _InvalidArgument(f"需要数组，实际为无法解析的 JSON {_describe(value)}")
+            else:
+                value = [part for part in re.split(r"[,\s]+", text) if part]
+        if not isinstance(value, (list, tuple)):
+            raise _InvalidArgument(f"需要数组，实际为 {_describe(value)}")
+        items = []
+        for i, item in enumerate(value):
+            try:
+                items.append(item_coerce(item))
+            except _InvalidArgument as e:
+                raise _InvalidArgument(f"第 {i + 1} 项{e}")
+        return items
+    return coerce
+
+
+def _compile_object(spec: Dict) -> Callable[[Any], Any]:
+    """编译对象参数（如数组中的项）：接受字典和 JSON 对象字符串，按 properties 逐个字段校验"""
+    property_coerces = {key: _compile(item_spec) for key, item_spec in spec.get("properties", {}).items()}
+    required = tuple(spec.get("required", ()))
+
+    def coerce(value: Any) -> dict:
+        if isinstance(value, str) and value.strip().startswith("{"):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                raise _InvalidArgument(f"需要对象，实际为无法解析的 JSON {_describe(value)}")
+        if not isinstance(value, dict):
+            raise _InvalidArgument(f"需要对象，实际为 {_describe(value)}")
+        result = {}
+        for key, item in value.items():
+            item_coerce = property_coerces.get(key)
+            if item_coerce is None:
+                raise _InvalidArgument(f"未知字段 {key}，可用字段: {', '.join(property_coerces)}")
+            if item is None:
+                continue
+            try:
+                result[key] = item_coerce(item)
+            except _InvalidArgument as e:
+                raise _InvalidArgument(f"字段 {key} {e}")
+        for key in required:
+            if key not in result:
+                raise _InvalidArgument(f"缺少字段 {key}")
+        return result
+    return coerce
+
+
+_TYPE_COMPILERS = {
+    "integer": _compile_integer,
+    "number": _compile_number,
+    "boolean": _compile_boolean,
+    "string": _compile_string,
+    "array": _compile_array,
+    "object": _compile_object
+}
+
+
+def _compile(spec: Dict) -> Callable[[Any], Any]:
+    """
+    将单个参数的 JSON Schema 编译为校验/转换函数
+
+    支持 type（integer、number、boolean、string、array、object）、enum（大小写不敏感匹配）、
+    minimum / maximum、minItems / maxItems；失败时抛出 _InvalidArgument
+
+    Args:
+        spec: 参数的 JSON Schema
+
+    Returns:
+        接受原始值、返回规范化后值的函数
+    """
+    compiler = _TYPE_COMPILERS.get(spec.get("type"))
+    steps: List[Callable[[Any], Any]] = [compiler(spec)] if compiler else []
+
+    if "enum" in spec:
+        allowed = list(spec["enum"])
+        lookup = {str(option).lower(): option for option in allowed}
+
+        def check_enum(value: Any) -> Any:
+            if value in allowed:
+                return value
+            normalized = lookup.get(str(value).strip().lower())
+            if normalized is None:
+                raise _InvalidArgument(f"取值 {_describe(value)} 无效，可选值: {', '.join(map(str, allowed))}")
+            return normalized
+        steps.append(check_enum)
+
+    minimum, maximum = spec.get("minimum"), spec.get("maximum")
+    if minimum is not None or maximum is not None:
+        def check_range(value: Any) -> Any:
+            if minimum is not None and value < minimum:
+                raise _InvalidArgument(f"不能小于 {minimum}，实际为 {value}")
+            if maximum is not None and value > maximum:
+                raise _InvalidArgument(f"不能大于 {maximum}，实际为 {value}")
+            return value
+        steps.append(check_range)
+
+    min_items, max_items = spec.get("minItems"), spec.get("maxItems")
+    if min_items is not None or max_items is not None:
+        def check_length(value: list) -> list:
+            if min_items is not None and len(value) < min_items:
+                raise _InvalidArgument(f"至少需要 {min_items} 项，实际为 {len(value)} 项")
+            if max_items is not None and len(value) > max_items:
+                raise _InvalidArgument(f"最多允许 {max_items} 项，实际为 {len(value)} 项")
+            return value
+        steps.append(check_length)
+
+    if len(steps) == 1:
+        return steps[0]
+
+    def coerce(value: Any) -> Any:
+        for step in steps:
+            value = step(value)
+        return value
+    return coerce
+
+
+class Tool:
+    """已注册的工具：OpenAI Function Calling 定义 + 异步函数 + 编译后的参数校验器"""
+
+    def __init__(self, name: str, func: Callable[..., Awaitable[Dict]], description: str, parameters: Dict):
+        """
+        初始化工具并编译参数校验器
+
+        Args:
+            name: 工具名称
+            func: 工具对应的异步函数
+            description: 工具描述
+            parameters: 参数的 JSON Schema（type 为 object）
+        """
+        self.name = name
+        self.func = func
+        self.description = description
+        self.parameters = parameters
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": parameters
+            }
+        }
+        properties = parameters.get("properties", {})
+        self.required = tuple(parameters.get("required", ()))
+        self._validators = {key: _compile(spec) for key, spec in properties.items()}
+        self._defaults: Optional[Dict[str, Any]] = None
+
+    @property
+    def defaults(self) -> Dict[str, Any]:
+        """Schema 中声明的参数在工具函数中的默认值（首次使用时读取函数签名，默认值为 None 的参数不包含在内）"""
+        if self._defaults is None:
+            import inspect
+
+            self._defaults = {
+                key: parameter.default
+                for key, parameter in inspect.signature(self.func).parameters.items()
+                if key in self._validators and parameter.default is not inspect.Parameter.empty and parameter.default is not None
+            }
+        return self._defaults
+
+    def validate(self, arguments: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        校验并规范化参数
+
+        值为 None 的可选参数会被丢弃（使用函数默认值）；未知参数、缺少的必需参数和
+        类型/取值错误都会记录在错误列表中
+
+        Args:
+            arguments: 原始参数字典
+
+        Returns:
+            (规范化后的参数字典, 错误信息列表)
+        """
+        if arguments is None:
+            arguments = {}
+        if not isinstance(arguments, dict):
+            return {}, [f"参数必须是 JSON 对象，实际为 {_describe(arguments)}"]
+
+        cleaned: Dict[str, Any] = {}
+        errors: List[str] = []
+        for key, value in arguments.items():
+            validator = self._validators.get(key)
+            if validator is None:
+                errors.append(f"{key}: 未知参数，可用参数: {', '.join(self._validators)}")
+                continue
+            if value is None:
+                continue
+            try:
+                cleaned[key] = validator(value)
+            except _InvalidArgument as e:
+                errors.append(f"{key}: {e}")
+        for key in self.required:
+            if key not in arguments:
+                errors.append(f"{key}: 缺少必需参数")
+            elif arguments[key] is None:
+                errors.append(f"{key}: 必需参数不能为空")
+        return cleaned, errors
+
+    def canonical(self, arguments: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        参数的规范形式：校验并规范化后补全省略参数的默认值，
+        如 {"repo_id": "123", "state": "Open"} 与 {"repo_id": 123, "state": "open", "per_page": 30} 的规范形式相同
+
+        Args:
+            arguments: 原始参数字典
+
+        Returns:
+            规范形式的参数字典，参数无效时返回 None
+        """
+        cleaned, errors = self.validate(arguments)
+        if errors:
+            return None
+        return {**self.defaults, **cleaned}
+
+
+class ToolRegistry:
+    """工具注册表，同时服务于 Function Calling（github_tools）和 MCP 服务器（gitcode_mcp）"""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+        self._listeners: List[Callable[[str, Dict[str, Any], Dict[str, Any]], None]] = []
+
+    def register(self, name: str, func: Callable[..., Awaitable[Dict]], description: str, parameters: Dict) -> Tool:
+        """
+        注册工具（同名工具会被覆盖）
+
+        Args:
+            name: 工具名称
+            func: 工具对应的异步函数
+            description: 工具描述
+            parameters: 参数的 JSON Schema
+
+        Returns:
+            注册后的 Tool
+        """
+        tool = Tool(name, func, description, parameters)
+        self._tools[name] = tool
+        self._schemas = None
+        return tool
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any], Dict[str, Any]], None]):
+        """
+        添加工具调用完成后的回调（如预取后续请求），回调在事件循环中同步执行，不应阻塞
+
+        Args:
+            listener: 接受 (工具名称, 规范化后的参数, 执行结果) 的函数
+        """
+        self._listeners.append(listener)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def get(self, name: str) -> Optional[Tool]:
+        """按名称获取工具，不存在时返回 None"""
+        return self._tools.get(name)
+
+    @property
+    def functions(self) -> Dict[str, Callable[..., Awaitable[Dict]]]:
+        """工具名称 -> 异步函数的映射"""
+        return {name: tool.func for name, tool in self._tools.items()}
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """
+        获取所有工具的 OpenAI Function Calling 定义（构建一次后复用，调用方不应修改）
+
+        Returns:
+            工具定义列表
+        """
+        if self._schemas is None:
+            self._schemas = [tool.schema for tool in self._tools.values()]
+        return self._schemas
+
+    def validate(self, name: str, arguments: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        校验并规范化指定工具的参数
+
+        Returns:
+            (规范化后的参数字典, 错误信息列表)
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            return {}, [f"未知的工具函数: {name}"]
+        return tool.validate(arguments)
+
+    def canonical(self, name: str, arguments: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        指定工具参数的规范形式（见 Tool.canonical）
+
+        Returns:
+            规范形式的参数字典，工具不存在或参数无效时返回 None
+        """
+        tool = self._tools.get(name)
+        return tool.canonical(arguments) if tool is not None else None
+
+    async def call(self, name: str, arguments: Optional[Dict[str, Any]], timeout: Optional[float] = None, **extra) -> Dict[str, Any]:
+        """
+        校验参数后调用工具
+
+        Args:
+            name: 工具名称
+            arguments: 原始参数字典
+            timeout: 本次调用的超时（秒），与外层截止时间取较早者；超时后取消工具函数
+            **extra: 不在 Schema 中、直接传给工具函数的附加参数（如 MCP 的进度回调）
+
+        Returns:
+            工具执行结果；参数校验失败时返回 status_code 为 400 的错误结果，
+            超过截止时间时返回 status_code 为 504、timed_out 为 True 的错误结果
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            return {
+                "success": False,
+                "error": f"未知的工具函数: {name}",
+                "data": None
+            }
+
+        cleaned, errors = tool.validate(arguments)
+        if errors:
+            return {
+                "success": False,
+                "error": f"参数校验失败（{name}）: " + "；".join(errors),
+                "status_code": 400,
+                "data": None
+            }
+
+        try:
+            with deadline_scope(timeout):
+                if expired():
+                    raise DeadlineExceeded("已超过截止时间")
+                # 工具函数会在截止时间返回部分结果，稍作等待后再强制取消
+                result = await run_with_deadline(tool.func(**cleaned, **extra), grace=0.5)
+        except DeadlineExceeded:
+            return {
+                "success": False,
+                "error": f"工具调用超时（{name}）：已超过截止时间，调用已取消",
+                "status_code": 504,
+                "data": None,
+                "timed_out": True
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"调用工具函数时发生错误: {str(e)}",
+                "data": None
+            }
+
+        for listener in self._listeners:
+            try:
+                listener(name, cleaned, result)
+            except Exception:
+                # 回调失败不影响工具结果
+                pass
+        return result